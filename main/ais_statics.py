@@ -0,0 +1,89 @@
+# ais_statics.py
+
+import json
+import logging
+import threading
+
+import val_standard_pb2
+from decoders import schema
+
+logger = logging.getLogger(__name__)
+
+# Keys of the slow-changing parts of an AISVessel payload (proto and JSON names)
+STATIC_KEYS = ('statics', 'statics_class_a', 'staticsClassA')
+
+
+def _digest(statics):
+    """
+    Content hash of the static parts of an AISVessel payload.
+    """
+    try:
+        return hash(tuple((key, tuple(sorted(value.items()))) for key, value in sorted(statics.items())))
+    except (AttributeError, TypeError):
+        return hash(json.dumps(statics, sort_keys=True))
+
+
+class AISStaticsCache:
+    """
+    Caches the static data of AIS targets per MMSI.
+
+    split() removes unchanged static sub-messages from an incoming AISVessel
+    payload so only the kinematic fields are parsed at full rate. The statics
+    are parsed, and left in the payload so the decoded message carries them,
+    only when `statics_valid` is set and their content hash differs from the
+    cached one.
+    """
+
+    def __init__(self):
+        self._entries = {}  # mmsi -> (digest, AISVessel with the static fields)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def split(self, mmsi, ais_vessel_data):
+        """
+        Strips unchanged statics from an AISVessel payload and updates the cache.
+
+        Args:
+            mmsi (int): The MMSI of the target.
+            ais_vessel_data (dict): The 'ais_vessel' payload; the statics are
+                removed in place unless they changed.
+
+        Returns:
+            tuple: (statics, changed) where statics is the cached AISVessel
+            message holding the static fields (or None if none are known yet)
+            and changed is True if they were parsed from this payload.
+        """
+        statics = {key: ais_vessel_data.pop(key) for key in STATIC_KEYS if key in ais_vessel_data}
+        valid = ais_vessel_data.get('statics_valid', ais_vessel_data.get('staticsValid', False))
+        entry = self._entries.get(mmsi)
+        if not statics or not valid:
+            return (entry[1] if entry else None), False
+
+        digest = _digest(statics)
+        if entry is not None and entry[0] == digest:
+            return entry[1], False
+
+        vessel = val_standard_pb2.AISVessel()
+        vessel.mmsi = mmsi
+        vessel.class_a = bool(ais_vessel_data.get('class_a', ais_vessel_data.get('classA', False)))
+        vessel.statics_valid = True
+        schema.decode(statics, vessel)
+        with self._lock:
+            self._entries[mmsi] = (digest, vessel)
+        # Changed statics stay in the payload, so the decoded message forwards them
+        ais_vessel_data.update(statics)
+        logger.debug(f"AIS statics {'updated' if entry else 'cached'} for MMSI {mmsi}")
+        return vessel, True
+
+    def get(self, mmsi):
+        """
+        Returns the cached AISVessel statics of a target, or None.
+        """
+        entry = self._entries.get(mmsi)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,210 @@
+# ais_table.py
+
+import logging
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Dynamic (kinematic) columns: name -> array typecode
+DYNAMIC_COLUMNS = {
+    'sog': 'f',
+    'cog': 'f',
+    'latitude': 'd',
+    'longitude': 'd',
+    'true_heading': 'i',
+    'nav_status': 'i',
+    'rot': 'f',
+    'updated': 'd',
+}
+
+# Static columns: name -> array typecode. String statics hold ids into the
+# table's StringTable.
+STATIC_COLUMNS = {
+    'class_a': 'B',
+    'callsign': 'I',
+    'name': 'I',
+    'destination': 'I',
+    'type_and_cargo': 'i',
+    'dim_a': 'i',
+    'dim_b': 'i',
+    'dim_c': 'i',
+    'dim_d': 'i',
+    'imo_num': 'i',
+    'draught': 'f',
+}
+
+STRING_COLUMNS = ('callsign', 'name', 'destination')
+
+
+class StringTable:
+    """
+    Interns strings as integer ids; id 0 is the empty string.
+    """
+
+    def __init__(self):
+        self.strings = ['']
+        self._ids = {'': 0}
+
+    def intern(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+
+class AISTable:
+    """
+    Struct-of-arrays table of AIS targets, one row per MMSI.
+
+    Each column is a typed array.array, rows are updated in place and removed by
+    moving the last row into the freed slot. Columns are over-allocated and
+    replaced by larger copies when full rather than resized, so NumPy views
+    returned by as_numpy() stay valid (as a snapshot) after the table grows.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = 0
+        self.strings = StringTable()
+        self.mmsi = array('q')
+        self.columns = {}
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, mmsi):
+        return mmsi in self._rows
+
+    def _grow(self, capacity):
+        def resized(column, typecode):
+            grown = array(typecode, column) if column is not None else array(typecode)
+            grown.frombytes(bytes((capacity - len(grown)) * grown.itemsize))
+            return grown
+
+        self.mmsi = resized(self.mmsi, 'q')
+        for name, typecode in {**DYNAMIC_COLUMNS, **STATIC_COLUMNS}.items():
+            self.columns[name] = resized(self.columns.get(name), typecode)
+        self.capacity = capacity
+
+    def _row(self, mmsi):
+        row = self._rows.get(mmsi)
+        if row is None:
+            if self.size == self.capacity:
+                self._grow(self.capacity * 2)
+            row = self._rows[mmsi] = self.size
+            self.mmsi[row] = mmsi
+            self.size += 1
+        return row
+
+    def update_kinematics(self, vessel, updated=None):
+        """
+        Writes the dynamic fields of an AISVessel message into its row.
+
+        Args:
+            vessel: A val_standard_pb2.AISVessel message.
+            updated (float): Update time, defaults to time.time().
+        """
+        columns = self.columns
+        with self._lock:
+            row = self._row(vessel.mmsi)
+            columns['sog'][row] = vessel.sog
+            columns['cog'][row] = vessel.cog
+            columns['latitude'][row] = vessel.latitude
+            columns['longitude'][row] = vessel.longitude
+            columns['true_heading'][row] = vessel.true_heading
+            columns['nav_status'][row] = vessel.position_class_a.nav_status
+            columns['rot'][row] = vessel.position_class_a.rot
+            columns['updated'][row] = time.time() if updated is None else updated
+
+    def update_statics(self, vessel):
+        """
+        Writes the static fields of an AISVessel message into its row.
+
+        Args:
+            vessel: A val_standard_pb2.AISVessel message.
+        """
+        columns = self.columns
+        statics = vessel.statics
+        statics_class_a = vessel.statics_class_a
+        intern = self.strings.intern
+        with self._lock:
+            row = self._row(vessel.mmsi)
+            columns['class_a'][row] = vessel.class_a
+            columns['callsign'][row] = intern(statics.callsign)
+            columns['name'][row] = intern(statics.name)
+            columns['destination'][row] = intern(statics_class_a.destination)
+            columns['type_and_cargo'][row] = statics.type_and_cargo
+            columns['dim_a'][row] = statics.dim_a
+            columns['dim_b'][row] = statics.dim_b
+            columns['dim_c'][row] = statics.dim_c
+            columns['dim_d'][row] = statics.dim_d
+            columns['imo_num'][row] = statics_class_a.imo_num
+            columns['draught'][row] = statics_class_a.draught
+
+    def update(self, vessel, updated=None):
+        """
+        Writes all fields of an AISVessel message into its row.
+        """
+        self.update_kinematics(vessel, updated)
+        if vessel.statics_valid:
+            self.update_statics(vessel)
+
+    def remove(self, mmsi):
+        """
+        Removes the row of a vessel, moving the last row into its slot.
+        """
+        with self._lock:
+            row = self._rows.pop(mmsi, None)
+            if row is None:
+                return
+            last = self.size - 1
+            if row != last:
+                moved = self.mmsi[last]
+                self.mmsi[row] = moved
+                for column in self.columns.values():
+                    column[row] = column[last]
+                self._rows[moved] = row
+            self.size = last
+
+    def row(self, mmsi):
+        """
+        Returns the fields of a vessel as a dict, with strings resolved, or None.
+        """
+        with self._lock:
+            row = self._rows.get(mmsi)
+            if row is None:
+                return None
+            fields = {'mmsi': mmsi}
+            for name, column in self.columns.items():
+                value = column[row]
+                fields[name] = self.strings[value] if name in STRING_COLUMNS else value
+            return fields
+
+    def as_numpy(self):
+        """
+        Returns zero-copy NumPy views of the used part of every column.
+
+        The views alias the live table: in-place updates are visible through
+        them. After the table grows or rows are removed they no longer reflect
+        the current rows, so take new views for each evaluation.
+
+        Returns:
+            dict: Column name -> numpy.ndarray, including 'mmsi'.
+        """
+        import numpy
+
+        with self._lock:
+            size = self.size
+            views = {'mmsi': numpy.frombuffer(self.mmsi, dtype=numpy.int64)[:size]}
+            for name, column in self.columns.items():
+                views[name] = numpy.frombuffer(column, dtype=column.typecode)[:size]
+            return views
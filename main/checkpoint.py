@@ -0,0 +1,185 @@
+# checkpoint.py
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'VALCKPT1'
+# Header: magic, checkpoint wall time, number of entries
+HEADER = struct.Struct('<8sdI')
+# Entry: key length, payload length; followed by the key and the payload
+ENTRY = struct.Struct('<HI')
+
+
+class CheckpointSample:
+    """
+    A restored sample, shaped like a received one for the route callbacks.
+    """
+
+    __slots__ = ('key_expr', 'payload')
+
+    def __init__(self, key_expr, payload):
+        self.key_expr = key_expr
+        self.payload = payload
+
+
+def write(path, entries):
+    """
+    Writes a checkpoint file atomically.
+
+    The entries are written to a temporary file next to the target, which then
+    replaces it, so readers only ever see a complete checkpoint.
+
+    Args:
+        path (str): The checkpoint file path.
+        entries (dict): key -> raw payload bytes.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, time.time(), len(entries)))
+        for key, payload in entries.items():
+            key = key.encode('utf-8')
+            f.write(ENTRY.pack(len(key), len(payload)))
+            f.write(key)
+            f.write(payload)
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return size
+
+
+def read(path):
+    """
+    Reads a checkpoint file through a memory map.
+
+    Returns:
+        tuple: (checkpoint wall time, list of (key, payload bytes)), or
+        (None, []) if there is no valid checkpoint.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None, []
+    with f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            logger.warning(f"Ignoring truncated checkpoint {path}")
+            return None, []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, written, count = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                logger.warning(f"Ignoring checkpoint {path} with unknown format")
+                return None, []
+            entries = []
+            offset = HEADER.size
+            try:
+                for _ in range(count):
+                    key_length, payload_length = ENTRY.unpack_from(mm, offset)
+                    offset += ENTRY.size
+                    if offset + key_length + payload_length > len(mm):
+                        # Slicing past the end would return a short payload
+                        raise struct.error("entry past the end of the file")
+                    key = mm[offset:offset + key_length].decode('utf-8')
+                    offset += key_length
+                    entries.append((key, mm[offset:offset + payload_length]))
+                    offset += payload_length
+            except struct.error:
+                logger.warning(f"Checkpoint {path} is truncated, restoring {len(entries)} of {count} entries")
+    return written, entries
+
+
+def restore(path, routes, cache=None):
+    """
+    Replays a checkpoint through the route callbacks.
+
+    Args:
+        path (str): The checkpoint file path.
+        routes (list): (key expression, callback) pairs; each entry goes to the
+            first route matching its key. A callback returns False for an
+            entry it rejects.
+        cache (StateCache): Receives the accepted entries, if given, so they
+            are kept in the next checkpoint.
+
+    Returns:
+        int: The number of entries restored and accepted.
+    """
+    started = time.perf_counter()
+    written, entries = read(path)
+    if written is None:
+        return 0
+    restored = 0
+    for key, payload in entries:
+        for key_expr, callback in routes:
+            if utils.key_expr_matches(key_expr, key):
+                if callback(CheckpointSample(key, payload)) is not False:
+                    if cache is not None:
+                        cache.put(key, payload)
+                    restored += 1
+                break
+    logger.info(f"Restored {restored} samples from checkpoint {path} written {time.time() - written:.0f}s ago "
+                f"in {time.perf_counter() - started:.3f}s")
+    return restored
+
+
+class Checkpointer:
+    """
+    Periodically writes the latest payload per key to a checkpoint file.
+
+    Each checkpoint takes a shallow snapshot of the cache under its lock; the
+    payloads are immutable bytes, so the snapshot is the only copy and the file
+    is written from a background thread without blocking the ingest path.
+    """
+
+    def __init__(self, cache, path, interval=10.0):
+        """
+        Args:
+            cache (StateCache): The latest payload per key.
+            path (str): The checkpoint file path.
+            interval (float): Seconds between checkpoints.
+        """
+        self.cache = cache
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def checkpoint(self):
+        """
+        Writes one checkpoint of the current cache contents.
+        """
+        started = time.perf_counter()
+        entries = self.cache.snapshot()
+        try:
+            size = write(self.path, entries)
+        except OSError as e:
+            logger.error(f"Checkpoint to {self.path} failed: {e}")
+            return
+        logger.debug(f"Checkpointed {len(entries)} samples ({size} bytes) in {time.perf_counter() - started:.3f}s")
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                self.checkpoint()
+
+        self._thread = threading.Thread(target=run, name='checkpoint', daemon=True)
+        self._thread.start()
+        logger.info(f"Checkpointing to {self.path} every {self.interval}s")
+
+    def stop(self):
+        """
+        Stops the background thread and writes a final checkpoint.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.checkpoint()
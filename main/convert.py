@@ -0,0 +1,230 @@
+# convert.py
+
+import argparse
+import csv
+import functools
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from google.protobuf import json_format
+
+import utils
+import json_backend
+import decoders
+import checkpoint
+import val_standard_pb2
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s %(message)s", level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FORMATS = ('protobuf', 'csv')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Convert archived VAL traffic (lines of "KEY<TAB>JSON", optionally gzipped) to framed '
+                    'Protobuf or per-type CSV files, decoded exactly as the live processor decodes them')
+    parser.add_argument('inputs', nargs='+', help='Archive files')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Output file for protobuf, output directory for csv')
+    parser.add_argument('-f', '--format', default='protobuf', choices=FORMATS,
+                        help='protobuf: length-prefixed (key, message) frames as in checkpoints; '
+                             'csv: one file per message type with a column per scalar field')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes')
+    parser.add_argument('--chunk-lines', type=int, default=5000,
+                        help='Number of archive lines per work item')
+    parser.add_argument('--json-backend', default='auto', choices=('auto',) + json_backend.BACKENDS,
+                        help='JSON parser for payloads')
+    return parser.parse_args()
+
+
+def _routes():
+    # Route key expressions and message types as subscribed by the live processor
+    from sample_processor import ROUTE_MESSAGE_TYPES
+    return list(ROUTE_MESSAGE_TYPES.items())
+
+
+_worker_routes = None
+
+
+def _init_worker(backend):
+    global _worker_routes
+    json_backend.select(backend)
+    logging.getLogger('sample_processor').setLevel(logging.WARNING)
+    _worker_routes = [(key_expr, message_type) for key_expr, message_type in _routes()
+                      if decoders.schema.message_class(message_type) is not None]
+
+
+@functools.lru_cache(maxsize=None)
+def columns(descriptor, prefix=''):
+    """
+    Returns the dotted paths of the non-repeated scalar fields of a message type.
+
+    Repeated fields are kept as one column holding their JSON encoding.
+    """
+    paths = []
+    for field in descriptor.fields:
+        path = prefix + field.name
+        if field.label == field.LABEL_REPEATED:
+            paths.append(path)
+        elif field.message_type is not None:
+            paths.extend(columns(field.message_type, path + '.'))
+        else:
+            paths.append(path)
+    return tuple(paths)
+
+
+def _column_value(message, path):
+    value = message
+    for name in path.split('.'):
+        value = getattr(value, name)
+    if hasattr(value, 'extend'):  # repeated field
+        return json.dumps([json_format.MessageToDict(item, preserving_proto_field_name=True)
+                           if hasattr(item, 'DESCRIPTOR') else item for item in value])
+    return value
+
+
+def convert_chunk(lines, output_format):
+    """
+    Decodes a chunk of archive lines.
+
+    Returns:
+        tuple: (output, counts) where output is the framed bytes for protobuf or
+        message type -> list of CSV rows, and counts holds the number of
+        'converted', 'unrouted' and 'failed' lines.
+    """
+    counts = {'converted': 0, 'unrouted': 0, 'failed': 0}
+    frames = io.BytesIO()
+    rows = {}
+    for line in lines:
+        key, _, payload = line.rstrip(b'\r\n').partition(b'\t')
+        key = key.decode('utf-8', 'replace')
+        route = next(((key_expr, message_type) for key_expr, message_type in _worker_routes
+                      if utils.key_expr_matches(key_expr, key)), None)
+        if route is None:
+            counts['unrouted'] += 1
+            continue
+        key_expr, message_type = route
+        try:
+            message = decoders.decode(message_type, json_backend.loads(payload), key_expr)
+        except Exception as e:
+            logger.debug(f"Failed to convert {key}: {e}")
+            counts['failed'] += 1
+            continue
+        if output_format == 'protobuf':
+            serialized = message.SerializeToString()
+            encoded_key = key.encode('utf-8')
+            frames.write(checkpoint.ENTRY.pack(len(encoded_key), len(serialized)))
+            frames.write(encoded_key)
+            frames.write(serialized)
+        else:
+            row = [key] + [_column_value(message, path) for path in columns(message.DESCRIPTOR)]
+            rows.setdefault(message_type, []).append(row)
+        counts['converted'] += 1
+    return (frames.getvalue() if output_format == 'protobuf' else rows), counts
+
+
+def read_chunks(paths, chunk_lines, progress):
+    """
+    Yields chunks of archive lines, reading the inputs as a stream.
+    """
+    for path in paths:
+        with open(path, 'rb') as raw:
+            f = gzip.open(raw, 'rb') if path.endswith('.gz') else raw
+            chunk = []
+            for line in f:
+                if line.strip():
+                    chunk.append(line)
+                if len(chunk) == chunk_lines:
+                    progress['read'] = progress['done'] + raw.tell()
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+            progress['done'] += os.fstat(raw.fileno()).st_size
+
+
+class _Writer:
+    def __init__(self, output, output_format):
+        self.output_format = output_format
+        self.files = {}
+        self.writers = {}
+        if output_format == 'protobuf':
+            self.stream = open(output, 'wb')
+        else:
+            os.makedirs(output, exist_ok=True)
+            self.directory = output
+
+    def write(self, output):
+        if self.output_format == 'protobuf':
+            self.stream.write(output)
+            return
+        for message_type, rows in output.items():
+            writer = self.writers.get(message_type)
+            if writer is None:
+                f = self.files[message_type] = open(os.path.join(self.directory, f"{message_type}.csv"), 'w',
+                                                    newline='')
+                writer = self.writers[message_type] = csv.writer(f)
+                descriptor = getattr(val_standard_pb2, message_type).DESCRIPTOR
+                writer.writerow(['key', *columns(descriptor)])
+            writer.writerows(rows)
+
+    def close(self):
+        if self.output_format == 'protobuf':
+            self.stream.close()
+        for f in self.files.values():
+            f.close()
+
+
+def main():
+    args = parse_args()
+    backend = json_backend.select(args.json_backend)
+    total_bytes = sum(os.path.getsize(path) for path in args.inputs)
+    logger.info(f"Converting {len(args.inputs)} archives ({total_bytes / 1e6:.1f} MB) to {args.format} "
+                f"with {args.workers} workers, JSON backend {backend}")
+
+    writer = _Writer(args.output, args.format)
+    totals = {'converted': 0, 'unrouted': 0, 'failed': 0}
+    progress = {'read': 0, 'done': 0}
+    started = last_report = time.monotonic()
+    # Bounded number of chunks in flight, written in input order
+    in_flight = deque()
+    max_in_flight = 2 * args.workers
+
+    def collect():
+        output, counts = in_flight.popleft().result()
+        writer.write(output)
+        for name, count in counts.items():
+            totals[name] += count
+
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(backend,)) as executor:
+        for chunk in read_chunks(args.inputs, args.chunk_lines, progress):
+            if len(in_flight) >= max_in_flight:
+                collect()
+            in_flight.append(executor.submit(convert_chunk, chunk, args.format))
+            if time.monotonic() - last_report >= 5.0:
+                last_report = time.monotonic()
+                elapsed = last_report - started
+                logger.info(f"{100 * progress['read'] / max(total_bytes, 1):.1f}% read, "
+                            f"{totals['converted']} converted ({totals['converted'] / elapsed:.0f}/s), "
+                            f"{totals['failed']} failed, {totals['unrouted']} unrouted")
+        while in_flight:
+            collect()
+    writer.close()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Done in {elapsed:.1f}s: {totals['converted']} converted, {totals['failed']} failed, "
+                f"{totals['unrouted']} without a route")
+    return 0 if not totals['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
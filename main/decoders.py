@@ -0,0 +1,198 @@
+# decoders.py
+
+import logging
+
+import val_standard_pb2
+from schema import SchemaRegistry
+
+logger = logging.getLogger(__name__)
+
+# Decoders compiled from the generated schema
+schema = SchemaRegistry()
+schema.register('val_standard', val_standard_pb2)
+
+
+def decode_publish_stamp(json_data, stamp):
+    """
+    Extracts the publish_stamp of a payload into a Timestamp message.
+    """
+    if 'publish_stamp' in json_data:
+        stamp.sec = json_data['publish_stamp'].get('sec', 0)
+        stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
+
+
+def decode_measurement_properties(json_data, message, route=None):
+    """
+    Decodes a MeasurementPropertiesMessage payload.
+
+    Args:
+        json_data (dict): The parsed JSON payload.
+        message: The MeasurementPropertiesMessage to fill in.
+        route (str): The route key expression, for the unknown-field counts.
+    """
+    message.mmsi = json_data.get('mmsi', 0)
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'measurement_properties' in json_data:
+        schema.decode(json_data['measurement_properties'], message.measurement_properties, route)
+    else:
+        logger.error("No 'measurement_properties' key found in the message.")
+
+
+def decode_exercise_state(json_data, message, route=None):
+    """
+    Decodes an ExerciseState payload; a missing state decodes to UNKNOWN.
+    """
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'exercise_state' in json_data and 'state' in json_data['exercise_state']:
+        schema.decode(json_data['exercise_state'], message, route)
+    else:
+        message.state = val_standard_pb2.ExerciseState.UNKNOWN
+
+
+def decode_ais_vessel(json_data, message, route=None, statics_cache=None):
+    """
+    Decodes an AISVesselMessage payload.
+
+    Args:
+        statics_cache (AISStaticsCache): If given, the statics are stripped from
+            the payload and only parsed when they change.
+
+    Returns:
+        tuple: (statics, changed) from the statics cache, or (None, True).
+    """
+    message.ais_vessel.mmsi = json_data.get('mmsi', 0)
+    decode_publish_stamp(json_data, message.publish_stamp)
+    statics, statics_changed = None, True
+    if 'ais_vessel' in json_data:
+        ais_vessel_data = json_data['ais_vessel']
+        if statics_cache is not None:
+            # Parse only the kinematic fields; statics come from the cache
+            mmsi = ais_vessel_data.get('mmsi', message.ais_vessel.mmsi)
+            statics, statics_changed = statics_cache.split(mmsi, ais_vessel_data)
+        schema.decode(ais_vessel_data, message.ais_vessel, route)
+    else:
+        logger.error("No 'ais_vessel' key found in the message.")
+    return statics, statics_changed
+
+
+def decode_vessels(json_data, message, route=None):
+    """
+    Decodes a Vessels payload.
+    """
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'vessels' in json_data:
+        for vessel_data in json_data['vessels']:
+            schema.decode(vessel_data, message.vessels.add(), route)
+    else:
+        logger.error("No 'vessels' key found in the message.")
+
+
+def decode_measurement_value(json_data, message, route=None):
+    """
+    Decodes a MeasurementValue payload.
+    """
+    message.mmsi = json_data.get('mmsi', 0)
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'measurement' in json_data:
+        schema.decode(json_data['measurement'], message.measurement, route)
+    else:
+        logger.error("No 'measurement' key found in the message.")
+
+
+def decode_location_message(json_data, message, route=None):
+    """
+    Decodes a LocationMessage payload.
+    """
+    message.mmsi = json_data.get('mmsi', 0)
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'location' in json_data:
+        schema.decode(json_data['location'], message.location, route)
+    else:
+        logger.error("No 'location' key found in the message.")
+
+
+def decode_alerts(json_data, message, route=None):
+    """
+    Decodes an Alerts payload; alerts may be nested under an 'alert' key.
+    """
+    message.mmsi = json_data.get('mmsi', 0)
+    decode_publish_stamp(json_data, message.publish_stamp)
+
+    # Extract health, if the schema defines it
+    if 'health' in json_data:
+        schema.decode({'health': json_data['health']}, message, route)
+
+    if 'alerts' in json_data:
+        for alert_data in json_data['alerts']:
+            alert_fields = alert_data['alert'] if 'alert' in alert_data else alert_data
+            # Enum fields are mapped by name only where the schema defines them as enums
+            schema.decode(alert_fields, message.alerts.add(), route)
+    else:
+        logger.error("No 'alerts' key found in the message.")
+
+
+def decode_vessel_statics(json_data, message, route=None):
+    """
+    Decodes a VesselStaticsMessage payload.
+    """
+    message.mmsi = json_data.get('mmsi', 0)
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'vessel_statics' in json_data:
+        schema.decode(json_data['vessel_statics'], message.statics, route)
+    else:
+        logger.error("No 'vessel_statics' key found in the message.")
+
+
+def decode_assignments(json_data, message, route=None):
+    """
+    Decodes an Assignments payload; assignments may be nested under an 'assignment' key.
+    """
+    decode_publish_stamp(json_data, message.publish_stamp)
+    if 'assignments' in json_data:
+        for assignment_data in json_data['assignments']:
+            if 'assignment' in assignment_data:
+                assignment_fields = assignment_data['assignment']
+            else:
+                assignment_fields = assignment_data
+            schema.decode(assignment_fields, message.assignments.add(), route)
+    else:
+        logger.error("No 'assignments' key found in the message.")
+
+
+def decode_vessel_envelope(json_data, message, route=None):
+    """
+    Decodes a VesselEnvelope payload in one pass; each field is decoded as the schema defines it.
+    """
+    schema.decode(json_data, message, route)
+
+
+# Decoder of each message type: name -> decode(json_data, message, route)
+DECODERS = {
+    'MeasurementPropertiesMessage': decode_measurement_properties,
+    'ExerciseState': decode_exercise_state,
+    'AISVesselMessage': decode_ais_vessel,
+    'Vessels': decode_vessels,
+    'MeasurementValue': decode_measurement_value,
+    'LocationMessage': decode_location_message,
+    'Alerts': decode_alerts,
+    'VesselStaticsMessage': decode_vessel_statics,
+    'Assignments': decode_assignments,
+    'VesselEnvelope': decode_vessel_envelope,
+}
+
+
+def decode(message_type, json_data, route=None):
+    """
+    Decodes a parsed payload into a new message of a type.
+
+    Args:
+        message_type (str): The message type name, a key of DECODERS.
+        json_data (dict): The parsed JSON payload.
+        route (str): The route key expression, for the unknown-field counts.
+
+    Returns:
+        message: The decoded message.
+    """
+    message = getattr(val_standard_pb2, message_type)()
+    DECODERS[message_type](json_data, message, route)
+    return message
@@ -0,0 +1,406 @@
+# derived_signals.py
+
+import logging
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Linear unit definitions: units -> (dimension, scale, offset), where
+# value_in_base_unit = value * scale + offset.
+UNITS = {
+    # speed
+    'm/s': ('speed', 1.0, 0.0),
+    'kn': ('speed', 1852.0 / 3600.0, 0.0),
+    'knots': ('speed', 1852.0 / 3600.0, 0.0),
+    'km/h': ('speed', 1.0 / 3.6, 0.0),
+    # angle
+    'rad': ('angle', 1.0, 0.0),
+    'deg': ('angle', math.pi / 180.0, 0.0),
+    'degrees': ('angle', math.pi / 180.0, 0.0),
+    # angular rate
+    'rad/s': ('angular_rate', 1.0, 0.0),
+    'deg/s': ('angular_rate', math.pi / 180.0, 0.0),
+    'deg/min': ('angular_rate', math.pi / 180.0 / 60.0, 0.0),
+    # revolutions
+    'rps': ('revolutions', 1.0, 0.0),
+    'hz': ('revolutions', 1.0, 0.0),
+    'rpm': ('revolutions', 1.0 / 60.0, 0.0),
+    # length
+    'm': ('length', 1.0, 0.0),
+    'km': ('length', 1000.0, 0.0),
+    'nm': ('length', 1852.0, 0.0),
+    'ft': ('length', 0.3048, 0.0),
+    # temperature
+    'k': ('temperature', 1.0, 0.0),
+    'c': ('temperature', 1.0, 273.15),
+    'degc': ('temperature', 1.0, 273.15),
+    'f': ('temperature', 5.0 / 9.0, 273.15 - 32.0 * 5.0 / 9.0),
+    # pressure
+    'pa': ('pressure', 1.0, 0.0),
+    'kpa': ('pressure', 1000.0, 0.0),
+    'bar': ('pressure', 100000.0, 0.0),
+    # ratio
+    '%': ('ratio', 0.01, 0.0),
+    'ratio': ('ratio', 1.0, 0.0),
+}
+
+
+def unit_converter(from_units, to_units):
+    """
+    Builds a function converting values between two units.
+
+    Args:
+        from_units (str): Units of the input values.
+        to_units (str): Units of the output values.
+
+    Returns:
+        callable: A function mapping an input value to the output units, or None
+        if the units are unknown or of different dimensions.
+    """
+    source = UNITS.get(from_units.strip().lower())
+    target = UNITS.get(to_units.strip().lower())
+    if source is None or target is None or source[0] != target[0]:
+        return None
+    scale = source[1] / target[1]
+    offset = (source[2] - target[2]) / target[1]
+    return lambda value: value * scale + offset
+
+
+class _Node(ABC):
+    """
+    Base class of compiled expression nodes.
+
+    Every node keeps its own state per MMSI and is updated incrementally: update()
+    returns the new output of the node for the MMSI, or None when the sample did
+    not produce a new output.
+    """
+
+    def __init__(self, children=()):
+        self.children = list(children)
+        self.signals = set()
+        for child in self.children:
+            self.signals |= child.signals
+
+    @abstractmethod
+    def update(self, engine, mmsi, name, value, t):
+        pass
+
+    def units(self, engine, mmsi):
+        return self.children[0].units(engine, mmsi) if self.children else None
+
+    def reset(self):
+        for child in self.children:
+            child.reset()
+
+
+class _Signal(_Node):
+    """Leaf node: the latest value of a measurement."""
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.signals = {name}
+
+    def update(self, engine, mmsi, name, value, t):
+        return value if name == self.name else None
+
+    def units(self, engine, mmsi):
+        return engine.units.get((mmsi, self.name))
+
+
+class _MovingAverage(_Node):
+    """
+    Moving average over the last `window` finite outputs of the child node.
+
+    The sum is kept incrementally and recomputed from the window once every
+    `window` updates, or at once when a value larger than the remaining sum
+    leaves the window, so rounding errors do not accumulate. NaN and infinite
+    outputs are skipped, as one would otherwise stay in the sum for good.
+    """
+
+    def __init__(self, child, window):
+        super().__init__([child])
+        if window < 1:
+            raise ValueError("avg() window must be at least 1")
+        self.window = int(window)
+        self.state = {}
+
+    def update(self, engine, mmsi, name, value, t):
+        value = self.children[0].update(engine, mmsi, name, value, t)
+        if value is None or not math.isfinite(value):
+            return None
+        state = self.state.get(mmsi)
+        if state is None:
+            state = self.state[mmsi] = [deque(), 0.0, 0]  # window, sum, updates since re-base
+        samples = state[0]
+        samples.append(value)
+        state[1] += value
+        removed = samples.popleft() if len(samples) > self.window else 0.0
+        state[1] -= removed
+        state[2] += 1
+        if state[2] >= self.window or abs(removed) > abs(state[1]):
+            state[1] = math.fsum(samples)
+            state[2] = 0
+        return state[1] / len(samples)
+
+    def reset(self):
+        super().reset()
+        self.state.clear()
+
+
+class _Rate(_Node):
+    """Rate of change per second of the child node."""
+
+    def __init__(self, child):
+        super().__init__([child])
+        self.state = {}
+
+    def update(self, engine, mmsi, name, value, t):
+        value = self.children[0].update(engine, mmsi, name, value, t)
+        if value is None:
+            return None
+        previous = self.state.get(mmsi)
+        self.state[mmsi] = (t, value)
+        if previous is None or t <= previous[0]:
+            return None
+        return (value - previous[1]) / (t - previous[0])
+
+    def units(self, engine, mmsi):
+        return None
+
+    def reset(self):
+        super().reset()
+        self.state.clear()
+
+
+class _Difference(_Node):
+    """Difference between the latest outputs of two nodes."""
+
+    def __init__(self, left, right):
+        super().__init__([left, right])
+        self.state = {}
+
+    def update(self, engine, mmsi, name, value, t):
+        latest = self.state.get(mmsi)
+        if latest is None:
+            latest = self.state[mmsi] = [None, None]
+        changed = False
+        for index, child in enumerate(self.children):
+            if name in child.signals:
+                output = child.update(engine, mmsi, name, value, t)
+                if output is not None:
+                    latest[index] = output
+                    changed = True
+        if not changed or latest[0] is None or latest[1] is None:
+            return None
+        return latest[0] - latest[1]
+
+    def reset(self):
+        super().reset()
+        self.state.clear()
+
+
+class _Convert(_Node):
+    """Unit conversion of the child node, driven by MeasurementProperties.units."""
+
+    def __init__(self, child, to_units):
+        super().__init__([child])
+        self.to_units = to_units
+        self.converters = {}
+
+    def update(self, engine, mmsi, name, value, t):
+        value = self.children[0].update(engine, mmsi, name, value, t)
+        if value is None:
+            return None
+        from_units = self.children[0].units(engine, mmsi)
+        if from_units is None:
+            return None
+        key = (from_units, self.to_units)
+        if key not in self.converters:
+            self.converters[key] = unit_converter(from_units, self.to_units)
+            if self.converters[key] is None:
+                logger.warning(f"Cannot convert from '{from_units}' to '{self.to_units}'")
+        converter = self.converters[key]
+        return converter(value) if converter else None
+
+    def units(self, engine, mmsi):
+        return self.to_units
+
+
+_TOKEN = re.compile(r"\s*(?:(?P<number>-?\d+(?:\.\d*)?)|(?P<name>[A-Za-z_][\w.%/-]*)|(?P<string>'[^']*'|\"[^\"]*\")|(?P<op>[(),]))")
+
+
+def _tokenize(text):
+    position = 0
+    tokens = []
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise ValueError(f"Unexpected character at {position} in expression: {text}")
+        kind = match.lastgroup
+        token = match.group(kind)
+        if kind == 'string':
+            token = token[1:-1]
+        tokens.append((kind, token))
+        position = match.end()
+    return tokens
+
+
+def compile_expression(text):
+    """
+    Compiles a derived-signal expression into an evaluator tree.
+
+    Supported expressions, which can be nested:
+        <name>                   latest value of a measurement
+        avg(expr, N)             moving average over the last N samples
+        rate(expr)               rate of change per second
+        diff(expr, expr)         difference between two signals
+        convert(expr, units)     unit conversion from MeasurementProperties.units
+
+    Args:
+        text (str): The expression.
+
+    Returns:
+        _Node: The root of the compiled expression.
+    """
+    tokens = _tokenize(text)
+    position = 0
+
+    def expect(value):
+        nonlocal position
+        if position >= len(tokens) or tokens[position][1] != value:
+            raise ValueError(f"Expected '{value}' in expression: {text}")
+        position += 1
+
+    def argument():
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError(f"Unexpected end of expression: {text}")
+        kind, token = tokens[position]
+        position += 1
+        return kind, token
+
+    def expression():
+        nonlocal position
+        kind, token = argument()
+        if kind != 'name':
+            raise ValueError(f"Expected a signal or function name, got '{token}' in: {text}")
+        if position >= len(tokens) or tokens[position][1] != '(':
+            return _Signal(token)
+        expect('(')
+        if token == 'avg':
+            child = expression()
+            expect(',')
+            kind, window = argument()
+            if kind != 'number':
+                raise ValueError(f"avg() window must be a number in: {text}")
+            node = _MovingAverage(child, int(float(window)))
+        elif token == 'rate':
+            node = _Rate(expression())
+        elif token == 'diff':
+            left = expression()
+            expect(',')
+            node = _Difference(left, expression())
+        elif token == 'convert':
+            child = expression()
+            expect(',')
+            kind, units = argument()
+            if kind not in ('name', 'string'):
+                raise ValueError(f"convert() expects units in: {text}")
+            if units.strip().lower() not in UNITS:
+                raise ValueError(f"Unknown units '{units}' in: {text}")
+            node = _Convert(child, units)
+        else:
+            raise ValueError(f"Unknown function '{token}' in: {text}")
+        expect(')')
+        return node
+
+    root = expression()
+    if position != len(tokens):
+        raise ValueError(f"Trailing input in expression: {text}")
+    return root
+
+
+class DerivedSignalEngine:
+    """
+    Computes derived signals from MeasurementValue streams.
+
+    Expressions are compiled once and indexed by the measurement names they
+    depend on, so each incoming sample only updates the expressions that use it.
+    Every evaluator keeps running state per MMSI and updates in O(1) per sample.
+    """
+
+    def __init__(self, publish):
+        """
+        Args:
+            publish (callable): Called as publish(mmsi, name, value, publish_stamp)
+                for every new derived value.
+        """
+        self.publish = publish
+        self.units = {}
+        self.expressions = {}
+        self._by_signal = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, text):
+        """
+        Compiles and registers a derived signal.
+
+        Args:
+            name (str): Measurement name of the derived signal.
+            text (str): The expression, see compile_expression().
+        """
+        root = compile_expression(text)
+        with self._lock:
+            self.expressions[name] = root
+            for signal in root.signals:
+                self._by_signal.setdefault(signal, []).append((name, root))
+        logger.info(f"Registered derived signal {name} = {text}")
+
+    def set_units(self, mmsi, name, units):
+        """
+        Records the units of a measurement from its MeasurementProperties.
+        """
+        self.units[(mmsi, name)] = units
+
+    def update(self, message, publish=True):
+        """
+        Feeds a MeasurementValue message to the dependent expressions.
+
+        Args:
+            message: A val_standard_pb2.MeasurementValue message.
+            publish (bool): False to only advance the evaluator state, e.g. when
+                restoring a checkpoint.
+        """
+        name = message.measurement.name
+        dependents = self._by_signal.get(name)
+        if not dependents:
+            return
+        mmsi = message.mmsi
+        value = message.measurement.value
+        stamp = message.publish_stamp
+        t = stamp.sec + stamp.nanosec * 1e-9 or time.time()
+        outputs = []
+        with self._lock:
+            for derived_name, root in dependents:
+                output = root.update(self, mmsi, name, value, t)
+                if output is not None and math.isfinite(output):
+                    outputs.append((derived_name, output))
+        if not publish:
+            return
+        for derived_name, output in outputs:
+            self.publish(mmsi, derived_name, output, stamp)
+
+    def reset(self):
+        """
+        Drops all per-MMSI evaluator state, keeping the compiled expressions.
+        """
+        with self._lock:
+            for root in self.expressions.values():
+                root.reset()
@@ -0,0 +1,248 @@
+# downsampler.py
+
+import logging
+import math
+import threading
+import time
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+MODES = ('last', 'min', 'max', 'mean', 'deadband')
+
+# Numeric fields reduced by the aggregating modes, per message type
+VALUE_FIELDS = {
+    'MeasurementValue': (('measurement', 'value'),),
+    'LocationMessage': (('location', 'latitude'), ('location', 'longitude')),
+    'AISVesselMessage': (('ais_vessel', 'latitude'), ('ais_vessel', 'longitude'),
+                         ('ais_vessel', 'sog'), ('ais_vessel', 'cog')),
+}
+
+# Fields reduced together as one position; min/max keep them from the last message
+POSITION_FIELDS = {'latitude', 'longitude'}
+
+
+def parse_spec(spec):
+    """
+    Parses a downsampling specification of the form KEYEXPR=MODE:PARAM.
+
+    PARAM is the interval in seconds for the bucketing modes. For the 'deadband'
+    mode it is a comma-separated list of a required default threshold and
+    NAME=THRESHOLD overrides, where NAME is a value field (e.g. 'sog') or a
+    measurement name, e.g. "val/amoc/**/aisvessel=deadband:0.0001,sog=0.5,cog=5".
+    Thresholds are in the units of the field, so degrees for positions.
+
+    Args:
+        spec (str): The specification, e.g. "val/amoc/**/value=mean:1".
+
+    Returns:
+        tuple: (key_expr, mode, param), where the 'deadband' param is a dict of
+        name -> threshold with the default under None.
+    """
+    key_expr, _, rule = spec.partition('=')
+    mode, _, param = rule.partition(':')
+    mode = mode.strip().lower()
+    if not key_expr or mode not in MODES:
+        raise ValueError(f"Invalid downsampling spec '{spec}', expected KEYEXPR=MODE:PARAM with MODE in {MODES}")
+    if mode != 'deadband':
+        return key_expr.strip(), mode, float(param) if param else 1.0
+    thresholds = {}
+    for item in param.split(','):
+        name, _, threshold = item.rpartition('=')
+        if threshold.strip():
+            thresholds[name.strip() or None] = float(threshold)
+    if None not in thresholds:
+        # No default fits every field: 1.0 would be 60 NM for a latitude
+        raise ValueError(f"Invalid downsampling spec '{spec}', deadband needs a default threshold, "
+                         f"e.g. deadband:0.0001,sog=0.5")
+    return key_expr.strip(), mode, thresholds
+
+
+def _get_fields(message, fields):
+    values = []
+    for parent, name in fields:
+        values.append(getattr(getattr(message, parent), name))
+    return values
+
+
+def _set_fields(message, fields, values):
+    for (parent, name), value in zip(fields, values):
+        setattr(getattr(message, parent), name, value)
+
+
+def _thresholds(param, message, fields):
+    # A measurement name takes precedence over the field name
+    if not isinstance(param, dict):
+        return [param] * len(fields)
+    default = param[None]
+    if type(message).DESCRIPTOR.name == 'MeasurementValue' and message.measurement.name in param:
+        return [param[message.measurement.name]] * len(fields)
+    return [param.get(name, default) for _, name in fields]
+
+
+class _Stream:
+    __slots__ = ('mode', 'param', 'fields', 'bucket', 'count', 'values', 'message')
+
+    def __init__(self, mode, param, fields):
+        self.mode = mode
+        self.param = param
+        self.fields = fields
+        self.bucket = None
+        self.count = 0
+        self.values = None
+        self.message = None
+
+
+class Downsampler:
+    """
+    Reduces high-rate streams per route before republishing them.
+
+    Modes:
+        last      the latest message of each interval
+        min/max   the per-field minimum/maximum of each interval; latitude
+                  and longitude are taken from the last message, as their
+                  separate extremes would make a position never reported
+        mean      the per-field mean of each interval
+        deadband  every message whose values moved more than the threshold
+                  since the last published message; thresholds may be given
+                  per field or per measurement name
+
+    Streams are identified by their full key expression. Interval buckets use
+    the receive time; a bucket is emitted when the next bucket starts or on
+    flush().
+    """
+
+    def __init__(self, publish, prefix='downsampled'):
+        """
+        Args:
+            publish (callable): Called as publish(key, message) for each reduced message.
+            prefix (str): Key segment inserted after the root of republished keys.
+        """
+        self.publish = publish
+        self.prefix = prefix
+        self.routes = {}
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def add_route(self, key_expr, mode, param):
+        """
+        Enables downsampling for the messages received on a subscription.
+
+        Args:
+            key_expr (str): The key expression of the subscription.
+            mode (str): One of MODES.
+            param (float): Interval in seconds, or the deadband threshold; a
+                deadband also takes a dict of field or measurement name ->
+                threshold with the default under None.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown downsampling mode: {mode}")
+        if mode == 'deadband' and isinstance(param, dict) and None not in param:
+            raise ValueError("Deadband thresholds need a default under None")
+        if mode != 'deadband' and param <= 0:
+            raise ValueError(f"Downsampling interval must be positive, got {param}")
+        self.routes[key_expr] = (mode, param)
+        logger.info(f"Downsampling {key_expr} with mode {mode} ({param})")
+
+    def process(self, route, key, message, now=None):
+        """
+        Feeds a message received on a route to its downsampling stage.
+
+        Args:
+            route (str): The key expression of the subscription.
+            key (str): The key expression of the sample.
+            message: The decoded Protobuf message. It is copied when retained.
+            now (float): Receive time, defaults to time.monotonic().
+        """
+        config = self.routes.get(route)
+        if config is None:
+            return
+        mode, param = config
+        fields = VALUE_FIELDS.get(type(message).DESCRIPTOR.name, ())
+        if mode != 'last' and not fields:
+            return
+        if mode in ('min', 'max'):
+            fields = tuple(field for field in fields if field[1] not in POSITION_FIELDS)
+        if now is None:
+            now = time.monotonic()
+
+        emit = None
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _Stream(mode, param, fields)
+
+            if mode == 'deadband':
+                values = _get_fields(message, fields)
+                thresholds = _thresholds(param, message, fields)
+                if stream.values is None or any(abs(value - last) > threshold for value, last, threshold
+                                                in zip(values, stream.values, thresholds)):
+                    stream.values = values
+                    emit = message
+            else:
+                bucket = math.floor(now / param)
+                if stream.bucket is not None and bucket != stream.bucket:
+                    emit = self._reduce(stream, mode, fields)
+                if stream.bucket != bucket:
+                    stream.bucket = bucket
+                    stream.count = 0
+                    stream.values = None
+                self._accumulate(stream, mode, fields, message)
+
+        if emit is not None:
+            self.publish(utils.derived_key(self.prefix, key), emit)
+
+    def _accumulate(self, stream, mode, fields, message):
+        if stream.message is None or type(stream.message) is not type(message):
+            stream.message = type(message)()
+        stream.message.CopyFrom(message)
+        if mode == 'last':
+            return
+        values = _get_fields(message, fields)
+        if stream.values is None:
+            stream.values = values
+        elif mode == 'min':
+            stream.values = [min(a, b) for a, b in zip(stream.values, values)]
+        elif mode == 'max':
+            stream.values = [max(a, b) for a, b in zip(stream.values, values)]
+        else:
+            stream.values = [a + b for a, b in zip(stream.values, values)]
+        stream.count += 1
+
+    def _reduce(self, stream, mode, fields):
+        message = stream.message
+        stream.message = None
+        if message is None:
+            return None
+        if mode == 'mean' and stream.count:
+            _set_fields(message, fields, [value / stream.count for value in stream.values])
+        elif mode in ('min', 'max'):
+            _set_fields(message, fields, stream.values)
+        return message
+
+    def flush(self, now=None):
+        """
+        Emits every bucket whose interval has ended.
+
+        Args:
+            now (float): Current receive time; None emits all pending buckets.
+        """
+        pending = []
+        with self._lock:
+            for key, stream in self._streams.items():
+                if stream.mode == 'deadband' or stream.bucket is None or stream.message is None:
+                    continue
+                if now is not None and math.floor(now / stream.param) == stream.bucket:
+                    continue
+                pending.append((key, self._reduce(stream, stream.mode, stream.fields)))
+                stream.bucket = None
+        for key, message in pending:
+            self.publish(utils.derived_key(self.prefix, key), message)
+
+    def reset(self):
+        """
+        Drops all buffered buckets without emitting them.
+        """
+        with self._lock:
+            self._streams.clear()
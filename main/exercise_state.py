@@ -0,0 +1,73 @@
+# exercise_state.py
+
+import logging
+import threading
+
+import val_standard_pb2
+
+logger = logging.getLogger(__name__)
+
+
+def _state_name(state):
+    # Publishers may use a newer schema with states this one does not know
+    names = val_standard_pb2.ExerciseState.State
+    return names.Name(state) if state in names.values() else str(state)
+
+
+class ExerciseStateController:
+    """
+    Tracks the simulation exercise state and gates processing on it.
+
+    `active` is a plain attribute so hot paths can check it without a call:
+    processing is active while the exercise is PLAYING, and also while the state
+    is UNKNOWN so that a deployment without an exercise-state publisher is never
+    gated. Registered flush hooks run on every transition, reset hooks run when a
+    new exercise is ASSIGNED.
+    """
+
+    def __init__(self):
+        self.state = 0  # ExerciseState.UNKNOWN
+        self.active = True
+        self._flush_hooks = []
+        self._reset_hooks = []
+        self._lock = threading.Lock()
+
+    def on_flush(self, hook):
+        """
+        Registers a callable run on every exercise state transition.
+        """
+        self._flush_hooks.append(hook)
+
+    def on_reset(self, hook):
+        """
+        Registers a callable run when a new exercise is assigned.
+        """
+        self._reset_hooks.append(hook)
+
+    def update(self, state):
+        """
+        Applies a received ExerciseState.State value.
+
+        Args:
+            state (int): The ExerciseState.State enum value.
+        """
+        states = val_standard_pb2.ExerciseState
+        with self._lock:
+            previous = self.state
+            if state == previous:
+                return
+            self.state = state
+            self.active = state in (states.PLAYING, states.UNKNOWN)
+            logger.info(f"Exercise state {_state_name(previous)} -> {_state_name(state)}, "
+                        f"processing {'active' if self.active else 'paused'}")
+            for hook in self._flush_hooks:
+                self._run(hook)
+            if state == states.ASSIGNED:
+                for hook in self._reset_hooks:
+                    self._run(hook)
+
+    def _run(self, hook):
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"Exercise state hook {hook} failed: {e}")
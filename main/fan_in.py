@@ -0,0 +1,272 @@
+# fan_in.py
+
+import json
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+
+import zenoh
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+# Programming errors are raised, never taken for an unreachable router; zenoh
+# 0.11 does not export the type of its connection errors
+PROGRAMMING_ERRORS = (AttributeError, TypeError, NameError)
+
+
+def parse_router(spec):
+    """
+    Parses a router specification.
+
+    Args:
+        spec (str): "ENDPOINT" or "ENDPOINT=KEYEXPR,KEYEXPR", e.g.
+            "tcp/10.0.0.2:7447=val/amoc/**/value". Without key expressions the
+            router carries the whole key space.
+
+    Returns:
+        tuple: (endpoint, list of key expressions or None)
+    """
+    endpoint, _, key_exprs = spec.partition('=')
+    key_exprs = [key_expr.strip() for key_expr in key_exprs.split(',') if key_expr.strip()]
+    return endpoint.strip(), key_exprs or None
+
+
+class Deduplicator:
+    """
+    Drops samples already received through another router.
+
+    Recently seen (key, payload digest) pairs are kept in an LRU of bounded
+    size. A payload republished unchanged within the window is dropped too, which
+    VAL messages avoid by carrying their publish_stamp.
+    """
+
+    def __init__(self, size=65536):
+        self.size = size
+        self.duplicates = 0
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first(self, key, payload):
+        """
+        Returns True the first time a sample is seen.
+        """
+        entry = (key, zlib.crc32(payload), len(payload))
+        with self._lock:
+            if entry in self._seen:
+                self._seen.move_to_end(entry)
+                self.duplicates += 1
+                return False
+            self._seen[entry] = None
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+        return True
+
+
+class _Router:
+    __slots__ = ('endpoint', 'key_exprs', 'session', 'healthy')
+
+    def __init__(self, endpoint, key_exprs):
+        self.endpoint = endpoint
+        self.key_exprs = key_exprs
+        self.session = None
+        self.healthy = False
+
+    def open(self):
+        conf = zenoh.Config.from_json5(json.dumps({
+            "mode": "client",
+            "connect": {"endpoints": [self.endpoint]}
+        }))
+        self.session = zenoh.open(conf)
+        self.healthy = True
+
+    def covers(self, key):
+        return self.key_exprs is None or any(utils.key_expr_matches(key_expr, key) for key_expr in self.key_exprs)
+
+    def overlaps(self, key_expr):
+        return self.key_exprs is None or any(zenoh.KeyExpr(own).intersects(zenoh.KeyExpr(key_expr))
+                                             for own in self.key_exprs)
+
+
+class RouterSet:
+    """
+    Client sessions to several Zenoh routers, used like a single session.
+
+    Subscriptions are declared on every router whose key space overlaps them.
+    Routers restricted to key expressions only deliver samples inside them, so
+    the key space can be split across routers; samples arriving through more
+    than one router are deduplicated. Puts and queries go to a healthy router
+    covering the key, spread over routers by key hash, and fail over to the next
+    one on error. A background thread tracks router connectivity and retries
+    routers that could not be reached at startup, declaring the existing
+    subscriptions and queryables on them once they connect.
+    """
+
+    def __init__(self, routers, health_interval=1.0, dedup_size=65536):
+        """
+        Args:
+            routers (list): (endpoint, key expressions or None) pairs.
+            health_interval (float): Seconds between connectivity checks.
+            dedup_size (int): Number of recent samples remembered for deduplication.
+        """
+        self.routers = []
+        for endpoint, key_exprs in routers:
+            router = _Router(endpoint, key_exprs)
+            logger.info(f"Opening Zenoh session to {endpoint}" + (f" for {', '.join(key_exprs)}" if key_exprs else ""))
+            try:
+                router.open()
+            except PROGRAMMING_ERRORS:
+                raise
+            except Exception as e:
+                logger.warning(f"Router {endpoint} unreachable, retrying in the background: {e}")
+            self.routers.append(router)
+        if not any(router.session is not None for router in self.routers):
+            raise ConnectionError(f"No router reachable: {', '.join(router.endpoint for router in self.routers)}")
+        self.deduplicator = Deduplicator(dedup_size) if len(self.routers) > 1 else None
+        # Declarations replayed on routers opened later: (declare, key_expr, callback, _Subscribers)
+        self._declarations = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if len(self.routers) > 1:
+            threading.Thread(target=self._check_health, args=(health_interval,), name='routers', daemon=True).start()
+
+    def _check_health(self, interval):
+        while not self._stop.wait(interval):
+            for router in self.routers:
+                try:
+                    self._check_router(router)
+                except Exception:
+                    # Logged rather than raised: the checks must outlive a bug
+                    logger.exception(f"Health check of router {router.endpoint} failed")
+
+    def _check_router(self, router):
+        if router.session is None:
+            self._retry(router)
+            return
+        try:
+            info = router.session.info()
+            healthy = bool(info.routers_zid() or info.peers_zid())
+        except PROGRAMMING_ERRORS:
+            raise
+        except Exception:
+            healthy = False
+        if healthy != router.healthy:
+            router.healthy = healthy
+            logger.warning(f"Router {router.endpoint} {'reconnected' if healthy else 'lost, failing over'}")
+
+    def _retry(self, router):
+        try:
+            router.open()
+        except PROGRAMMING_ERRORS:
+            raise
+        except Exception:
+            return
+        logger.warning(f"Router {router.endpoint} connected")
+        with self._lock:
+            self._declarations = [entry for entry in self._declarations if not entry[3].undeclared]
+            for declare, key_expr, callback, declarations in self._declarations:
+                declaration = declare(router, key_expr, callback)
+                if declaration is not None:
+                    declarations.declarations.append(declaration)
+
+    def _open_routers(self):
+        return [router for router in self.routers if router.session is not None]
+
+    def _candidates(self, key):
+        routers = [router for router in self._open_routers() if router.covers(key)] or self._open_routers()
+        start = zlib.crc32(key.encode('utf-8')) % len(routers)
+        ordered = routers[start:] + routers[:start]
+        return [router for router in ordered if router.healthy] + [router for router in ordered if not router.healthy]
+
+    def put(self, key, payload):
+        """
+        Publishes through one router covering the key, failing over on error.
+        """
+        error = None
+        for router in self._candidates(key):
+            try:
+                router.session.put(key, payload)
+                return
+            except Exception as e:
+                error = e
+                router.healthy = False
+                logger.warning(f"Put to {router.endpoint} failed, failing over: {e}")
+        raise error
+
+    def get(self, key_expr, *args, **kwargs):
+        """
+        Queries through one healthy router overlapping the key expression.
+        """
+        routers = [router for router in self._open_routers() if router.overlaps(key_expr)] or self._open_routers()
+        router = next((router for router in routers if router.healthy), routers[0])
+        return router.session.get(key_expr, *args, **kwargs)
+
+    def declare_subscriber(self, key_expr, callback):
+        """
+        Subscribes on every router overlapping the key expression.
+
+        Returns:
+            _Subscribers: Undeclares all of them at once.
+        """
+        return self._declare(self._declare_subscriber, key_expr, callback)
+
+    def _declare_subscriber(self, router, key_expr, callback):
+        if router.overlaps(key_expr):
+            return router.session.declare_subscriber(key_expr, self._filtered(router, callback))
+        return None
+
+    def _declare(self, declare, key_expr, callback):
+        with self._lock:
+            declarations = _Subscribers([])
+            for router in self._open_routers():
+                declaration = declare(router, key_expr, callback)
+                if declaration is not None:
+                    declarations.declarations.append(declaration)
+            self._declarations.append((declare, key_expr, callback, declarations))
+        return declarations
+
+    def _filtered(self, router, callback):
+        if router.key_exprs is None and self.deduplicator is None:
+            return callback
+        deduplicator = self.deduplicator
+
+        def on_sample(sample):
+            key = str(sample.key_expr)
+            if router.key_exprs is not None and not router.covers(key):
+                return
+            if deduplicator is not None and not deduplicator.first(key, sample.payload):
+                return
+            callback(sample)
+
+        return on_sample
+
+    def declare_queryable(self, key_expr, callback):
+        """
+        Serves a queryable on every router, so each one can route queries to it.
+        """
+        return self._declare(lambda router, key_expr, callback: router.session.declare_queryable(key_expr, callback),
+                             key_expr, callback)
+
+    def info(self):
+        return ', '.join(f"{router.endpoint}: {router.session.info().zid() if router.session else 'unreachable'}"
+                         for router in self.routers)
+
+    def close(self):
+        self._stop.set()
+        for router in self._open_routers():
+            router.session.close()
+
+
+class _Subscribers:
+    __slots__ = ('declarations', 'undeclared')
+
+    def __init__(self, declarations):
+        self.declarations = declarations
+        self.undeclared = False
+
+    def undeclare(self):
+        self.undeclared = True
+        for declaration in self.declarations:
+            declaration.undeclare()
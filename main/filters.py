@@ -0,0 +1,137 @@
+# filters.py
+
+import fnmatch
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Cheap scans of the raw JSON bytes for the first top-level-looking field
+_MMSI_RE = re.compile(rb'"mmsi"\s*:\s*(\d+)')
+_NAME_RE = re.compile(rb'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+RULES = ('mmsi', '!mmsi', 'name', '!name', 'segment')
+
+
+class RouteFilter:
+    """
+    Pre-parse filter of one route, evaluated on the key and the raw payload.
+
+    Key segment rules only look at the key expression. MMSI and measurement
+    name rules scan the raw JSON bytes with a regular expression instead of
+    parsing them, taking the first "mmsi" and "name" fields found. A sample
+    whose payload has no such field is let through, so the filter never
+    rejects a sample it cannot judge. Rejections are counted per rule.
+    """
+
+    def __init__(self, route):
+        self.route = route
+        self.mmsi_allow = None
+        self.mmsi_deny = set()
+        self.name_allow = None
+        self.name_deny = []
+        self.segments = []  # (index, patterns)
+        self.rejected = {}
+
+    def add_rule(self, rule):
+        """
+        Adds a rule to the filter.
+
+        Args:
+            rule (str): One of
+                "mmsi:ID,ID" / "!mmsi:ID,ID": allowed / denied MMSIs,
+                "name:PATTERN,PATTERN" / "!name:PATTERN,PATTERN": allowed / denied
+                measurement names as fnmatch patterns,
+                "segment:INDEX=PATTERN,PATTERN": fnmatch patterns for a key
+                segment (negative indexes count from the end).
+        """
+        kind, _, values = rule.partition(':')
+        kind = kind.strip()
+        if kind not in RULES or not values:
+            raise ValueError(f"Invalid filter rule '{rule}'; expected one of {', '.join(RULES)} followed by ':'")
+        items = [value.strip() for value in values.split(',') if value.strip()]
+        if kind == 'mmsi':
+            self.mmsi_allow = (self.mmsi_allow or set()) | {int(item) for item in items}
+        elif kind == '!mmsi':
+            self.mmsi_deny |= {int(item) for item in items}
+        elif kind == 'name':
+            self.name_allow = (self.name_allow or []) + items
+        elif kind == '!name':
+            self.name_deny += items
+        else:
+            index, _, patterns = values.partition('=')
+            patterns = [pattern.strip() for pattern in patterns.split(',') if pattern.strip()]
+            self.segments.append((int(index), patterns))
+
+    def _reject(self, rule):
+        self.rejected[rule] = self.rejected.get(rule, 0) + 1
+        return False
+
+    def accepts(self, key, payload):
+        """
+        Checks a sample against the filter.
+
+        Args:
+            key (str): The concrete key expression of the sample.
+            payload: The raw payload bytes or memoryview.
+
+        Returns:
+            bool: False if the sample is rejected.
+        """
+        if self.segments:
+            parts = key.split('/')
+            for index, patterns in self.segments:
+                if not -len(parts) <= index < len(parts) \
+                        or not any(fnmatch.fnmatchcase(parts[index], pattern) for pattern in patterns):
+                    return self._reject('segment')
+        if self.mmsi_allow is not None or self.mmsi_deny:
+            match = _MMSI_RE.search(payload)
+            if match is not None:
+                mmsi = int(match.group(1))
+                if self.mmsi_allow is not None and mmsi not in self.mmsi_allow:
+                    return self._reject('mmsi')
+                if mmsi in self.mmsi_deny:
+                    return self._reject('!mmsi')
+        if self.name_allow is not None or self.name_deny:
+            match = _NAME_RE.search(payload)
+            if match is not None:
+                name = bytes(match.group(1)).decode('utf-8', 'replace')
+                if self.name_allow is not None and not any(fnmatch.fnmatchcase(name, p) for p in self.name_allow):
+                    return self._reject('name')
+                if any(fnmatch.fnmatchcase(name, pattern) for pattern in self.name_deny):
+                    return self._reject('!name')
+        return True
+
+
+def parse_filters(specs):
+    """
+    Parses --filter specifications into a filter per route.
+
+    Args:
+        specs (list of str): "KEYEXPR=RULE;RULE" strings; rules of the same
+            route in several specifications are combined.
+
+    Returns:
+        dict: route key expression -> RouteFilter
+    """
+    route_filters = {}
+    for spec in specs:
+        route, _, rules = spec.partition('=')
+        route = route.strip()
+        route_filter = route_filters.get(route)
+        if route_filter is None:
+            route_filter = route_filters[route] = RouteFilter(route)
+        for rule in rules.split(';'):
+            if rule.strip():
+                route_filter.add_rule(rule)
+    return route_filters
+
+
+def log_report(route_filters):
+    """
+    Logs the rejected sample counts of each filter.
+    """
+    for route, route_filter in sorted(route_filters.items()):
+        if route_filter.rejected:
+            counts = ', '.join(f"{rule} {count}" for rule, count in sorted(route_filter.rejected.items()))
+            logger.info(f"Filter {route} rejected: {counts}")
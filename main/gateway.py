@@ -0,0 +1,269 @@
+# gateway.py
+
+import asyncio
+import logging
+import threading
+
+from google.protobuf import json_format
+
+import json_backend
+
+logger = logging.getLogger(__name__)
+
+
+def parse_address(address):
+    """
+    Parses a HOST:PORT gateway address; the host defaults to localhost.
+    """
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class _Client:
+    __slots__ = ('name', 'writer', 'queue', 'sender', 'mmsis', 'topics')
+
+    def __init__(self, name, writer, queue_size):
+        self.name = name
+        self.writer = writer
+        self.queue = asyncio.Queue(queue_size)
+        self.sender = None
+        self.mmsis = set()
+        self.topics = set()
+
+
+class Gateway:
+    """
+    Local TCP gateway streaming decoded updates to many clients.
+
+    Clients send newline-delimited JSON commands, e.g.
+    {"op": "subscribe", "mmsi": [230000001], "topics": ["location"]}, and
+    receive one JSON object per line: {"topic", "mmsi", "key", "data"}. A client
+    gets an update when it subscribed to its vessel or its topic ("*" for all).
+
+    The latest message of every key is kept, so a subscription first receives
+    the current state of the keys it newly covers, then the live updates.
+
+    Each update is serialized once, in the publishing thread, and only if some
+    client is interested. The event loop runs in its own thread and copies the
+    encoded line into the bounded queue of each interested client; a client
+    whose queue is full is too slow and is disconnected.
+    """
+
+    def __init__(self, host='127.0.0.1', port=7448, queue_size=1024):
+        """
+        Args:
+            host (str): Address to listen on.
+            port (int): TCP port to listen on.
+            queue_size (int): Updates buffered per client before it is evicted.
+        """
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.clients = set()
+        self.by_mmsi = {}  # mmsi -> set of clients
+        self.by_topic = {}  # topic -> set of clients
+        self.everything = set()
+        self.evicted = 0
+        self.sent = 0
+        self._latest = {}  # key -> (topic, mmsi, message copy)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """
+        Starts the event loop thread and waits until the server listens.
+
+        Raises:
+            OSError: If the server cannot listen on the address.
+        """
+        threading.Thread(target=self._run, name='gateway', daemon=True).start()
+        if not self._ready.wait(timeout=10.0):
+            raise TimeoutError(f"Gateway did not start listening on {self.host}:{self.port}")
+        if self._error is not None:
+            raise self._error
+        logger.info(f"Gateway listening on {self.host}:{self.port}")
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+            # Port 0 picks a free port
+            self.port = self._server.sockets[0].getsockname()[1]
+        except Exception as e:
+            # Reported by start(); the loop is not published, so stop() is a no-op
+            self._error = e
+            loop.close()
+            self._ready.set()
+            return
+        self._loop = loop
+        self._ready.set()
+        loop.run_forever()
+        loop.close()
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for client in list(self.clients):
+                self._drop(client)
+            # Closed connections end their handlers
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if tasks:
+                await asyncio.wait(tasks, timeout=1.0)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=5.0)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def interested(self, topic, mmsi):
+        """
+        Returns True if any client subscribed to the topic or the vessel.
+        """
+        return bool(self.everything) or topic in self.by_topic or mmsi in self.by_mmsi
+
+    def publish(self, key, mmsi, message, live=True):
+        """
+        Sends a decoded message to the interested clients; thread-safe.
+
+        Args:
+            key: The key expression of the sample, a str or a Zenoh KeyExpr;
+                its last segment is the topic.
+            mmsi (int): The vessel MMSI, 0 for updates not tied to a vessel.
+            message: The decoded Protobuf message; it is copied, so pooled
+                messages may be released afterwards.
+            live (bool): False to only update the state sent to new
+                subscriptions, e.g. for restored samples.
+        """
+        key = str(key)
+        topic = key.rpartition('/')[2]
+        latest = type(message)()
+        latest.CopyFrom(message)
+        with self._lock:
+            self._latest[key] = (topic, mmsi, latest)
+        if not live or not self.interested(topic, mmsi):
+            return
+        self._loop.call_soon_threadsafe(self._fan_out, topic, mmsi, self._encode(key, topic, mmsi, latest))
+
+    @staticmethod
+    def _encode(key, topic, mmsi, message):
+        data = json_format.MessageToDict(message, preserving_proto_field_name=True)
+        return json_backend.dumps({'topic': topic, 'mmsi': mmsi, 'key': key, 'data': data}) + b'\n'
+
+    def _snapshot(self, client, mmsis, topics):
+        # The latest state of the keys a subscription adds to what the client
+        # already streams; the stored copies are never modified, so they are
+        # encoded here without the lock
+        if client in self.everything:
+            return []
+        everything = '*' in topics
+        with self._lock:
+            entries = list(self._latest.items())
+        return [self._encode(key, topic, mmsi, message) for key, (topic, mmsi, message) in entries
+                if (everything or topic in topics or mmsi in mmsis)
+                and topic not in client.topics and mmsi not in client.mmsis]
+
+    def reset(self):
+        """
+        Forgets the latest state, e.g. when a new exercise is assigned.
+        """
+        with self._lock:
+            self._latest.clear()
+
+    def _fan_out(self, topic, mmsi, line):
+        targets = self.everything.union(self.by_topic.get(topic, ()), self.by_mmsi.get(mmsi, ()))
+        for client in targets:
+            try:
+                client.queue.put_nowait(line)
+            except asyncio.QueueFull:
+                self.evicted += 1
+                logger.warning(f"Evicting slow gateway client {client.name}")
+                self._drop(client)
+
+    def _subscribe(self, client, mmsis, topics):
+        for mmsi in mmsis:
+            client.mmsis.add(mmsi)
+            self.by_mmsi.setdefault(mmsi, set()).add(client)
+        for topic in topics:
+            if topic == '*':
+                self.everything.add(client)
+                continue
+            client.topics.add(topic)
+            self.by_topic.setdefault(topic, set()).add(client)
+
+    def _unsubscribe(self, client, mmsis, topics):
+        for index, keys, subscribed in ((self.by_mmsi, mmsis, client.mmsis), (self.by_topic, topics, client.topics)):
+            for key in keys:
+                if key == '*':
+                    self.everything.discard(client)
+                    continue
+                subscribed.discard(key)
+                clients = index.get(key)
+                if clients is not None:
+                    clients.discard(client)
+                    if not clients:
+                        del index[key]
+
+    def _drop(self, client):
+        if client not in self.clients:
+            return
+        self.clients.discard(client)
+        self._unsubscribe(client, list(client.mmsis), list(client.topics) + ['*'])
+        client.sender.cancel()
+        client.writer.close()
+
+    async def _serve(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        client = _Client(f"{peer[0]}:{peer[1]}" if peer else 'unknown', writer, self.queue_size)
+        self.clients.add(client)
+        logger.info(f"Gateway client connected: {client.name}")
+        client.sender = asyncio.ensure_future(self._send(client))
+        try:
+            while client in self.clients:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    command = json_backend.loads(line)
+                    mmsis = [int(mmsi) for mmsi in command.get('mmsi', ())]
+                    topics = [str(topic) for topic in command.get('topics', ())]
+                    if command.get('op') == 'subscribe':
+                        snapshot = self._snapshot(client, mmsis, topics)
+                        self._subscribe(client, mmsis, topics)
+                        if snapshot:
+                            # Written ahead of the queue: later updates of these
+                            # keys are only queued from now on
+                            client.writer.writelines(snapshot)
+                            self.sent += len(snapshot)
+                    elif command.get('op') == 'unsubscribe':
+                        self._unsubscribe(client, mmsis, topics)
+                    else:
+                        raise ValueError(f"unknown op {command.get('op')!r}")
+                except Exception as e:
+                    logger.warning(f"Invalid gateway command from {client.name}: {e}")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._drop(client)
+            logger.info(f"Gateway client disconnected: {client.name}")
+
+    async def _send(self, client):
+        queue, writer = client.queue, client.writer
+        try:
+            while True:
+                lines = [await queue.get()]
+                # Write everything queued before waiting for the socket to drain
+                while not queue.empty():
+                    lines.append(queue.get_nowait())
+                writer.writelines(lines)
+                self.sent += len(lines)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def log_report(self):
+        logger.info(f"Gateway: {len(self.clients)} clients, {self.sent} updates sent, {self.evicted} clients evicted")
@@ -0,0 +1,201 @@
+# geofence.py
+
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of point-edge pairs evaluated in one NumPy batch
+MAX_BATCH = 4 * 1024 * 1024
+
+
+class Zone:
+    """
+    A polygon zone: all rings of its polygons as one set of edges.
+
+    With the even-odd rule, holes and multi-polygons need no special handling:
+    a point is inside when a ray from it crosses an odd number of edges.
+    """
+
+    __slots__ = ('name', 'x1', 'y1', 'x2', 'y2', 'bbox')
+
+    def __init__(self, name, rings):
+        """
+        Args:
+            name (str): The zone name used in the alerts.
+            rings (list): Rings as lists of [longitude, latitude] positions.
+
+        Raises:
+            ValueError: If no ring has at least 3 positions.
+        """
+        self.name = name
+        starts, ends = [], []
+        for ring in rings:
+            ring = np.asarray(ring, dtype=np.float64)
+            if ring.ndim != 2 or ring.shape[1] < 2 or len(ring) < 3:
+                continue
+            ring = ring[:, :2]
+            starts.append(ring)
+            ends.append(np.roll(ring, -1, axis=0))
+        if not starts:
+            raise ValueError(f"Zone {name} has no ring of at least 3 positions")
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+        self.x1, self.y1 = starts[:, 0], starts[:, 1]
+        self.x2, self.y2 = ends[:, 0], ends[:, 1]
+        self.bbox = (starts[:, 0].min(), starts[:, 1].min(), starts[:, 0].max(), starts[:, 1].max())
+
+    def contains(self, lon, lat):
+        """
+        Batched even-odd point-in-polygon test.
+
+        Args:
+            lon (numpy.ndarray): Longitudes of the points.
+            lat (numpy.ndarray): Latitudes of the points.
+
+        Returns:
+            numpy.ndarray: Boolean array, True for points inside the zone.
+        """
+        inside = np.zeros(len(lon), dtype=bool)
+        step = max(1, MAX_BATCH // len(self.x1))
+        for start in range(0, len(lon), step):
+            px = lon[start:start + step, None]
+            py = lat[start:start + step, None]
+            straddles = (self.y1 > py) != (self.y2 > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crossing_x = (self.x2 - self.x1) * (py - self.y1) / (self.y2 - self.y1) + self.x1
+            crossings = np.count_nonzero(straddles & (px < crossing_x), axis=1)
+            inside[start:start + step] = crossings % 2 == 1
+        return inside
+
+
+def load_zones(path):
+    """
+    Loads polygon zones from a GeoJSON file.
+
+    Polygon and MultiPolygon features (or bare geometries) are loaded; the zone
+    name is the 'name' property, the feature id or the feature's position.
+
+    Returns:
+        list: The Zone objects.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+    zones = []
+    for number, feature in enumerate(features):
+        geometry = feature.get('geometry', feature)
+        properties = feature.get('properties') or {}
+        name = str(properties.get('name', feature.get('id', f"zone {number}")))
+        if geometry.get('type') == 'Polygon':
+            rings = geometry['coordinates']
+        elif geometry.get('type') == 'MultiPolygon':
+            rings = [ring for polygon in geometry['coordinates'] for ring in polygon]
+        else:
+            logger.warning(f"Skipping {geometry.get('type')} geometry of {name}: only polygons are geofences")
+            continue
+        try:
+            zones.append(Zone(name, rings))
+        except ValueError as e:
+            logger.warning(f"Skipping geofence zone {name}: {e}")
+    logger.info(f"Loaded {len(zones)} geofence zones from {path}")
+    return zones
+
+
+class GeofenceEngine:
+    """
+    Evaluates vessel positions against polygon zones in batches.
+
+    Position updates only store the latest position per MMSI. On each
+    evaluation the updated positions are tested in one pass: a bounding-box
+    prefilter over all (vessel, zone) pairs, then a vectorized point-in-polygon
+    test per zone for the vessels inside its box only. Enter and exit events
+    are derived from the change in each vessel's set of zones.
+    """
+
+    def __init__(self, zones):
+        """
+        Args:
+            zones (list of Zone): The zones to evaluate.
+        """
+        self.zones = zones
+        self.bboxes = np.array([zone.bbox for zone in zones], dtype=np.float64).reshape(-1, 4)
+        self.inside = {}  # mmsi -> frozenset of zone indices
+        self._pending = {}  # mmsi -> (latitude, longitude)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def update(self, mmsi, latitude, longitude):
+        """
+        Records the latest position of a vessel for the next evaluation.
+        """
+        with self._lock:
+            self._pending[mmsi] = (latitude, longitude)
+
+    def evaluate(self):
+        """
+        Tests the positions updated since the last evaluation.
+
+        Returns:
+            list: (mmsi, zone name, entered) events, entered False for exits.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or not self.zones:
+            return []
+        mmsis = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        positions = np.array(list(pending.values()), dtype=np.float64)
+        lat, lon = positions[:, 0], positions[:, 1]
+
+        b = self.bboxes
+        candidates = ((lon[:, None] >= b[:, 0]) & (lat[:, None] >= b[:, 1])
+                      & (lon[:, None] <= b[:, 2]) & (lat[:, None] <= b[:, 3]))
+        membership = np.zeros_like(candidates)
+        for index in np.flatnonzero(candidates.any(axis=0)):
+            points = np.flatnonzero(candidates[:, index])
+            membership[points, index] = self.zones[index].contains(lon[points], lat[points])
+
+        events = []
+        for row, mmsi in enumerate(mmsis.tolist()):
+            now_inside = frozenset(np.flatnonzero(membership[row]).tolist())
+            before = self.inside.get(mmsi, frozenset())
+            if now_inside == before:
+                continue
+            for index in sorted(now_inside - before):
+                events.append((mmsi, self.zones[index].name, True))
+            for index in sorted(before - now_inside):
+                events.append((mmsi, self.zones[index].name, False))
+            if now_inside:
+                self.inside[mmsi] = now_inside
+            else:
+                self.inside.pop(mmsi, None)
+        return events
+
+    def reset(self):
+        with self._lock:
+            self._pending = {}
+            self.inside.clear()
+
+    def start(self, interval, on_event):
+        """
+        Evaluates at a fixed interval from a background thread.
+
+        Args:
+            interval (float): Seconds between evaluations.
+            on_event (callable): Called as on_event(mmsi, zone name, entered).
+        """
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    for event in self.evaluate():
+                        on_event(*event)
+                except Exception as e:
+                    logger.error(f"Geofence evaluation failed: {e}")
+
+        threading.Thread(target=run, name='geofence', daemon=True).start()
+        logger.info(f"Evaluating {len(self.zones)} geofence zones every {interval}s")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,342 @@
+# history.py
+
+import bisect
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import zenoh
+
+import val_standard_pb2
+
+logger = logging.getLogger(__name__)
+
+# Recorded message types; the index stores the position in this tuple
+TYPES = ('MeasurementValue', 'LocationMessage', 'AISVesselMessage')
+POSITION_TYPES = ('LocationMessage', 'AISVesselMessage')
+
+SEGMENT_MAGIC = b'VALSEG02'
+INDEX_MAGIC = b'VALIDX01'
+# Index header: magic, earliest and latest record time, number of records
+INDEX_HEADER = struct.Struct('<8sddQ')
+# Index record: type, name hash, mmsi, time, offset and length in the segment.
+# Records are sorted by (type, mmsi, time).
+INDEX_RECORD = struct.Struct('<B3xIqdQI')
+# Segment frame preceding each message: type, name hash, mmsi, time, length.
+# Frames make a segment self-describing, so a lost index can be rebuilt.
+FRAME = struct.Struct('<B3xIqdI')
+
+
+def _name_hash(name):
+    return zlib.crc32(name.encode('utf-8')) if name else 0
+
+
+def _sort_key(record):
+    return record[0], record[2], record[3]
+
+
+def _write_index(index_path, records):
+    """
+    Writes the sorted index of a segment atomically.
+    """
+    records = sorted(records, key=_sort_key)
+    times = [record[3] for record in records]
+    with open(f"{index_path}.tmp", 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, min(times, default=0.0), max(times, default=0.0), len(records)))
+        for record in records:
+            f.write(INDEX_RECORD.pack(*record))
+    os.replace(f"{index_path}.tmp", index_path)
+
+
+class _IndexView:
+    """
+    Sequence of (type, mmsi, time) sort keys over a memory-mapped index, for bisect.
+    """
+
+    def __init__(self, mm):
+        self.mm = mm
+        self.count = (len(mm) - INDEX_HEADER.size) // INDEX_RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def record(self, i):
+        return INDEX_RECORD.unpack_from(self.mm, INDEX_HEADER.size + i * INDEX_RECORD.size)
+
+    def __getitem__(self, i):
+        type_id, _, mmsi, t, _, _ = self.record(i)
+        return type_id, mmsi, t
+
+
+class _ListView:
+    """
+    The same sequence over the sorted in-memory index of the open segment.
+    """
+
+    def __init__(self, records):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self, i):
+        return self.records[i]
+
+    def __getitem__(self, i):
+        type_id, _, mmsi, t, _, _ = self.records[i]
+        return type_id, mmsi, t
+
+
+class HistoryStore:
+    """
+    Segment recorder and time-indexed query API over recorded VAL messages.
+
+    Messages are appended as framed serialized Protobuf to segment files. Each
+    closed segment gets a sidecar index of fixed-size records sorted by (type, MMSI,
+    time), so queries binary search memory-mapped indexes and read only the
+    matching records. Segments whose time range misses a query are skipped by
+    their index header alone. The open segment is searched through its sorted
+    in-memory index. Segments left without an index by a crash or kill are
+    indexed from their frames at startup.
+    """
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, segment_seconds=600.0):
+        """
+        Args:
+            directory (str): Directory of the segment and index files.
+            segment_bytes (int): Segment size after which a new segment is started.
+            segment_seconds (float): Segment age after which a new segment is started.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._opened = None
+        self._records = []
+        self._rebuild_indexes()
+        self._closed = sorted(glob.glob(os.path.join(directory, '*.idx')))
+
+    def _rebuild_indexes(self):
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.seg'))):
+            index_path = path[:-len('.seg')] + '.idx'
+            if os.path.exists(index_path):
+                continue
+            records = self._scan_segment(path)
+            if records is None:
+                logger.warning(f"Cannot index history segment {path}: unknown format")
+                continue
+            _write_index(index_path, records)
+            logger.info(f"Rebuilt index of history segment {path} with {len(records)} records")
+
+    @staticmethod
+    def _scan_segment(path):
+        """
+        Reads the index records of a segment from its frames; a frame cut off by
+        a crash ends the scan.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(SEGMENT_MAGIC):
+            return None
+        records = []
+        offset = len(SEGMENT_MAGIC)
+        while offset + FRAME.size <= len(data):
+            type_id, name_hash, mmsi, t, length = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            if offset + length > len(data) or type_id >= len(TYPES):
+                break
+            records.append((type_id, name_hash, mmsi, t, offset, length))
+            offset += length
+        return records
+
+    # Recording
+
+    def _open_segment(self):
+        self._opened = time.time()
+        name = int(self._opened * 1000)
+        while os.path.exists(os.path.join(self.directory, f"{name:015d}.seg")):
+            name += 1  # segments named by start time in ms, kept unique
+        self._path = os.path.join(self.directory, f"{name:015d}.seg")
+        self._file = open(self._path, 'wb')
+        self._file.write(SEGMENT_MAGIC)
+        self._records = []
+
+    def _close_segment(self):
+        self._file.close()
+        index_path = self._path[:-len('.seg')] + '.idx'
+        _write_index(index_path, self._records)
+        self._closed.append(index_path)
+        logger.info(f"Closed history segment {self._path} with {len(self._records)} records")
+        self._file = None
+
+    def record(self, message, t, mmsi, name=''):
+        """
+        Appends a message to the open segment.
+
+        Args:
+            message: A message of one of TYPES.
+            t (float): The message time in seconds.
+            mmsi (int): The vessel MMSI.
+            name (str): The measurement name, for MeasurementValue messages.
+        """
+        type_id = TYPES.index(type(message).__name__)
+        payload = message.SerializeToString()
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+            name_hash = _name_hash(name)
+            self._file.write(FRAME.pack(type_id, name_hash, mmsi, float(t), len(payload)))
+            offset = self._file.tell()
+            self._file.write(payload)
+            self._records.append((type_id, name_hash, mmsi, float(t), offset, len(payload)))
+            if offset + len(payload) >= self.segment_bytes or time.time() - self._opened >= self.segment_seconds:
+                self._close_segment()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._close_segment()
+
+    # Queries
+
+    def _segments(self, t1, t2):
+        """
+        Yields (view, segment path) of the segments overlapping [t1, t2].
+        """
+        for index_path in list(self._closed):
+            with open(index_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size <= INDEX_HEADER.size:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    _, first, last, _ = INDEX_HEADER.unpack_from(mm, 0)
+                    if last < t1 or first > t2:
+                        continue
+                    yield _IndexView(mm), index_path[:-len('.idx')] + '.seg'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            records = list(self._records)
+            path = self._path
+        # Sorted outside the lock, so queries never hold up recording
+        records.sort(key=_sort_key)
+        yield _ListView(records), path
+
+    @staticmethod
+    def _read(path, records, message_class):
+        messages = []
+        if not records:
+            return messages
+        with open(path, 'rb') as f:
+            for _, _, _, t, offset, length in records:
+                message = message_class()
+                message.ParseFromString(os.pread(f.fileno(), length, offset))
+                messages.append((t, message))
+        return messages
+
+    def measurements(self, mmsi, name, t1, t2):
+        """
+        Returns the recorded MeasurementValue messages of one signal in a time range.
+
+        Args:
+            mmsi (int): The vessel MMSI.
+            name (str): The measurement name.
+            t1 (float): Start time in seconds, inclusive.
+            t2 (float): End time in seconds, inclusive.
+
+        Returns:
+            list: (time, MeasurementValue) pairs in time order.
+        """
+        type_id = TYPES.index('MeasurementValue')
+        name_hash = _name_hash(name)
+        results = []
+        for view, path in self._segments(t1, t2):
+            lo = bisect.bisect_left(view, (type_id, mmsi, t1))
+            hi = bisect.bisect_right(view, (type_id, mmsi, t2))
+            records = [view.record(i) for i in range(lo, hi)]
+            records = [record for record in records if record[1] == name_hash]
+            results.extend((t, message) for t, message in self._read(path, records, val_standard_pb2.MeasurementValue)
+                           if message.measurement.name == name)
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def fleet_positions_at(self, t, lookback=600.0):
+        """
+        Returns the last recorded position of every vessel at a time.
+
+        Args:
+            t (float): The time in seconds.
+            lookback (float): Vessels without a position in [t - lookback, t]
+                are left out.
+
+        Returns:
+            dict: mmsi -> (time, latitude, longitude)
+        """
+        latest = {}  # mmsi -> (time, path, record, type name)
+        for view, path in self._segments(t - lookback, t):
+            for type_name in POSITION_TYPES:
+                type_id = TYPES.index(type_name)
+                i = bisect.bisect_left(view, (type_id, -2 ** 63, float('-inf')))
+                while i < len(view) and view[i][0] == type_id:
+                    mmsi = view[i][1]
+                    # Last record of this vessel at or before t, then skip to the next vessel
+                    last = bisect.bisect_right(view, (type_id, mmsi, t), i) - 1
+                    if last >= i:
+                        record = view.record(last)
+                        if record[3] >= t - lookback and record[3] >= latest.get(mmsi, (float('-inf'),))[0]:
+                            latest[mmsi] = (record[3], path, record, type_name)
+                    i = bisect.bisect_left(view, (type_id, mmsi + 1, float('-inf')), i)
+
+        positions = {}
+        for mmsi, (record_t, path, record, type_name) in latest.items():
+            _, message = self._read(path, [record], getattr(val_standard_pb2, type_name))[0]
+            if type_name == 'LocationMessage':
+                positions[mmsi] = (record_t, message.location.latitude, message.location.longitude)
+            else:
+                positions[mmsi] = (record_t, message.ais_vessel.latitude, message.ais_vessel.longitude)
+        return positions
+
+    # Zenoh queryable
+
+    def reply(self, query):
+        """
+        Queryable callback for val/history/**.
+
+        Supported selectors:
+            val/history/measurements?mmsi=X&name=Y&start=T1&end=T2
+                replies with the MeasurementValue messages.
+            val/history/positions?t=T[&lookback=S]
+                replies with one LocationMessage per vessel.
+        """
+        key_expr = str(query.selector.key_expr)
+        parameters = query.selector.decode_parameters()
+        try:
+            if key_expr.endswith('/measurements'):
+                results = self.measurements(int(parameters['mmsi']), parameters['name'],
+                                            float(parameters.get('start', 0.0)),
+                                            float(parameters.get('end', time.time())))
+                for _, message in results:
+                    query.reply(zenoh.Sample(key_expr, message.SerializeToString()))
+            elif key_expr.endswith('/positions'):
+                t = float(parameters.get('t', time.time()))
+                positions = self.fleet_positions_at(t, float(parameters.get('lookback', 600.0)))
+                for mmsi, (record_t, latitude, longitude) in positions.items():
+                    message = val_standard_pb2.LocationMessage()
+                    message.mmsi = mmsi
+                    message.location.latitude = latitude
+                    message.location.longitude = longitude
+                    message.publish_stamp.sec = int(record_t)
+                    message.publish_stamp.nanosec = int((record_t - int(record_t)) * 1e9)
+                    query.reply(zenoh.Sample(key_expr, message.SerializeToString()))
+            else:
+                logger.warning(f"Unknown history query: {query.selector}")
+        except (KeyError, ValueError) as e:
+            logger.error(f"Invalid history query {query.selector}: {e}")
@@ -0,0 +1,70 @@
+# json_backend.py
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Backends in order of preference for 'auto'
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+# The selected backend; see select()
+name = None
+loads = None
+dumps = None
+DecodeError = None
+
+
+def _json_loads(data):
+    # json.loads only takes str, bytes or bytearray; other buffers are copied
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _load_backend(backend):
+    if backend == 'orjson':
+        import orjson
+        return orjson.loads, orjson.dumps, (orjson.JSONDecodeError,)
+    if backend == 'msgspec':
+        import msgspec
+        return msgspec.json.decode, msgspec.json.encode, (msgspec.DecodeError, json.JSONDecodeError)
+    if backend == 'json':
+        return _json_loads, _json_dumps, (json.JSONDecodeError,)
+    raise ValueError(f"Unknown JSON backend: {backend}")
+
+
+def select(backend='auto'):
+    """
+    Selects the JSON parser used for all payloads, and its encoder.
+
+    All backends parse UTF-8 bytes directly, without an intermediate str;
+    orjson and msgspec also parse a memoryview in place. With
+    'auto' the fastest installed parser is used and the stdlib json module is the
+    fallback. dumps() encodes compact JSON to UTF-8 bytes with every backend.
+
+    Args:
+        backend (str): 'auto' or one of BACKENDS.
+
+    Returns:
+        str: The name of the selected backend.
+    """
+    global name, loads, dumps, DecodeError
+    candidates = BACKENDS if backend == 'auto' else (backend,)
+    for candidate in candidates:
+        try:
+            loads, dumps, DecodeError = _load_backend(candidate)
+        except ImportError:
+            if backend != 'auto':
+                raise
+            continue
+        name = candidate
+        logger.debug(f"Using JSON backend: {name}")
+        return name
+
+
+select()
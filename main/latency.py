@@ -0,0 +1,222 @@
+# latency.py
+
+import logging
+import math
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('publish_to_receive', 'receive_to_decoded', 'decoded_to_handled')
+
+# Smallest latency distinguished by the sketches, in seconds
+MIN_LATENCY = 1e-6
+
+# Cheap scans of the raw JSON bytes for the publish stamp, as in filters.py
+_STAMP_RE = re.compile(rb'"publish_stamp"\s*:\s*\{([^{}]*)\}')
+_SEC_RE = re.compile(rb'"sec"\s*:\s*(\d+)')
+_NANOSEC_RE = re.compile(rb'"nanosec"\s*:\s*(\d+)')
+
+
+def scan_publish_stamp(payload):
+    """
+    Reads the publish stamp from raw JSON bytes without parsing them.
+
+    Args:
+        payload: The raw payload bytes or memoryview.
+
+    Returns:
+        float: The stamp in seconds, or None if no non-zero stamp was found.
+    """
+    match = _STAMP_RE.search(payload)
+    if match is None:
+        return None
+    fields = match.group(1)
+    sec = _SEC_RE.search(fields)
+    if sec is None or not int(sec.group(1)):
+        return None
+    nanosec = _NANOSEC_RE.search(fields)
+    return int(sec.group(1)) + (int(nanosec.group(1)) * 1e-9 if nanosec is not None else 0.0)
+
+
+class RollingSketch:
+    """
+    Rolling quantile sketch with bounded relative error.
+
+    Values are counted in logarithmic buckets (as in DDSketch), so adding a value
+    is O(1) and memory grows with the dynamic range rather than the number of
+    samples. Two windows are kept and rotated, so quantiles cover between one and
+    two windows of recent samples. Handler threads add values while the report
+    reads them, so the buckets are guarded by a lock.
+    """
+
+    def __init__(self, window=60.0, relative_accuracy=0.01):
+        self.window = window
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._current = {}
+        self._previous = {}
+        self._rotated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rotate(self, now):
+        if now - self._rotated >= self.window:
+            self._previous = self._current if now - self._rotated < 2 * self.window else {}
+            self._current = {}
+            self._rotated = now
+
+    def add(self, value):
+        """
+        Adds a latency in seconds.
+        """
+        index = math.ceil(math.log(max(value, MIN_LATENCY)) / self._log_gamma)
+        with self._lock:
+            self._rotate(time.monotonic())
+            self._current[index] = self._current.get(index, 0) + 1
+
+    def count(self):
+        with self._lock:
+            return sum(self._current.values()) + sum(self._previous.values())
+
+    def quantiles(self, qs):
+        """
+        Returns the latency at each quantile, or None if the sketch is empty.
+
+        Args:
+            qs (list of float): Quantiles in [0, 1].
+        """
+        with self._lock:
+            self._rotate(time.monotonic())
+            counts = dict(self._previous)
+            for index, count in self._current.items():
+                counts[index] = counts.get(index, 0) + count
+        total = sum(counts.values())
+        if not total:
+            return [None] * len(qs)
+        indices = sorted(counts)
+        results = []
+        for q in qs:
+            rank = q * (total - 1)
+            seen = 0
+            for index in indices:
+                seen += counts[index]
+                if seen > rank:
+                    break
+            results.append(2 * self.gamma ** index / (self.gamma + 1))
+        return results
+
+
+class LatencyTracker:
+    """
+    Per-route latency of the ingest pipeline, with optional load shedding.
+
+    Three stages are tracked per route: publish_to_receive (publish_stamp to
+    arrival, across hosts so subject to clock offset), receive_to_decoded and
+    decoded_to_handled. Routes with a freshness budget drop samples whose
+    publish-to-receive latency exceeds it: received() judges the publish stamp
+    scanned from the raw payload, so stale samples are dropped before they are
+    parsed, and decoded() judges the decoded stamp of payloads the scan could
+    not read.
+    """
+
+    def __init__(self, window=60.0, budgets=None):
+        """
+        Args:
+            window (float): Rolling window of the sketches in seconds.
+            budgets (dict): Route key expression -> freshness budget in seconds.
+        """
+        self.window = window
+        self.budgets = dict(budgets or {})
+        self.shed = {}
+        self._sketches = {}
+        self._lock = threading.Lock()
+
+    def _sketch(self, route, stage):
+        sketch = self._sketches.get((route, stage))
+        if sketch is None:
+            with self._lock:
+                sketch = self._sketches.setdefault((route, stage), RollingSketch(self.window))
+        return sketch
+
+    def record(self, route, stage, seconds):
+        """
+        Records the latency of one pipeline stage for a route.
+        """
+        self._sketch(route, stage).add(seconds)
+
+    def received(self, route, payload, received_wall):
+        """
+        Records the publish-to-receive latency of a raw sample and decides on
+        shedding before it is parsed.
+
+        Args:
+            route (str): The route key expression.
+            payload: The raw JSON payload bytes or memoryview.
+            received_wall (float): Receive time as time.time().
+
+        Returns:
+            bool: False if the sample is stale and should be dropped, None if
+            the payload has no readable publish stamp and decoded() must decide.
+        """
+        stamp = scan_publish_stamp(payload)
+        if stamp is None:
+            return None
+        return self._admit(route, received_wall - stamp)
+
+    def decoded(self, route, publish_stamp, received_wall, decode_seconds):
+        """
+        Records the latencies known once a sample is decoded and decides on shedding.
+
+        Args:
+            route (str): The route key expression.
+            publish_stamp: The Timestamp of the message, or None if received()
+                already judged the sample.
+            received_wall (float): Receive time as time.time().
+            decode_seconds (float): Time spent decoding.
+
+        Returns:
+            bool: False if the sample is stale and should be dropped.
+        """
+        self.record(route, 'receive_to_decoded', decode_seconds)
+        if publish_stamp is None or not publish_stamp.sec:
+            return True
+        return self._admit(route, received_wall - (publish_stamp.sec + publish_stamp.nanosec * 1e-9))
+
+    def _admit(self, route, age):
+        self.record(route, 'publish_to_receive', age)
+        budget = self.budgets.get(route)
+        if budget is not None and age > budget:
+            with self._lock:
+                self.shed[route] = self.shed.get(route, 0) + 1
+            return False
+        return True
+
+    def report(self, qs=(0.5, 0.9, 0.99)):
+        """
+        Returns the current latency quantiles.
+
+        Returns:
+            dict: route -> stage -> {'count': n, 'p50': seconds, ...}
+        """
+        report = {}
+        for (route, stage), sketch in list(self._sketches.items()):
+            values = sketch.quantiles(qs)
+            entry = {'count': sketch.count()}
+            for q, value in zip(qs, values):
+                entry[f"p{q * 100:g}"] = value
+            report.setdefault(route, {})[stage] = entry
+        return report
+
+    def log_report(self):
+        """
+        Logs the current latency quantiles and shed counts per route.
+        """
+        for route, stages in sorted(self.report().items()):
+            parts = []
+            for stage in STAGES:
+                entry = stages.get(stage)
+                if entry and entry['count']:
+                    parts.append(f"{stage} p50={entry['p50'] * 1e3:.2f}ms p99={entry['p99'] * 1e3:.2f}ms")
+            shed = self.shed.get(route, 0)
+            logger.info(f"Latency {route}: {', '.join(parts)}" + (f", shed {shed}" if shed else ""))
@@ -0,0 +1,68 @@
+# message_pool.py
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class MessagePool:
+    """
+    Per-thread pools of reusable Protobuf messages.
+
+    Each thread keeps its own free list per message class, so acquiring and
+    releasing never takes a lock. Released messages are Clear()ed and handed out
+    again by the next acquire() of the same class on that thread. Nested
+    messages belong to their parent and are cleared and refilled with it.
+
+    Contract: a message is owned by the code that acquired it until it is
+    released. Anything that needs the data afterwards must copy it (CopyFrom,
+    or read out the scalar values) and must not keep references to the message
+    or its nested messages.
+    """
+
+    def __init__(self, max_size=64):
+        """
+        Args:
+            max_size (int): Maximum number of free messages kept per class and
+                thread; surplus releases are left to the garbage collector.
+        """
+        self.max_size = max_size
+        self.created = 0
+        self.reused = 0
+        self._local = threading.local()
+
+    def _free(self, message_class):
+        pools = getattr(self._local, 'pools', None)
+        if pools is None:
+            pools = self._local.pools = {}
+        free = pools.get(message_class)
+        if free is None:
+            free = pools[message_class] = []
+        return free
+
+    def acquire(self, message_class):
+        """
+        Returns an empty message of a class, reusing a released one if possible.
+        """
+        free = self._free(message_class)
+        if free:
+            self.reused += 1
+            return free.pop()
+        self.created += 1
+        return message_class()
+
+    def release(self, message):
+        """
+        Clears a message and returns it to the current thread's pool.
+        """
+        free = self._free(type(message))
+        if len(free) < self.max_size:
+            message.Clear()
+            free.append(message)
+
+    def stats(self):
+        """
+        Returns the number of messages created and reused so far.
+        """
+        return {'created': self.created, 'reused': self.reused}
@@ -0,0 +1,189 @@
+# profiling.py
+
+import cProfile
+import heapq
+import logging
+import os
+import pstats
+import random
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """
+    Sampled timing of route handlers and pipeline stages, with on-demand capture.
+
+    Only wrapped callables pay for profiling, so nothing is wrapped unless the
+    profiler is enabled. A fraction of samples is timed end to end; stage timings
+    are taken only within timed samples. The slowest samples of the current
+    report window are kept with their key expression and payload size; each
+    report starts a new window, so one old outlier does not hide later ones.
+
+    While a capture is running every handler call runs under a per-thread
+    cProfile.Profile (cProfile only sees the thread it is enabled on); the
+    profiles are merged into one stats file when the capture stops.
+    """
+
+    def __init__(self, sample_rate=0.01, slowest=20, output_dir='.'):
+        """
+        Args:
+            sample_rate (float): Fraction of samples timed, in [0, 1].
+            slowest (int): Number of slowest samples kept per report window.
+            output_dir (str): Directory of the cProfile capture files.
+        """
+        self.sample_rate = sample_rate
+        self.slowest = slowest
+        self.output_dir = output_dir
+        self.stats = {}  # name -> [count, total seconds, max seconds]
+        self._slowest = []  # min-heap of (seconds, wall time, route, key, payload size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = None  # list of per-thread profiles while capturing
+
+    def _record(self, name, seconds):
+        with self._lock:
+            entry = self.stats.get(name)
+            if entry is None:
+                entry = self.stats[name] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+    def wrap_handler(self, route, callback):
+        """
+        Wraps a route callback with sampled timing and capture support.
+
+        Args:
+            route (str): The route key expression.
+            callback (callable): Called with the received sample.
+        """
+        local = self._local
+
+        def profiled(sample):
+            profiles = self._profiles
+            if profiles is not None:
+                profile = getattr(local, 'profile', None)
+                if profile is None or profile not in profiles:
+                    profile = local.profile = cProfile.Profile()
+                    with self._lock:
+                        profiles.append(profile)
+                return profile.runcall(callback, sample)
+            if random.random() >= self.sample_rate:
+                return callback(sample)
+            local.timed = True
+            started = time.perf_counter()
+            try:
+                return callback(sample)
+            finally:
+                seconds = time.perf_counter() - started
+                local.timed = False
+                self._record(route, seconds)
+                entry = (seconds, time.time(), route, str(sample.key_expr), len(sample.payload))
+                with self._lock:
+                    if len(self._slowest) < self.slowest:
+                        heapq.heappush(self._slowest, entry)
+                    elif seconds > self._slowest[0][0]:
+                        heapq.heapreplace(self._slowest, entry)
+
+        return profiled
+
+    def wrap_stage(self, name, function):
+        """
+        Wraps a pipeline stage so it is timed within timed samples.
+
+        Args:
+            name (str): The stage name in the report.
+            function (callable): The stage function.
+        """
+        local = self._local
+
+        def profiled(*args, **kwargs):
+            if not getattr(local, 'timed', False):
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._record(f"stage:{name}", time.perf_counter() - started)
+
+        return profiled
+
+    def start_capture(self):
+        """
+        Starts a cProfile capture of all handler calls.
+        """
+        if self._profiles is None:
+            self._profiles = []
+            logger.info("Profile capture started")
+
+    def stop_capture(self):
+        """
+        Stops the running capture and writes the merged stats.
+
+        Returns:
+            str: The stats file path, or None if nothing was captured.
+        """
+        profiles, self._profiles = self._profiles, None
+        if not profiles:
+            logger.info("Profile capture stopped, no samples handled")
+            return None
+        path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.pstats")
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(path)
+        logger.info(f"Profile capture of {len(profiles)} threads written to {path}")
+        return path
+
+    def toggle_capture(self):
+        if self._profiles is None:
+            self.start_capture()
+        else:
+            self.stop_capture()
+
+    def slowest_samples(self, reset=False):
+        """
+        Returns the slowest timed samples of the current window, slowest first.
+
+        Args:
+            reset (bool): Start a new window.
+
+        Returns:
+            list: (seconds, wall time, route, key expression, payload size) tuples.
+        """
+        with self._lock:
+            slowest = self._slowest
+            if reset:
+                self._slowest = []
+        return sorted(slowest, reverse=True)
+
+    def log_report(self):
+        """
+        Logs the handler and stage timings and the slowest samples since the
+        previous report.
+        """
+        with self._lock:
+            stats = sorted(self.stats.items())
+        for name, (count, total, longest) in stats:
+            logger.info(f"Profile {name}: {count} timed, mean {total / count * 1e3:.3f}ms, "
+                        f"max {longest * 1e3:.3f}ms")
+        for seconds, wall, route, key, size in self.slowest_samples(reset=True):
+            logger.info(f"Slow sample {seconds * 1e3:.3f}ms at {time.strftime('%H:%M:%S', time.localtime(wall))}: "
+                        f"{key} ({size} bytes, route {route})")
+
+    def install_signal_handlers(self):
+        """
+        Toggles a capture on SIGUSR1 and logs the report on SIGUSR2.
+
+        Must be called from the main thread.
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            logger.warning("Profiling signals are not available on this platform")
+            return
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle_capture())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.log_report())
+        logger.info(f"Profiling enabled: SIGUSR1 toggles a capture, SIGUSR2 logs the slowest samples "
+                    f"(pid {os.getpid()})")
@@ -1,15 +1,43 @@
 # main.py
 
-import zenoh
+import time
 import logging
 import warnings
 import atexit
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import utils
+import json_backend
+from derived_signals import DerivedSignalEngine
+import downsampler
+import state_cache
+import checkpoint
+import fan_in
+import filters
+from gateway import Gateway, parse_address
+from shm_export import ShmExport
+from history import HistoryStore
+from watchdog import StalenessWatchdog, DEFAULT_TIMEOUTS
+from station_index import StationIndex
+from ais_table import AISTable
+from ais_statics import AISStaticsCache
+from latency import LatencyTracker
+from message_pool import MessagePool
+from profiling import Profiler
+from scheduler import PriorityScheduler, PRIORITY_CLASSES
+import decoders
+from exercise_state import ExerciseStateController
+import argparse
+
+import zenoh
 import val_standard_pb2  # Import the generated Protobuf classes
 from google.protobuf import json_format
-from google.protobuf import descriptor
-import argparse
-import time
+
+startup_time = time.perf_counter()
+
+# Decoders compiled from the generated schema, shared with the bulk converter
+schema = decoders.schema
 
 # Initialize logging
 logging.basicConfig(
@@ -19,47 +47,343 @@ logger = logging.getLogger(__name__)
 logging.captureWarnings(True)
 warnings.filterwarnings("once")
 
+# Key expressions of the subscriptions
+KEY_EXPR_MEASUREMENT_PROPERTIES = "val/amoc/**/properties"
+KEY_EXPR_EXERCISE_STATE = "val/amoc/exercise_state"
+KEY_EXPR_AIS_VESSEL = "val/amoc/**/aisvessel"
+KEY_EXPR_VESSELS = "val/amoc/vessels"
+KEY_EXPR_MEASUREMENT_VALUE = "val/amoc/**/value" # "val/amoc/**/measurement"
+KEY_EXPR_LOCATION_MESSAGE = "val/amoc/**/location"
+KEY_EXPR_ALERTS = "val/amoc/**/alerts"
+KEY_EXPR_VESSEL_STATICS = "val/amoc/**/vessel_statics"
+KEY_EXPR_ASSIGNMENTS = "val/amoc/assignments"
+KEY_EXPR_VESSEL_ENVELOPE = "val/amoc/**/vessel_envelope"
+
 # Global variables
 session = None
+derived_engine = None
+sample_downsampler = None
+latest_state = None
+station_index = None
+ais_table = None
+ais_statics = None
+track_service = None
+latency = None
+message_pool = None
+profiler = None
+scheduler = None
+checkpoint_state = None
+history = None
+watchdog = None
+geofences = None
+route_filters = None
+gateway = None
+shared_state = None
+sample_context = threading.local()
+first_message_received = False
+exercise = ExerciseStateController()
+
+# Routes whose payloads carry the MMSI of one vessel, filtered by --allow-mmsi and --deny-mmsi
+MMSI_KEY_EXPRS = [KEY_EXPR_MEASUREMENT_PROPERTIES, KEY_EXPR_AIS_VESSEL, KEY_EXPR_MEASUREMENT_VALUE,
+                  KEY_EXPR_LOCATION_MESSAGE, KEY_EXPR_ALERTS, KEY_EXPR_VESSEL_STATICS]
+
+# Subscriptions whose latest sample per key is served to late joiners
+STATE_KEY_EXPRS = [KEY_EXPR_EXERCISE_STATE, KEY_EXPR_ASSIGNMENTS, KEY_EXPR_VESSEL_STATICS]
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Subscribe over zenoh')
     parser.add_argument('-k', '--key', default='val/**', help='Key expression to subscribe to')
-    parser.add_argument('-r', '--router_address', default='tcp/127.0.0.1:7447', help='Zenoh router address')
+    parser.add_argument('-r', '--router_address', action='append', metavar='ENDPOINT[=KEYEXPR,...]',
+                        help='Zenoh router address (default tcp/127.0.0.1:7447). Repeat to connect to several '
+                             'routers; samples are merged and deduplicated, and an optional key expression list '
+                             'limits a router to part of the key space')
+    parser.add_argument('-d', '--derived', action='append', default=[], metavar='NAME=EXPR',
+                        help='Derived signal to compute and republish, e.g. sog_avg="avg(convert(sog, kn), 10)"')
+    parser.add_argument('--downsample', action='append', default=[], metavar='KEYEXPR=MODE:PARAM',
+                        help=f'Downsample a subscription and republish it under val/downsampled/, '
+                             f'e.g. "{KEY_EXPR_MEASUREMENT_VALUE}=mean:1". Modes: {", ".join(downsampler.MODES)}; '
+                             f'deadband takes per-field or per-measurement thresholds, e.g. "deadband:0.1,sog=0.5,rpm=10"')
+    parser.add_argument('--station-streams', action='store_true',
+                        help='Republish each vessel sample under val/stations/<station_id>/ for the stations '
+                             'watching or controlling the vessel')
+    parser.add_argument('--ais-table', action='store_true',
+                        help='Keep AIS targets in a columnar in-memory table')
+    parser.add_argument('--cache-ais-statics', action='store_true',
+                        help='Parse AIS statics only when they change and handle the kinematic fields at full rate')
+    parser.add_argument('--track-rate', type=float, default=0.0, metavar='HZ',
+                        help='Publish interpolated/dead-reckoned positions of all vessels under val/tracks/ '
+                             'at this rate (0 disables)')
+    parser.add_argument('--latency', action='store_true',
+                        help='Track publish-to-receive, decode and handling latency per route')
+    parser.add_argument('--freshness', action='append', default=[], metavar='KEYEXPR=SECONDS',
+                        help='Drop samples of a route older than SECONDS since publish (enables --latency)')
+    parser.add_argument('--latency-report', type=float, default=30.0, metavar='SECONDS',
+                        help='Interval between latency and scheduler reports in the log')
+    parser.add_argument('--schedule', action='store_true',
+                        help='Handle samples on worker threads by priority class, so alerts, exercise state and '
+                             'assignments overtake bulk measurement values')
+    parser.add_argument('--schedule-workers', type=int, default=1,
+                        help='Number of scheduler worker threads')
+    parser.add_argument('--slo', action='append', default=[], metavar='CLASS=SECONDS',
+                        help=f'Latency SLO of a priority class ({", ".join(PRIORITY_CLASSES)}), warned about when exceeded')
+    parser.add_argument('--bulk-queue', type=int, default=PRIORITY_CLASSES['bulk'][2],
+                        help='Maximum number of queued bulk samples; the oldest are dropped when full')
+    parser.add_argument('--normal-queue', type=int, default=PRIORITY_CLASSES['normal'][2],
+                        help='Maximum number of queued normal samples; the oldest are dropped when full')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time a sample of handler calls and pipeline stages; SIGUSR1 toggles a cProfile '
+                             'capture and SIGUSR2 logs the slowest recent samples')
+    parser.add_argument('--profile-sample-rate', type=float, default=0.01,
+                        help='Fraction of samples timed with --profile')
+    parser.add_argument('--profile-dir', default='.',
+                        help='Directory of the cProfile capture files')
+    parser.add_argument('--pool-messages', action='store_true',
+                        help='Reuse decoded Protobuf messages from per-thread pools instead of allocating '
+                             'new ones for every sample')
+    parser.add_argument('--json-backend', default='auto', choices=('auto',) + json_backend.BACKENDS,
+                        help='JSON parser for payloads; auto picks the fastest installed one')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='Restore the latest sample per key from this file at startup and checkpoint to it '
+                             'periodically')
+    parser.add_argument('--checkpoint-interval', type=float, default=10.0,
+                        help='Seconds between checkpoints')
+    parser.add_argument('--watchdog', action='store_true',
+                        help='Publish alerts under val/watchdog/<mmsi>/alerts when a vessel\'s location, AIS or '
+                             'measurement stream goes quiet')
+    parser.add_argument('--stale', action='append', default=[], metavar='TOPIC=SECONDS',
+                        help=f'Staleness timeout of a topic ({", ".join(DEFAULT_TIMEOUTS)}), enables --watchdog')
+    parser.add_argument('--geofences', metavar='GEOJSON',
+                        help='Polygon zones to test vessel positions against; enter and exit events are published '
+                             'under val/geofence/<mmsi>/alerts')
+    parser.add_argument('--geofence-interval', type=float, default=1.0,
+                        help='Seconds between geofence evaluations')
+    parser.add_argument('--record', metavar='DIR',
+                        help='Record measurement values and positions to indexed segments in DIR and answer '
+                             'history queries on val/history/**')
+    parser.add_argument('--filter', action='append', default=[], metavar='KEYEXPR=RULE;RULE',
+                        help='Pre-parse filter of a route; rules are mmsi:ID,ID, !mmsi:ID,ID, name:PATTERN,PATTERN, '
+                             '!name:PATTERN,PATTERN and segment:INDEX=PATTERN')
+    parser.add_argument('--allow-mmsi', metavar='ID,ID',
+                        help='Only process samples of these vessels on the per-vessel routes')
+    parser.add_argument('--deny-mmsi', metavar='ID,ID',
+                        help='Drop samples of these vessels on the per-vessel routes')
+    parser.add_argument('--measurement', action='append', default=[], metavar='PATTERN',
+                        help='Only process measurement values and properties whose name matches a pattern')
+    parser.add_argument('--gateway', metavar='HOST:PORT',
+                        help='Stream decoded updates as newline-delimited JSON to local TCP clients subscribing '
+                             'to vessels or topics')
+    parser.add_argument('--gateway-queue', type=int, default=1024,
+                        help='Updates buffered per gateway client before a slow client is disconnected')
+    parser.add_argument('--shm-export', metavar='NAME',
+                        help='Export vessel kinematics, latest measurements and alert counts to a shared memory '
+                             'table NAME for processes on this host (see shm_export.ShmReader)')
+    parser.add_argument('--shm-vessels', type=int, default=4096,
+                        help='Number of vessels in the shared memory table')
+    parser.add_argument('--shm-measurements', type=int, default=16,
+                        help='Number of measurements per vessel in the shared memory table')
+    parser.add_argument('--serve-state', action='store_true',
+                        help='Cache the latest exercise state, assignments and vessel statics, serve them to '
+                             'late joiners over a queryable and seed them from peers at startup')
+    parser.add_argument('--seed-timeout', type=float, default=2.0,
+                        help='Timeout in seconds when seeding the state cache from peers')
     return parser.parse_args()
 
+def publish(key, message):
+    """
+    Publishes a Protobuf message on the current session.
+    """
+    utils.publish_message(session, key, message)
+
+def publish_derived_value(mmsi, name, value, publish_stamp):
+    """
+    Publishes a derived signal as a MeasurementValue message.
+    """
+    message = val_standard_pb2.MeasurementValue()
+    message.mmsi = mmsi
+    message.measurement.name = name
+    message.measurement.value = value
+    message.publish_stamp.CopyFrom(publish_stamp)
+    publish(f"val/derived/{mmsi}/{name}/value", message)
+
+def publish_tracks(t, mmsis, latitudes, longitudes):
+    """
+    Publishes one tick of track positions as LocationMessage messages.
+    """
+    sec = int(t)
+    nanosec = int((t - sec) * 1e9)
+    # One message is reused for the whole tick; publish() serializes it right away
+    message = val_standard_pb2.LocationMessage()
+    for mmsi, latitude, longitude in zip(mmsis.tolist(), latitudes.tolist(), longitudes.tolist()):
+        message.Clear()
+        message.mmsi = mmsi
+        message.location.latitude = latitude
+        message.location.longitude = longitude
+        message.location.quality = val_standard_pb2.Location.ESTIMATED
+        message.publish_stamp.sec = sec
+        message.publish_stamp.nanosec = nanosec
+        publish(f"val/tracks/{mmsi}/location", message)
+
+def publish_staleness_alert(mmsi, topic, name, last_seen, recovered=False):
+    """
+    Publishes an Alerts message for a stream that went stale or recovered.
+    """
+    signal = f"{topic} {name}".strip()
+    message = val_standard_pb2.Alerts()
+    message.mmsi = mmsi
+    alert = message.alerts.add()
+    if recovered:
+        alert.description = f"{signal} updates resumed"
+        alert.category = 'INFO'
+    else:
+        alert.description = f"No {signal} update since {time.strftime('%H:%M:%S', time.localtime(last_seen))}"
+        alert.category = 'WARNING'
+    alert.source = 'watchdog'
+    now = time.time()
+    alert.activation_time.sec = int(now)
+    alert.activation_time.nanosec = int((now - int(now)) * 1e9)
+    message.publish_stamp.CopyFrom(alert.activation_time)
+    logger.warning(f"MMSI {mmsi}: {alert.description}")
+    publish(f"val/watchdog/{mmsi}/alerts", message)
+    if gateway is not None:
+        gateway.publish(f"val/watchdog/{mmsi}/alerts", mmsi, message)
+
+def publish_geofence_alert(mmsi, zone, entered):
+    """
+    Publishes an Alerts message for a vessel entering or leaving a geofence zone.
+    """
+    message = val_standard_pb2.Alerts()
+    message.mmsi = mmsi
+    alert = message.alerts.add()
+    alert.description = f"{'Entered' if entered else 'Left'} zone {zone}"
+    alert.category = 'WARNING' if entered else 'INFO'
+    alert.source = 'geofence'
+    now = time.time()
+    alert.activation_time.sec = int(now)
+    alert.activation_time.nanosec = int((now - int(now)) * 1e9)
+    message.publish_stamp.CopyFrom(alert.activation_time)
+    logger.info(f"MMSI {mmsi}: {alert.description}")
+    publish(f"val/geofence/{mmsi}/alerts", message)
+    if gateway is not None:
+        gateway.publish(f"val/geofence/{mmsi}/alerts", mmsi, message)
+
+def restoring():
+    """
+    Returns True while checkpointed samples are replayed.
+
+    Replayed samples only rebuild in-memory state: they are not forwarded,
+    published, recorded or fed to the watchdog and the geofences.
+    """
+    return getattr(sample_context, 'restoring', False)
+
+def publish_to_stations(sample, mmsi):
+    """
+    Forwards a raw sample to the stations watching or controlling its vessel.
+    """
+    if restoring():
+        return
+    for station_id in station_index.stations_for(mmsi):
+        session.put(utils.derived_key(f"stations/{station_id}", str(sample.key_expr)), sample.payload)
+
+def admit(publish_stamp):
+    """
+    Records the decode latency of the sample being handled and applies load
+    shedding to samples whose publish stamp was not found before parsing.
+
+    Returns:
+        bool: False if the sample is older than its route's freshness budget.
+    """
+    context = sample_context
+    if latency is None or getattr(context, 'route', None) is None:
+        context.accepted = True
+        return True
+    context.decoded = time.perf_counter()
+    context.accepted = latency.decoded(context.route, None if context.stamp_checked else publish_stamp,
+                                       context.received_wall, context.decoded - context.received)
+    return context.accepted
+
+def accepting(callback):
+    """
+    Wraps a route callback so it returns whether it accepted the sample.
+
+    A sample is accepted once its handler decoded it and admit() let it
+    through; samples that failed to decode or were shed are not.
+    """
+    def handle(sample):
+        context = sample_context
+        context.accepted = False
+        callback(sample)
+        return context.accepted
+    return handle
+
+def checkpointed(callback):
+    """
+    Wraps a route callback so the samples it accepts are checkpointed.
+    """
+    handle = accepting(callback)
+
+    def on_sample(sample):
+        if handle(sample):
+            checkpoint_state.put(sample.key_expr, sample.payload)
+    return on_sample
+
+def new_message(message_class):
+    """
+    Returns an empty message for the sample being handled.
+
+    With --pool-messages the message comes from the thread's pool and is
+    released when the route callback returns, so handlers must copy anything
+    they keep (see MessagePool).
+    """
+    messages = getattr(sample_context, 'messages', None)
+    if messages is None:
+        return message_class()
+    message = message_pool.acquire(message_class)
+    messages.append(message)
+    return message
+
+def load_json(sample):
+    """
+    Parses the JSON payload of a sample straight from its buffer.
+
+    The payload is only checked and decoded with replacement characters if
+    parsing fails because it is not valid UTF-8.
+    """
+    payload = sample.payload
+    try:
+        return json_backend.loads(payload)
+    except (UnicodeDecodeError, *json_backend.DecodeError):
+        try:
+            str(payload, 'utf-8')
+        except UnicodeDecodeError:
+            logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+            return json_backend.loads(str(payload, 'utf-8', 'replace'))
+        raise
+
 # Callback functions
 def sub_measurement_properties_data(sample):
     """
     Callback function for MeasurementPropertiesMessage messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.MeasurementPropertiesMessage)
+        decoders.decode_measurement_properties(json_data, message, KEY_EXPR_MEASUREMENT_PROPERTIES)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.MeasurementPropertiesMessage()
-
-        # Extract mmsi and publish_stamp
-        message.mmsi = json_data.get('mmsi', 0)
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract measurement_properties
-        if 'measurement_properties' in json_data:
-            measurement_properties_data = json_data['measurement_properties']
-            json_format.ParseDict(measurement_properties_data, message.measurement_properties)
-        else:
-            logger.error("No 'measurement_properties' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received MeasurementPropertiesMessage: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.mmsi)
+        if derived_engine is not None:
+            # The measurement name is the key segment preceding 'properties'
+            name = str(sample.key_expr).split('/')[-2]
+            derived_engine.set_units(message.mmsi, name, message.measurement_properties.units)
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -71,34 +395,22 @@ def sub_exercise_state_data(sample):
     Callback function for ExerciseState messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.ExerciseState)
+        decoders.decode_exercise_state(json_data, message, KEY_EXPR_EXERCISE_STATE)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.ExerciseState()
-
-        # Extract publish_stamp
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract exercise_state
-        if 'exercise_state' in json_data and 'state' in json_data['exercise_state']:
-            state_str = json_data['exercise_state']['state'].upper()
-            try:
-                message.state = val_standard_pb2.ExerciseState.State.Value(state_str)
-            except ValueError:
-                message.state = val_standard_pb2.ExerciseState.UNKNOWN
-        else:
-            message.state = val_standard_pb2.ExerciseState.UNKNOWN
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received ExerciseState: {message}")
         # Handle the message as needed
+        if gateway is not None:
+            gateway.publish(sample.key_expr, 0, message, live=not restoring())
+        exercise.update(message.state)
+        if latest_state is not None:
+            latest_state.put(str(sample.key_expr), sample.payload)
 
-    except json.JSONDecodeError as e:
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
@@ -108,32 +420,44 @@ def sub_ais_vessel_data(sample):
     Callback function for AISVesselMessage messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.AISVesselMessage)
+        statics, statics_changed = decoders.decode_ais_vessel(json_data, message, KEY_EXPR_AIS_VESSEL, ais_statics)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.AISVesselMessage()
-
-        # Extract mmsi and publish_stamp
-        message.ais_vessel.mmsi = json_data.get('mmsi', 0)
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract ais_vessel data
-        if 'ais_vessel' in json_data:
-            ais_vessel_data = json_data['ais_vessel']
-            json_format.ParseDict(ais_vessel_data, message.ais_vessel)
-        else:
-            logger.error("No 'ais_vessel' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received AISVesselMessage: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.ais_vessel.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.ais_vessel.mmsi)
+        if ais_table is not None:
+            if ais_statics is None:
+                ais_table.update(message.ais_vessel)
+            else:
+                ais_table.update_kinematics(message.ais_vessel)
+                if statics is not None and statics_changed:
+                    ais_table.update_statics(statics)
+        if track_service is not None:
+            vessel = message.ais_vessel
+            track_service.update(vessel.mmsi, utils.stamp_seconds(message.publish_stamp),
+                                 vessel.latitude, vessel.longitude, vessel.sog, vessel.cog)
+        if exercise.active and sample_downsampler is not None and not restoring():
+            sample_downsampler.process(KEY_EXPR_AIS_VESSEL, str(sample.key_expr), message)
+        if history is not None and not restoring():
+            history.record(message, utils.stamp_seconds(message.publish_stamp), message.ais_vessel.mmsi)
+        if watchdog is not None and not restoring():
+            watchdog.touch(message.ais_vessel.mmsi, 'aisvessel')
+        if geofences is not None and not restoring():
+            geofences.update(message.ais_vessel.mmsi, message.ais_vessel.latitude, message.ais_vessel.longitude)
+        if shared_state is not None:
+            vessel = message.ais_vessel
+            shared_state.update_kinematics(vessel.mmsi, utils.stamp_seconds(message.publish_stamp), vessel.latitude,
+                                           vessel.longitude, vessel.sog, vessel.cog, vessel.true_heading)
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -145,40 +469,19 @@ def sub_vessels_data(sample):
     Callback function for Vessels messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.Vessels)
+        decoders.decode_vessels(json_data, message, KEY_EXPR_VESSELS)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.Vessels()
-
-        # Extract publish_stamp
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract vessels
-        if 'vessels' in json_data:
-            for vessel_data in json_data['vessels']:
-                vessel_message = val_standard_pb2.Vessel()
-                # Map enum fields if necessary
-                if 'type' in vessel_data:
-                    type_str = vessel_data['type']
-                    try:
-                        vessel_data['type'] = val_standard_pb2.Vessel.VesselType.Value(type_str)
-                    except ValueError:
-                        vessel_data['type'] = val_standard_pb2.Vessel.UNKNOWN
-                json_format.ParseDict(vessel_data, vessel_message)
-                message.vessels.append(vessel_message)
-        else:
-            logger.error("No 'vessels' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received Vessels: {message}")
         # Handle the message as needed
+        if gateway is not None:
+            gateway.publish(sample.key_expr, 0, message, live=not restoring())
 
-    except json.JSONDecodeError as e:
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -190,32 +493,33 @@ def sub_measurement_value_data(sample):
     Callback function for MeasurementValue messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.MeasurementValue)
+        decoders.decode_measurement_value(json_data, message, KEY_EXPR_MEASUREMENT_VALUE)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.MeasurementValue()
-
-        # Extract mmsi and publish_stamp
-        message.mmsi = json_data.get('mmsi', 0)
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract measurement
-        if 'measurement' in json_data:
-            measurement_data = json_data['measurement']
-            json_format.ParseDict(measurement_data, message.measurement)
-        else:
-            logger.error("No 'measurement' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received MeasurementValue: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.mmsi)
+        if exercise.active and derived_engine is not None:
+            derived_engine.update(message, publish=not restoring())
+        if exercise.active and sample_downsampler is not None and not restoring():
+            sample_downsampler.process(KEY_EXPR_MEASUREMENT_VALUE, str(sample.key_expr), message)
+        if history is not None and not restoring():
+            history.record(message, utils.stamp_seconds(message.publish_stamp), message.mmsi,
+                           message.measurement.name)
+        if watchdog is not None and not restoring():
+            watchdog.touch(message.mmsi, 'value', message.measurement.name)
+        if shared_state is not None:
+            shared_state.update_measurement(message.mmsi, message.measurement.name, message.measurement.value,
+                                            utils.stamp_seconds(message.publish_stamp))
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -227,39 +531,35 @@ def sub_location_message_data(sample):
     Callback function for LocationMessage messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.LocationMessage)
+        decoders.decode_location_message(json_data, message, KEY_EXPR_LOCATION_MESSAGE)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.LocationMessage()
-
-        # Extract mmsi and publish_stamp
-        message.mmsi = json_data.get('mmsi', 0)
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract location
-        if 'location' in json_data:
-            location_data = json_data['location']
-            # Map enum fields if necessary
-            if 'quality' in location_data:
-                quality_str = location_data['quality']
-                try:
-                    location_data['quality'] = val_standard_pb2.Location.Quality.Value(quality_str)
-                except ValueError:
-                    location_data['quality'] = val_standard_pb2.Location.NO_FIX
-            json_format.ParseDict(location_data, message.location)
-        else:
-            logger.error("No 'location' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received LocationMessage: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.mmsi)
+        if track_service is not None:
+            track_service.update(message.mmsi, utils.stamp_seconds(message.publish_stamp),
+                                 message.location.latitude, message.location.longitude)
+        if exercise.active and sample_downsampler is not None and not restoring():
+            sample_downsampler.process(KEY_EXPR_LOCATION_MESSAGE, str(sample.key_expr), message)
+        if history is not None and not restoring():
+            history.record(message, utils.stamp_seconds(message.publish_stamp), message.mmsi)
+        if watchdog is not None and not restoring():
+            watchdog.touch(message.mmsi, 'location')
+        if geofences is not None and not restoring():
+            geofences.update(message.mmsi, message.location.latitude, message.location.longitude)
+        if shared_state is not None:
+            shared_state.update_position(message.mmsi, utils.stamp_seconds(message.publish_stamp),
+                                         message.location.latitude, message.location.longitude)
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -343,76 +643,23 @@ def sub_alerts_data(sample):
     Callback function for Alerts messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.Alerts)
+        decoders.decode_alerts(json_data, message, KEY_EXPR_ALERTS)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.Alerts()
-
-        # Extract mmsi and publish_stamp
-        message.mmsi = json_data.get('mmsi', 0)
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract health
-        if 'health' in json_data:
-            health_str = json_data['health'].upper()
-            try:
-                message.health = val_standard_pb2.Alerts.Health.Value(health_str)
-            except ValueError:
-                message.health = val_standard_pb2.Alerts.Health.Value('UNKNOWN')
-        else:
-            message.health = val_standard_pb2.Alerts.Health.Value('UNKNOWN')
-
-        # Extract alerts
-        if 'alerts' in json_data:
-            for alert_data in json_data['alerts']:
-                # Check if 'alert' key exists and extract it
-                if 'alert' in alert_data:
-                    alert_fields = alert_data['alert']
-                else:
-                    alert_fields = alert_data  # Assume alert_data contains the fields directly
-
-                alert_message = val_standard_pb2.Alert()
-
-                # Map enum fields if necessary
-                alert_enum_fields = {
-                    'category': val_standard_pb2.Alert.Category,
-                    'priority': val_standard_pb2.Alert.Priority,
-                    'ack_scheme': val_standard_pb2.Alert.AckScheme,
-                    'audio': val_standard_pb2.Alert.Audio,
-                    'visual': val_standard_pb2.Alert.Visual,
-                }
-
-                for field, enum_type in alert_enum_fields.items():
-                    if field in alert_fields:
-                        enum_str = alert_fields[field].upper()
-                        try:
-                            alert_fields[field] = enum_type.Value(enum_str)
-                        except ValueError:
-                            alert_fields[field] = enum_type.Value('UNKNOWN')
-
-                # Parse activation_time
-                if 'activation_time' in alert_fields:
-                    activation_time_data = alert_fields['activation_time']
-                    activation_time = val_standard_pb2.Timestamp()
-                    activation_time.sec = activation_time_data.get('sec', 0)
-                    activation_time.nanosec = activation_time_data.get('nanosec', 0)
-                    alert_fields['activation_time'] = activation_time
-
-                json_format.ParseDict(alert_fields, alert_message)
-                message.alerts.append(alert_message)
-        else:
-            logger.error("No 'alerts' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received Alerts: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.mmsi)
+        if shared_state is not None:
+            shared_state.update_alerts(message.mmsi, len(message.alerts))
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -462,47 +709,23 @@ def sub_vessel_statics_data(sample):
     Callback function for VesselStaticsMessage messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.VesselStaticsMessage)
+        decoders.decode_vessel_statics(json_data, message, KEY_EXPR_VESSEL_STATICS)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.VesselStaticsMessage()
-
-        # Extract mmsi and publish_stamp
-        message.mmsi = json_data.get('mmsi', 0)
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract vessel_statics
-        if 'vessel_statics' in json_data:
-            vessel_statics_data = json_data['vessel_statics']
-
-            # Handle enum fields if any
-            enum_fields = {
-                'model': val_standard_pb2.VesselStatics.Model,
-                'propulsion_type': val_standard_pb2.VesselStatics.PropulsionType,
-            }
-
-            for field, enum_type in enum_fields.items():
-                if field in vessel_statics_data:
-                    enum_str = vessel_statics_data[field]
-                    try:
-                        vessel_statics_data[field] = enum_type.Value(enum_str.upper())
-                    except ValueError:
-                        vessel_statics_data[field] = enum_type.Value('UNKNOWN')
-
-            json_format.ParseDict(vessel_statics_data, message.statics)
-        else:
-            logger.error("No 'vessel_statics' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received VesselStaticsMessage: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.mmsi)
+        if latest_state is not None:
+            latest_state.put(str(sample.key_expr), sample.payload)
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -514,48 +737,23 @@ def sub_assignments_data(sample):
     Callback function for Assignments messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.Assignments)
+        decoders.decode_assignments(json_data, message, KEY_EXPR_ASSIGNMENTS)
 
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.Assignments()
-
-        # Extract publish_stamp
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract assignments
-        if 'assignments' in json_data:
-            for assignment_data in json_data['assignments']:
-                # Check if 'assignment' key exists and extract it
-                if 'assignment' in assignment_data:
-                    assignment_fields = assignment_data['assignment']
-                else:
-                    assignment_fields = assignment_data  # Assume assignment_data contains the fields directly
-
-                assignment_message = val_standard_pb2.Assignment()
-
-                # Map enum fields if necessary
-                if 'state' in assignment_fields:
-                    state_str = assignment_fields['state']
-                    try:
-                        assignment_fields['state'] = val_standard_pb2.Assignment.State.Value(state_str)
-                    except ValueError:
-                        assignment_fields['state'] = val_standard_pb2.Assignment.UNKNOWN
-
-                json_format.ParseDict(assignment_fields, assignment_message)
-                message.assignments.append(assignment_message)
-        else:
-            logger.error("No 'assignments' key found in the message.")
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received Assignments: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, 0, message, live=not restoring())
+        if station_index is not None:
+            station_index.update(message)
+        if latest_state is not None:
+            latest_state.put(str(sample.key_expr), sample.payload)
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
@@ -567,87 +765,242 @@ def sub_vessel_envelope_data(sample):
     Callback function for VesselEnvelope messages.
     """
     try:
-        json_string = sample.payload.decode('utf-8')
-    except UnicodeDecodeError:
-        json_string = sample.payload.decode('utf-8', errors='replace')
-        logger.warning(f"Failed to decode payload as UTF-8 for key: {sample.key_expr}")
-
-    try:
-        json_data = json.loads(json_string)
-        message = val_standard_pb2.VesselEnvelope()
-
-        # Extract mmsi
-        message.mmsi = json_data.get('mmsi', 0)
-
-        # Extract publish_stamp
-        if 'publish_stamp' in json_data:
-            message.publish_stamp.sec = json_data['publish_stamp'].get('sec', 0)
-            message.publish_stamp.nanosec = json_data['publish_stamp'].get('nanosec', 0)
-
-        # Extract other fields if present in the envelope
-        if 'measurement_properties_messages' in json_data:
-            for mp_data in json_data['measurement_properties_messages']:
-                mp_message = val_standard_pb2.MeasurementPropertiesMessage()
-                json_format.ParseDict(mp_data, mp_message)
-                message.measurement_properties_messages.append(mp_message)
-
-        if 'measurement_values' in json_data:
-            for mv_data in json_data['measurement_values']:
-                mv_message = val_standard_pb2.MeasurementValue()
-                json_format.ParseDict(mv_data, mv_message)
-                message.measurement_values.append(mv_message)
+        json_data = load_json(sample)
+        message = new_message(val_standard_pb2.VesselEnvelope)
+        decoders.decode_vessel_envelope(json_data, message, KEY_EXPR_VESSEL_ENVELOPE)
 
-        if 'ais_vessel_message' in json_data:
-            json_format.ParseDict(json_data['ais_vessel_message'], message.ais_vessel_message)
-
-        if 'vessel_statics_message' in json_data:
-            json_format.ParseDict(json_data['vessel_statics_message'], message.vessel_statics_message)
-
-        if 'location_message' in json_data:
-            json_format.ParseDict(json_data['location_message'], message.location_message)
-
-        if 'alerts' in json_data:
-            for alert_data in json_data['alerts']:
-                alert_message = val_standard_pb2.Alert()
-                json_format.ParseDict(alert_data, alert_message)
-                message.alerts.append(alert_message)
-
-        if 'exercise_state' in json_data:
-            json_format.ParseDict(json_data['exercise_state'], message.exercise_state)
-
-        if 'assignments' in json_data:
-            json_format.ParseDict(json_data['assignments'], message.assignments)
-
-        if 'autopilot_settings' in json_data:
-            for ap_data in json_data['autopilot_settings']:
-                ap_message = val_standard_pb2.AutopilotSettings()
-                json_format.ParseDict(ap_data, ap_message)
-                message.autopilot_settings.append(ap_message)
+        if not admit(message.publish_stamp):
+            return
 
         logger.info(f"Received VesselEnvelope: {message}")
         # Handle the message as needed
-
-    except json.JSONDecodeError as e:
+        if gateway is not None:
+            gateway.publish(sample.key_expr, message.mmsi, message, live=not restoring())
+        if station_index is not None:
+            publish_to_stations(sample, message.mmsi)
+        if message.HasField('exercise_state'):
+            exercise.update(message.exercise_state.state)
+        if ais_table is not None and message.HasField('ais_vessel_message'):
+            ais_table.update(message.ais_vessel_message.ais_vessel)
+        if exercise.active and derived_engine is not None:
+            for mv_message in message.measurement_values:
+                derived_engine.update(mv_message, publish=not restoring())
+
+    except json_backend.DecodeError as e:
         logger.error(f"JSON decoding error: {e}")
     except json_format.ParseError as e:
         logger.error(f"Protobuf parsing error: {e}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
 
+# Subscriptions: key expression and callback of each route
+ROUTES = [
+    (KEY_EXPR_MEASUREMENT_PROPERTIES, sub_measurement_properties_data),
+    (KEY_EXPR_EXERCISE_STATE, sub_exercise_state_data),
+    (KEY_EXPR_AIS_VESSEL, sub_ais_vessel_data),
+    (KEY_EXPR_VESSELS, sub_vessels_data),
+    (KEY_EXPR_MEASUREMENT_VALUE, sub_measurement_value_data),
+    (KEY_EXPR_LOCATION_MESSAGE, sub_location_message_data),
+    (KEY_EXPR_ALERTS, sub_alerts_data),
+    (KEY_EXPR_VESSEL_STATICS, sub_vessel_statics_data),
+    (KEY_EXPR_ASSIGNMENTS, sub_assignments_data),
+    (KEY_EXPR_VESSEL_ENVELOPE, sub_vessel_envelope_data),
+]
+
+# Message type decoded by each route, checked against the schema at startup
+ROUTE_MESSAGE_TYPES = {
+    KEY_EXPR_MEASUREMENT_PROPERTIES: 'MeasurementPropertiesMessage',
+    KEY_EXPR_EXERCISE_STATE: 'ExerciseState',
+    KEY_EXPR_AIS_VESSEL: 'AISVesselMessage',
+    KEY_EXPR_VESSELS: 'Vessels',
+    KEY_EXPR_MEASUREMENT_VALUE: 'MeasurementValue',
+    KEY_EXPR_LOCATION_MESSAGE: 'LocationMessage',
+    KEY_EXPR_ALERTS: 'Alerts',
+    KEY_EXPR_VESSEL_STATICS: 'VesselStaticsMessage',
+    KEY_EXPR_ASSIGNMENTS: 'Assignments',
+    KEY_EXPR_VESSEL_ENVELOPE: 'VesselEnvelope',
+}
+
+# Priority class of each route; routes not listed are 'normal'
+ROUTE_PRIORITIES = {
+    KEY_EXPR_ALERTS: 'critical',
+    KEY_EXPR_EXERCISE_STATE: 'critical',
+    KEY_EXPR_ASSIGNMENTS: 'critical',
+    KEY_EXPR_MEASUREMENT_VALUE: 'bulk',
+}
+
+def supported_routes():
+    """
+    Returns the routes whose message type is defined by the schema.
+    """
+    missing = set(schema.check(sorted(set(ROUTE_MESSAGE_TYPES.values()))))
+    routes = []
+    for key_expr, callback in ROUTES:
+        if ROUTE_MESSAGE_TYPES[key_expr] in missing:
+            logger.warning(f"Not subscribing to {key_expr}: schema lacks {ROUTE_MESSAGE_TYPES[key_expr]}")
+        else:
+            routes.append((key_expr, callback))
+    return routes
+
+def route_callback(key_expr, callback):
+    """
+    Wraps a subscription callback with the per-route processing stages.
+    """
+    route_filter = route_filters.get(key_expr) if route_filters else None
+    if checkpoint_state is not None:
+        callback = checkpointed(callback)
+
+    def on_sample(sample):
+        global first_message_received
+        sample = utils.ReceivedSample(sample)
+        if route_filter is not None and not route_filter.accepts(sample.key_expr, sample.payload):
+            return
+        if not first_message_received:
+            first_message_received = True
+            logger.info(f"Time to first message: {time.perf_counter() - startup_time:.3f}s ({key_expr})")
+        if latency is None and message_pool is None:
+            callback(sample)
+            return
+        context = sample_context
+        if message_pool is not None:
+            context.messages = []
+        if latency is not None:
+            context.route = key_expr
+            context.received_wall = time.time()
+            context.received = time.perf_counter()
+            context.decoded = None
+        try:
+            if latency is not None:
+                # Stale samples are shed from the raw stamp, before they are parsed
+                admitted = latency.received(key_expr, sample.payload, context.received_wall)
+                if admitted is False:
+                    return
+                context.stamp_checked = admitted is not None
+            callback(sample)
+        finally:
+            if latency is not None:
+                if context.decoded is not None:
+                    latency.record(key_expr, 'decoded_to_handled', time.perf_counter() - context.decoded)
+                context.route = None
+            if message_pool is not None:
+                # Messages of the sample are released once its callback returns
+                for message in context.messages:
+                    message_pool.release(message)
+                context.messages = None
+    return on_sample
+
+def build_filters(args):
+    """
+    Builds the pre-parse filters of the routes from the command line.
+
+    Returns:
+        dict: route key expression -> RouteFilter
+    """
+    specs = list(args.filter)
+    if args.allow_mmsi:
+        specs += [f"{key_expr}=mmsi:{args.allow_mmsi}" for key_expr in MMSI_KEY_EXPRS]
+    if args.deny_mmsi:
+        specs += [f"{key_expr}=!mmsi:{args.deny_mmsi}" for key_expr in MMSI_KEY_EXPRS]
+    if args.measurement:
+        patterns = ','.join(args.measurement)
+        # Property payloads carry no name: it is the key segment before 'properties'
+        specs += [f"{KEY_EXPR_MEASUREMENT_VALUE}=name:{patterns}",
+                  f"{KEY_EXPR_MEASUREMENT_PROPERTIES}=segment:-2={patterns}"]
+    route_filters = filters.parse_filters(specs)
+    for key_expr, route_filter in route_filters.items():
+        if key_expr not in ROUTE_MESSAGE_TYPES:
+            logger.warning(f"Filter of {key_expr} matches no route")
+    return route_filters
+
+def warm_up():
+    """
+    Compiles the route decoders in the background while subscribers are declared.
+    """
+    started = time.perf_counter()
+    for name in set(ROUTE_MESSAGE_TYPES.values()):
+        message_class = schema.message_class(name)
+        if message_class is not None:
+            schema.decoder(message_class.DESCRIPTOR)
+    logger.info(f"Protobuf decoders ready in {time.perf_counter() - started:.3f}s")
+
+def declare_subscribers(session, routes):
+    """
+    Declares the subscribers of the given routes concurrently.
+
+    Returns:
+        list: The declared subscribers, in route order.
+    """
+    def declare(route):
+        key_expr, callback = route
+        if profiler is not None:
+            callback = profiler.wrap_handler(key_expr, callback)
+        handler = route_callback(key_expr, callback)
+        if scheduler is not None:
+            priority = ROUTE_PRIORITIES.get(key_expr, 'normal')
+            handler = lambda sample, handler=handler: scheduler.submit(priority, handler, sample)
+        subscriber = session.declare_subscriber(key_expr, handler)
+        logger.info(f"Subscribed to: {key_expr}")
+        return subscriber
+
+    with ThreadPoolExecutor(max_workers=len(routes)) as executor:
+        return list(executor.map(declare, routes))
+
+def instrument_stages():
+    """
+    Wraps the enabled pipeline stages with the profiler's stage timing.
+    """
+    stages = [
+        ('parse', json_backend, 'loads'),
+        ('decode', schema, 'decode'),
+        ('derived', derived_engine, 'update'),
+        ('downsample', sample_downsampler, 'process'),
+        ('state_cache', latest_state, 'put'),
+        ('station_index', station_index, 'update'),
+        # update() calls update_kinematics(), so each needs its own stage name
+        ('ais_table', ais_table, 'update'),
+        ('ais_kinematics', ais_table, 'update_kinematics'),
+        ('ais_statics', ais_statics, 'split'),
+        ('tracks', track_service, 'update'),
+        ('history', history, 'record'),
+    ]
+    for name, owner, attribute in stages:
+        if owner is not None:
+            setattr(owner, attribute, profiler.wrap_stage(name, getattr(owner, attribute)))
+
 # 
 def main():
-    global session
+    global session, derived_engine, sample_downsampler, latest_state, station_index, ais_table, ais_statics, track_service, latency, message_pool, profiler, scheduler, checkpoint_state, history, watchdog, geofences, route_filters, gateway, shared_state
 
     args = parse_args()
+    logger.info(f"Using JSON backend: {json_backend.select(args.json_backend)}")
+
+    # Compile derived signal expressions once, before any data arrives
+    if args.derived:
+        derived_engine = DerivedSignalEngine(publish_derived_value)
+        for definition in args.derived:
+            name, _, expression = definition.partition('=')
+            derived_engine.add(name.strip(), expression)
+        exercise.on_reset(derived_engine.reset)
+
+    if args.downsample:
+        sample_downsampler = downsampler.Downsampler(publish)
+        for spec in args.downsample:
+            sample_downsampler.add_route(*downsampler.parse_spec(spec))
+        exercise.on_flush(sample_downsampler.flush)
+        exercise.on_reset(sample_downsampler.reset)
 
     # Initialize Zenoh session
-    logger.info(f"Configuring Zenoh with key: {args.key}, router: {args.router_address}")
-    conf = zenoh.Config.from_json5(json.dumps({
-        "mode": "client",
-        "connect": {"endpoints": [args.router_address]}
-    }))
+    router_addresses = args.router_address or ['tcp/127.0.0.1:7447']
+    logger.info(f"Configuring Zenoh with key: {args.key}, routers: {', '.join(router_addresses)}")
     logger.info("Opening Zenoh session...")
-    session = zenoh.open(conf)
+    if len(router_addresses) == 1 and '=' not in router_addresses[0]:
+        conf = zenoh.Config.from_json5(json.dumps({
+            "mode": "client",
+            "connect": {"endpoints": router_addresses}
+        }))
+        session = zenoh.open(conf)
+    else:
+        session = fan_in.RouterSet([fan_in.parse_router(spec) for spec in router_addresses])
     logger.info("Zenoh session opened successfully")
 
     def _on_exit():
@@ -656,108 +1009,143 @@ def main():
     atexit.register(_on_exit)
     logger.info(f"Zenoh session established: {session.info()}")
 
-    # Declare subscribers
-    subscriptions = []
-
-    # MeasurementPropertiesMessage
-    key_expr_measurement_properties = "val/amoc/**/properties"
-    sub_measurement_properties = session.declare_subscriber(
-        key_expr_measurement_properties,
-        sub_measurement_properties_data,
-    )
-    subscriptions.append(sub_measurement_properties)
-    logger.info(f"Subscribed to: {key_expr_measurement_properties}")
-
-    # ExerciseState
-    key_expr_exercise_state = "val/amoc/exercise_state"
-    sub_exercise_state = session.declare_subscriber(
-        key_expr_exercise_state,
-        sub_exercise_state_data,
-    )
-    subscriptions.append(sub_exercise_state)
-    logger.info(f"Subscribed to: {key_expr_exercise_state}")
-
-    # AISVesselMessage
-    key_expr_ais_vessel = "val/amoc/**/aisvessel"
-    sub_ais_vessel = session.declare_subscriber(
-        key_expr_ais_vessel,
-        sub_ais_vessel_data,
-    )
-    subscriptions.append(sub_ais_vessel)
-    logger.info(f"Subscribed to: {key_expr_ais_vessel}")
-
-    # Vessels
-    key_expr_vessels = "val/amoc/vessels"
-    sub_vessels = session.declare_subscriber(
-        key_expr_vessels,
-        sub_vessels_data,
-    )
-    subscriptions.append(sub_vessels)
-    logger.info(f"Subscribed to: {key_expr_vessels}")
-
-    # MeasurementValue
-    key_expr_measurement_value = "val/amoc/**/value" # "val/amoc/**/measurement"
-    sub_measurement_value = session.declare_subscriber(
-        key_expr_measurement_value,
-        sub_measurement_value_data,
-    )
-    subscriptions.append(sub_measurement_value)
-    logger.info(f"Subscribed to: {key_expr_measurement_value}")
-
-    # LocationMessage
-    key_expr_location_message = "val/amoc/**/location"
-    sub_location_message = session.declare_subscriber(
-        key_expr_location_message,
-        sub_location_message_data,
-    )
-    subscriptions.append(sub_location_message)
-    logger.info(f"Subscribed to: {key_expr_location_message}")
-
-    # Alerts
-    key_expr_alerts = "val/amoc/**"
-    sub_alerts = session.declare_subscriber(
-        key_expr_alerts,
-        sub_alerts_data,
-    )
-    subscriptions.append(sub_alerts)
-    logger.info(f"Subscribed to: {key_expr_alerts}")
-
-    # VesselStaticsMessage
-    key_expr_vessel_statics = "val/amoc/**/vessel_statics"
-    sub_vessel_statics = session.declare_subscriber(
-        key_expr_vessel_statics,
-        sub_vessel_statics_data,
-    )
-    subscriptions.append(sub_vessel_statics)
-    logger.info(f"Subscribed to: {key_expr_vessel_statics}")
-
-    # Assignments
-    key_expr_assignments = "val/amoc/assignments"
-    sub_assignments = session.declare_subscriber(
-        key_expr_assignments,
-        sub_assignments_data,
-    )
-    subscriptions.append(sub_assignments)
-    logger.info(f"Subscribed to: {key_expr_assignments}")
-    
-    # VesselEnvelope
-    key_expr_vessel_envelope = "val/amoc/**/vessel_envelope"
-    sub_vessel_envelope = session.declare_subscriber(
-        key_expr_vessel_envelope,
-        sub_vessel_envelope_data,
-    )
-    subscriptions.append(sub_vessel_envelope)
-    logger.info(f"Subscribed to: {key_expr_vessel_envelope}")
-
+    if args.serve_state:
+        latest_state = state_cache.StateCache()
+    if args.station_streams:
+        station_index = StationIndex()
+    if args.ais_table:
+        ais_table = AISTable()
+    if args.cache_ais_statics:
+        ais_statics = AISStaticsCache()
+    if args.pool_messages:
+        message_pool = MessagePool()
+    if args.record:
+        history = HistoryStore(args.record)
+    if args.watchdog or args.stale:
+        timeouts = dict(DEFAULT_TIMEOUTS)
+        for spec in args.stale:
+            topic, _, seconds = spec.partition('=')
+            timeouts[topic.strip()] = float(seconds)
+        watchdog = StalenessWatchdog(
+            publish_staleness_alert,
+            lambda mmsi, topic, name, last_seen: publish_staleness_alert(mmsi, topic, name, last_seen, True),
+            timeouts)
+        exercise.on_reset(watchdog.reset)
+        # Streams go quiet while the exercise is paused or stopped
+        exercise.on_flush(lambda: watchdog.resume() if exercise.active else watchdog.pause())
+        watchdog.start()
+    if args.latency or args.freshness:
+        budgets = {}
+        for spec in args.freshness:
+            key_expr, _, seconds = spec.partition('=')
+            budgets[key_expr.strip()] = float(seconds)
+        latency = LatencyTracker(budgets=budgets)
+    if args.track_rate > 0:
+        from tracks import TrackService  # NumPy is only needed when tracks are enabled
+        track_service = TrackService()
+        exercise.on_reset(track_service.reset)
+    if args.geofences:
+        from geofence import GeofenceEngine, load_zones  # NumPy is only needed when geofences are enabled
+        geofences = GeofenceEngine(load_zones(args.geofences))
+        exercise.on_reset(geofences.reset)
+        geofences.start(args.geofence_interval, publish_geofence_alert)
+
+    if args.shm_export:
+        shared_state = ShmExport(args.shm_export, capacity=args.shm_vessels, measurements=args.shm_measurements)
+    if args.gateway:
+        gateway = Gateway(*parse_address(args.gateway), queue_size=args.gateway_queue)
+        gateway.start()
+        exercise.on_reset(gateway.reset)
+
+    if args.schedule:
+        classes = dict(PRIORITY_CLASSES)
+        for name, bound in (('normal', args.normal_queue), ('bulk', args.bulk_queue)):
+            weight, slo, _ = classes[name]
+            classes[name] = (weight, slo, bound)
+        scheduler = PriorityScheduler(classes, workers=args.schedule_workers)
+        for spec in args.slo:
+            name, _, seconds = spec.partition('=')
+            scheduler.set_slo(name.strip(), float(seconds))
+        scheduler.start()
+    if args.profile:
+        profiler = Profiler(sample_rate=args.profile_sample_rate, output_dir=args.profile_dir)
+        profiler.install_signal_handlers()
+        instrument_stages()
+
+    routes = supported_routes()
+    route_filters = build_filters(args)
+    checkpointer = None
+    if args.checkpoint:
+        # Restore before subscribing, so live samples supersede the checkpointed ones
+        checkpoint_state = state_cache.StateCache()
+        sample_context.restoring = True
+        try:
+            checkpoint.restore(args.checkpoint, [(key_expr, accepting(callback)) for key_expr, callback in routes],
+                               checkpoint_state)
+        finally:
+            sample_context.restoring = False
+        checkpointer = checkpoint.Checkpointer(checkpoint_state, args.checkpoint, args.checkpoint_interval)
+        checkpointer.start()
+
+    # Declare subscribers while the Protobuf decoders load in the background
+    threading.Thread(target=warm_up, daemon=True).start()
+    subscriptions = declare_subscribers(session, routes)
+    logger.info(f"All subscriptions active after {time.perf_counter() - startup_time:.3f}s")
+
+    if track_service is not None:
+        track_service.start(args.track_rate, publish_tracks, active=lambda: exercise.active)
+
+    # Late-join state: seed from peers, then serve our own cache
+    queryables = []
+    if args.serve_state:
+        callbacks = dict(ROUTES)
+        if args.seed_timeout > 0:
+            for key_expr in STATE_KEY_EXPRS:
+                state_cache.seed(session, latest_state, key_expr, callbacks[key_expr], timeout=args.seed_timeout)
+        queryables = state_cache.declare_queryables(session, latest_state, STATE_KEY_EXPRS)
+    if history is not None:
+        queryables.append(session.declare_queryable("val/history/**", history.reply))
+        logger.info("Serving recorded history on: val/history/**")
 
     # Keep the main thread alive
+    last_report = time.monotonic()
     try:
         while True:
             time.sleep(1)
+            if time.monotonic() - last_report >= args.latency_report:
+                last_report = time.monotonic()
+                if latency is not None:
+                    latency.log_report()
+                if scheduler is not None:
+                    scheduler.log_report()
+                if route_filters:
+                    filters.log_report(route_filters)
+                if gateway is not None:
+                    gateway.log_report()
+            if sample_downsampler is not None:
+                sample_downsampler.flush(time.monotonic())
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received. Closing session...")
         for sub in subscriptions:
             sub.undeclare()
+        for queryable in queryables:
+            queryable.undeclare()
+        if track_service is not None:
+            track_service.stop()
+        if scheduler is not None:
+            scheduler.stop()
+        if checkpointer is not None:
+            checkpointer.stop()
+        if history is not None:
+            history.close()
+        if watchdog is not None:
+            watchdog.stop()
+        if geofences is not None:
+            geofences.stop()
+        if gateway is not None:
+            gateway.stop()
+        if shared_state is not None:
+            shared_state.close()
         session.close()
         logger.info("Session closed")
 
@@ -0,0 +1,140 @@
+# scheduler.py
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Priority classes in scheduling order: name -> (weight, latency SLO in seconds, queue bound)
+PRIORITY_CLASSES = {
+    'critical': (8, 0.005, None),
+    'normal': (4, 0.100, 50000),
+    'bulk': (1, 1.000, 10000),
+}
+
+
+class _Class:
+    __slots__ = ('name', 'weight', 'slo', 'queue', 'credit', 'handled', 'dropped', 'violations')
+
+    def __init__(self, name, weight, slo, bound):
+        self.name = name
+        self.weight = weight
+        self.slo = slo
+        self.queue = deque(maxlen=bound)
+        self.credit = weight
+        self.handled = 0
+        self.dropped = 0
+        self.violations = 0
+
+
+class PriorityScheduler:
+    """
+    Runs route callbacks on worker threads in weighted fair order between priority classes.
+
+    Each class gets a credit equal to its weight per round. Workers always take
+    the next item of the highest class that has both work and credit left, and
+    credits are refilled once every non-empty class has used its share. An item
+    of a higher class therefore waits at most for the running handlers plus the
+    remaining credit of the classes below it, while lower classes still get
+    their weighted share under sustained load.
+
+    Bounded classes drop their oldest item when full. Queue wait plus handling
+    time is checked against the class's SLO.
+    """
+
+    def __init__(self, classes=None, workers=1):
+        """
+        Args:
+            classes (dict): name -> (weight, SLO seconds, queue bound or None),
+                in scheduling order; defaults to PRIORITY_CLASSES.
+            workers (int): Number of worker threads. With more than one worker,
+                samples of the same class may be handled out of order.
+        """
+        classes = PRIORITY_CLASSES if classes is None else classes
+        self.classes = [_Class(name, *spec) for name, spec in classes.items()]
+        self._by_name = {cls.name: cls for cls in self.classes}
+        self.workers = workers
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopped = False
+        self._last_warning = {}
+
+    def set_slo(self, name, seconds):
+        self._by_name[name].slo = seconds
+
+    def submit(self, priority, function, *args):
+        """
+        Queues a call in a priority class.
+
+        Args:
+            priority (str): The priority class name.
+            function (callable): Called with *args on a worker thread.
+        """
+        cls = self._by_name[priority]
+        with self._condition:
+            if cls.queue.maxlen is not None and len(cls.queue) == cls.queue.maxlen:
+                cls.dropped += 1
+            cls.queue.append((time.perf_counter(), function, args))
+            self._condition.notify()
+
+    def _next(self):
+        # Called with the condition held and at least one item queued
+        while True:
+            for cls in self.classes:
+                if cls.queue and cls.credit > 0:
+                    cls.credit -= 1
+                    return cls, cls.queue.popleft()
+            for cls in self.classes:
+                cls.credit = cls.weight
+
+    def _pending(self):
+        return any(cls.queue for cls in self.classes)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and not self._pending():
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                cls, (queued, function, args) = self._next()
+            try:
+                function(*args)
+            except Exception as e:
+                logger.error(f"Scheduled {cls.name} callback failed: {e}")
+            elapsed = time.perf_counter() - queued
+            cls.handled += 1
+            if elapsed > cls.slo:
+                cls.violations += 1
+                self._warn(cls, elapsed)
+
+    def _warn(self, cls, elapsed):
+        # At most one warning per class and second
+        now = time.monotonic()
+        if now - self._last_warning.get(cls.name, 0.0) >= 1.0:
+            self._last_warning[cls.name] = now
+            logger.warning(f"{cls.name} sample handled after {elapsed * 1e3:.1f}ms, SLO {cls.slo * 1e3:.1f}ms "
+                           f"({len(cls.queue)} queued)")
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'scheduler-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Scheduler started with {self.workers} workers: "
+                    + ", ".join(f"{cls.name} (weight {cls.weight})" for cls in self.classes))
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def log_report(self):
+        """
+        Logs queue depth, handled, dropped and SLO violation counts per class.
+        """
+        for cls in self.classes:
+            logger.info(f"Scheduler {cls.name}: {len(cls.queue)} queued, {cls.handled} handled, "
+                        f"{cls.dropped} dropped, {cls.violations} over SLO")
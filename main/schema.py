@@ -0,0 +1,210 @@
+# schema.py
+
+import base64
+import logging
+import threading
+from collections import Counter
+
+from google.protobuf import json_format
+
+logger = logging.getLogger(__name__)
+
+_SCALAR, _ENUM, _MESSAGE = range(3)
+
+
+def _integer(value):
+    # As json_format.ParseDict: integral floats and numeric strings are accepted,
+    # anything that would be truncated is rejected
+    if isinstance(value, bool):
+        raise json_format.ParseError(f"Bool value {value} is not acceptable for integer field")
+    if isinstance(value, float) and not value.is_integer():
+        raise json_format.ParseError(f"Couldn't parse integer: {value}")
+    try:
+        return int(value)
+    except ValueError:
+        raise json_format.ParseError(f"Couldn't parse integer: {value!r}") from None
+
+
+def _scalar_converter(field):
+    types = field.__class__
+    if field.type in (types.TYPE_DOUBLE, types.TYPE_FLOAT):
+        return float
+    if field.type == types.TYPE_BOOL:
+        return bool
+    if field.type == types.TYPE_STRING:
+        return str
+    if field.type == types.TYPE_BYTES:
+        return base64.b64decode
+    return _integer
+
+
+class MessageDecoder:
+    """
+    Decoder from parsed JSON into one Protobuf message type.
+
+    The field table is compiled once from the message descriptor, so only fields
+    that exist in the schema get a decode path. Enum values are accepted as
+    numbers or as case-insensitive names, unknown names decode to the zero value.
+    Keys without a field are skipped and counted instead of raising. Values that
+    do not fit their field raise json_format.ParseError, as with ParseDict.
+    """
+
+    def __init__(self, registry, descriptor):
+        self.registry = registry
+        self.name = descriptor.full_name
+        self.fields = {}
+        for field in descriptor.fields:
+            repeated = field.label == field.LABEL_REPEATED
+            if field.message_type is not None:
+                entry = (field.name, _MESSAGE, field.message_type, repeated)
+            elif field.enum_type is not None:
+                names = {}
+                for value in field.enum_type.values:
+                    names[value.name] = value.number
+                    names[value.name.upper()] = value.number
+                entry = (field.name, _ENUM, names, repeated)
+            else:
+                entry = (field.name, _SCALAR, _scalar_converter(field), repeated)
+            self.fields[field.name] = entry
+            self.fields[field.json_name] = entry
+
+    def decode(self, data, message, unknown=None):
+        """
+        Decodes a JSON object into a message of this decoder's type.
+
+        Args:
+            data (dict): The parsed JSON object.
+            message: The message to fill in.
+            unknown (Counter): Receives the count of skipped keys, if given.
+        """
+        fields = self.fields
+        for key, value in data.items():
+            entry = fields.get(key)
+            if entry is None:
+                if unknown is not None:
+                    unknown[f"{self.name}.{key}"] += 1
+                continue
+            if value is None:
+                continue
+            name, kind, extra, repeated = entry
+            if kind == _SCALAR:
+                if repeated:
+                    getattr(message, name).extend(extra(item) for item in value)
+                else:
+                    setattr(message, name, extra(value))
+            elif kind == _ENUM:
+                if repeated:
+                    getattr(message, name).extend(self._enum(extra, item) for item in value)
+                else:
+                    setattr(message, name, self._enum(extra, value))
+            else:
+                decoder = self.registry.decoder(extra)
+                if repeated:
+                    container = getattr(message, name)
+                    for item in value:
+                        decoder.decode(item, container.add(), unknown)
+                else:
+                    child = getattr(message, name)
+                    child.SetInParent()
+                    decoder.decode(value, child, unknown)
+
+    @staticmethod
+    def _enum(names, value):
+        if isinstance(value, str):
+            return names.get(value) if value in names else names.get(value.upper(), 0)
+        return int(value)
+
+
+class SchemaRegistry:
+    """
+    Registry of generated Protobuf modules and the decoders built from them.
+
+    Several schema versions can be registered side by side; the first one is the
+    default. Decoders are cached per message descriptor, so messages of every
+    registered version decode through their own compiled field tables.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        self.default_version = None
+        self.unknown_fields = {}  # route -> Counter of unknown keys
+        self._decoders = {}
+        self._lock = threading.Lock()
+
+    def register(self, version, module):
+        """
+        Registers a generated *_pb2 module as a schema version.
+        """
+        self.versions[version] = module
+        if self.default_version is None:
+            self.default_version = version
+
+    def _module(self, version):
+        return self.versions[version or self.default_version]
+
+    def message_class(self, name, version=None):
+        """
+        Returns the message class of a type name, or None if the schema lacks it.
+        """
+        module = self._module(version)
+        if name not in module.DESCRIPTOR.message_types_by_name:
+            return None
+        return getattr(module, name)
+
+    def has_field(self, name, field, version=None):
+        """
+        Checks whether a message type of the schema defines a field.
+        """
+        descriptor = self._module(version).DESCRIPTOR.message_types_by_name.get(name)
+        return descriptor is not None and field in descriptor.fields_by_name
+
+    def check(self, message_names, version=None):
+        """
+        Checks the message types used by the processor against the schema.
+
+        Args:
+            message_names (list of str): The message type names to check.
+            version (str): Schema version, defaults to the default version.
+
+        Returns:
+            list: The names missing from the schema.
+        """
+        version = version or self.default_version
+        missing = [name for name in message_names if self.message_class(name, version) is None]
+        for name in missing:
+            logger.warning(f"Message type {name} is not defined by schema {version}")
+        return missing
+
+    def decoder(self, descriptor):
+        """
+        Returns the compiled decoder of a message descriptor.
+        """
+        decoder = self._decoders.get(descriptor)
+        if decoder is None:
+            with self._lock:
+                decoder = self._decoders.get(descriptor)
+                if decoder is None:
+                    decoder = self._decoders[descriptor] = MessageDecoder(self, descriptor)
+        return decoder
+
+    def decode(self, data, message, route=None):
+        """
+        Decodes a JSON object into a message, counting unknown keys per route.
+
+        Args:
+            data (dict): The parsed JSON object.
+            message: The message to fill in.
+            route (str): The route the data came from, for the unknown-field counts.
+
+        Returns:
+            message: The filled in message.
+        """
+        unknown = self.unknown_fields.get(route)
+        if unknown is None:
+            unknown = self.unknown_fields.setdefault(route, Counter())
+        seen = len(unknown)
+        self.decoder(message.DESCRIPTOR).decode(data, message, unknown)
+        if len(unknown) != seen:
+            for key in list(unknown)[seen:]:
+                logger.warning(f"Unknown field {key} on route {route}, skipping it")
+        return message
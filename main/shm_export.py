@@ -0,0 +1,292 @@
+# shm_export.py
+
+import logging
+import math
+import struct
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+logger = logging.getLogger(__name__)
+
+# Table layout, all little-endian. The header is followed by `capacity` rows
+# of `row_size` bytes; a row is the row head followed by the measurement slots.
+MAGIC = b'VALSHM01'
+HEADER = struct.Struct('<8sIIII')  # magic, capacity, measurement slots, row size, rows used
+HEADER_SIZE = 64
+# seq, mmsi, updated, stamp, latitude, longitude, sog, cog, heading, alert count, measurement count
+ROW_HEAD = struct.Struct('<Qqddddddd II')
+MEASUREMENT = struct.Struct('<32sdd')  # name (UTF-8, NUL padded), value, stamp
+SEQ = struct.Struct('<Q')
+ROWS_USED = struct.Struct('<I')
+ROWS_USED_OFFSET = 20
+
+# Reads retried without yielding the CPU before a reader starts yielding
+SPINS = 100
+
+# Byte offsets of the fields in a row
+_MMSI, _UPDATED, _STAMP, _ALERTS, _MEASUREMENT_COUNT = 8, 16, 24, 72, 76
+_POSITION = struct.Struct('<ddd')  # stamp, latitude, longitude
+_KINEMATICS = struct.Struct('<dddddd')  # stamp, latitude, longitude, sog, cog, heading
+_VALUE = struct.Struct('<dd')  # measurement value, stamp
+_DOUBLE = struct.Struct('<d')
+_COUNT = struct.Struct('<I')
+_INT64 = struct.Struct('<q')
+
+VesselState = namedtuple('VesselState', 'mmsi updated stamp latitude longitude sog cog heading alerts measurements')
+
+
+def _row_size(measurements):
+    # Rows are padded to whole cache lines
+    size = ROW_HEAD.size + measurements * MEASUREMENT.size
+    return (size + 63) // 64 * 64
+
+
+class ShmExport:
+    """
+    Writer of the shared-memory vessel table.
+
+    Each vessel gets a fixed row on its first update; rows are never moved or
+    reused while the table exists. Every row is guarded by a seqlock: the
+    writer makes the row's sequence number odd, writes the changed fields in
+    place and makes it even again. Readers copy the row and retry if the
+    sequence number was odd or changed meanwhile, so they never block the
+    writer and the writer never waits for them. Writes from several threads
+    are serialized by a lock, as a seqlock allows a single writer only.
+    """
+
+    def __init__(self, name, capacity=4096, measurements=16):
+        """
+        Args:
+            name (str): The shared memory block name; a stale block of the same
+                name left by a crashed processor is replaced.
+            capacity (int): The maximum number of vessels.
+            measurements (int): The measurement slots per vessel.
+        """
+        self.capacity = capacity
+        self.measurements = measurements
+        self.row_size = _row_size(measurements)
+        size = HEADER_SIZE + capacity * self.row_size
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            logger.warning(f"Replacing existing shared memory block {name}")
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.buf = self.shm.buf
+        HEADER.pack_into(self.buf, 0, MAGIC, capacity, measurements, self.row_size, 0)
+        self.rows = {}  # mmsi -> row offset
+        self.slots = {}  # (mmsi, name) -> measurement slot offset
+        self._lock = threading.Lock()
+        self._full_logged = False
+        logger.info(f"Exporting vessel state to shared memory {name} ({size / 1e6:.1f} MB, {capacity} vessels)")
+
+    def _row(self, mmsi):
+        offset = self.rows.get(mmsi)
+        if offset is not None:
+            return offset
+        if len(self.rows) >= self.capacity:
+            if not self._full_logged:
+                self._full_logged = True
+                logger.warning(f"Shared memory table full: {self.capacity} vessels, new vessels are not exported")
+            return None
+        offset = HEADER_SIZE + len(self.rows) * self.row_size
+        nan = math.nan
+        ROW_HEAD.pack_into(self.buf, offset, 0, mmsi, 0.0, nan, nan, nan, nan, nan, nan, 0, 0)
+        self.rows[mmsi] = offset
+        # Published after the row is initialized, so readers only see complete rows
+        ROWS_USED.pack_into(self.buf, ROWS_USED_OFFSET, len(self.rows))
+        return offset
+
+    def _begin(self, offset):
+        seq = SEQ.unpack_from(self.buf, offset)[0] + 1
+        SEQ.pack_into(self.buf, offset, seq)
+        return seq
+
+    def _end(self, offset, seq):
+        _DOUBLE.pack_into(self.buf, offset + _UPDATED, time.time())
+        SEQ.pack_into(self.buf, offset, seq + 1)
+
+    def update_position(self, mmsi, stamp, latitude, longitude):
+        """
+        Writes a position; speed, course and heading keep their values.
+        """
+        with self._lock:
+            offset = self._row(mmsi)
+            if offset is None:
+                return
+            seq = self._begin(offset)
+            _POSITION.pack_into(self.buf, offset + _STAMP, stamp, latitude, longitude)
+            self._end(offset, seq)
+
+    def update_kinematics(self, mmsi, stamp, latitude, longitude, sog, cog, heading):
+        """
+        Writes a position with speed and course over ground and heading.
+        """
+        with self._lock:
+            offset = self._row(mmsi)
+            if offset is None:
+                return
+            seq = self._begin(offset)
+            _KINEMATICS.pack_into(self.buf, offset + _STAMP, stamp, latitude, longitude, sog, cog, heading)
+            self._end(offset, seq)
+
+    def update_measurement(self, mmsi, name, value, stamp):
+        """
+        Writes the latest value of a measurement; a vessel's first measurements
+        take its slots in arrival order and later names are not exported.
+        """
+        with self._lock:
+            offset = self._row(mmsi)
+            if offset is None:
+                return
+            slot = self.slots.get((mmsi, name))
+            if slot is None:
+                count = _COUNT.unpack_from(self.buf, offset + _MEASUREMENT_COUNT)[0]
+                if count >= self.measurements:
+                    return
+                slot = self.slots[(mmsi, name)] = offset + ROW_HEAD.size + count * MEASUREMENT.size
+                seq = self._begin(offset)
+                MEASUREMENT.pack_into(self.buf, slot, name.encode('utf-8')[:32], value, stamp)
+                _COUNT.pack_into(self.buf, offset + _MEASUREMENT_COUNT, count + 1)
+                self._end(offset, seq)
+                return
+            seq = self._begin(offset)
+            _VALUE.pack_into(self.buf, slot + 32, value, stamp)
+            self._end(offset, seq)
+
+    def update_alerts(self, mmsi, count):
+        """
+        Writes the number of active alerts of a vessel.
+        """
+        with self._lock:
+            offset = self._row(mmsi)
+            if offset is None:
+                return
+            seq = self._begin(offset)
+            _COUNT.pack_into(self.buf, offset + _ALERTS, count)
+            self._end(offset, seq)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ShmReader:
+    """
+    Reader of the shared-memory vessel table, for use in other processes.
+
+    Example:
+        reader = ShmReader('val-state')
+        latitude, longitude = reader.kinematics(230000001)[1:3]
+    """
+
+    def __init__(self, name, timeout=1.0):
+        """
+        Args:
+            name (str): The shared memory block name given to the processor.
+            timeout (float): Seconds to retry reading a row that is being written
+                before giving up.
+        """
+        try:
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the block with the resource
+            # tracker, which would unlink it when this process exits
+            from multiprocessing import resource_tracker
+            self.shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.buf = self.shm.buf
+        magic, self.capacity, self.measurements, self.row_size, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory block {name} is not a vessel state table")
+        self.timeout = timeout
+        self.rows = {}  # mmsi -> row offset
+        self._indexed = 0
+
+    def _index(self):
+        used = ROWS_USED.unpack_from(self.buf, ROWS_USED_OFFSET)[0]
+        for row in range(self._indexed, used):
+            offset = HEADER_SIZE + row * self.row_size
+            self.rows[_INT64.unpack_from(self.buf, offset + _MMSI)[0]] = offset
+        self._indexed = used
+
+    def _offset(self, mmsi):
+        offset = self.rows.get(mmsi)
+        if offset is None:
+            self._index()
+            offset = self.rows.get(mmsi)
+        return offset
+
+    def _wait(self, mmsi, attempt, deadline):
+        # Spin briefly, then yield: the writer may have been descheduled mid-write
+        if attempt < SPINS:
+            return deadline
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        elif time.monotonic() > deadline:
+            raise TimeoutError(f"No consistent read of MMSI {mmsi}")
+        time.sleep(0)
+        return deadline
+
+    def vessels(self):
+        """
+        Returns:
+            list: The MMSIs in the table.
+        """
+        self._index()
+        return list(self.rows)
+
+    def kinematics(self, mmsi):
+        """
+        Reads the kinematics of a vessel without its measurements.
+
+        Returns:
+            tuple: (stamp, latitude, longitude, sog, cog, heading, alerts), or
+            None if the vessel is not in the table.
+        """
+        offset = self._offset(mmsi)
+        if offset is None:
+            return None
+        buf = self.buf
+        attempt, deadline = 0, None
+        while True:
+            row = ROW_HEAD.unpack_from(buf, offset)
+            if not row[0] & 1 and SEQ.unpack_from(buf, offset)[0] == row[0]:
+                return row[3:10]
+            attempt += 1
+            deadline = self._wait(mmsi, attempt, deadline)
+
+    def read(self, mmsi):
+        """
+        Reads the full state of a vessel.
+
+        Returns:
+            VesselState: The state with measurements as name -> (value, stamp),
+            or None if the vessel is not in the table.
+        """
+        offset = self._offset(mmsi)
+        if offset is None:
+            return None
+        buf = self.buf
+        attempt, deadline = 0, None
+        while True:
+            row = ROW_HEAD.unpack_from(buf, offset)
+            if not row[0] & 1:
+                slots = bytes(buf[offset + ROW_HEAD.size:offset + ROW_HEAD.size + row[10] * MEASUREMENT.size])
+                if SEQ.unpack_from(buf, offset)[0] == row[0]:
+                    break
+            attempt += 1
+            deadline = self._wait(mmsi, attempt, deadline)
+        measurements = {}
+        for name, value, stamp in MEASUREMENT.iter_unpack(slots):
+            measurements[name.rstrip(b'\0').decode('utf-8', 'replace')] = (value, stamp)
+        return VesselState(row[1], *row[2:10], measurements)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
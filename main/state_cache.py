@@ -0,0 +1,130 @@
+# state_cache.py
+
+import logging
+import threading
+
+import zenoh
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+
+class StateCache:
+    """
+    Keeps the latest serialized payload per key so late joiners can query it.
+
+    Payloads are stored exactly as received, so a reply is byte-for-byte the
+    sample a live subscriber would have seen.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key, payload):
+        """
+        Stores the latest payload of a key.
+
+        Args:
+            key (str): The concrete key expression of the sample.
+            payload (bytes): The raw sample payload. Other buffers are copied,
+                so the cache never pins a receive buffer.
+        """
+        if not isinstance(payload, bytes):
+            payload = bytes(payload)
+        with self._lock:
+            self._entries[key] = payload
+
+    def get(self, key):
+        """
+        Returns the latest payload of a key, or None.
+        """
+        return self._entries.get(key)
+
+    def matching(self, key_expr):
+        """
+        Returns the cached (key, payload) pairs matching a key expression.
+
+        Args:
+            key_expr (str): The key expression, possibly with wildcards.
+
+        Returns:
+            list: The matching (key, payload) pairs.
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        return [(key, payload) for key, payload in entries if utils.key_expr_matches(key_expr, key)]
+
+    def snapshot(self):
+        """
+        Returns a shallow copy of all cached entries.
+        """
+        with self._lock:
+            return dict(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reply(self, query):
+        """
+        Queryable callback answering a Zenoh get with the cached payloads.
+        """
+        key_expr = str(query.selector.key_expr)
+        entries = self.matching(key_expr)
+        for key, payload in entries:
+            query.reply(zenoh.Sample(key, payload))
+        logger.debug(f"Answered query {key_expr} with {len(entries)} cached samples")
+
+
+def declare_queryables(session, cache, key_exprs):
+    """
+    Declares a queryable serving the cache for each key expression.
+
+    Args:
+        session: The Zenoh session.
+        cache (StateCache): The cache to serve.
+        key_exprs (list of str): The key expressions to serve.
+
+    Returns:
+        list: The declared queryables.
+    """
+    queryables = []
+    for key_expr in key_exprs:
+        queryables.append(session.declare_queryable(key_expr, cache.reply))
+        logger.info(f"Serving cached state on: {key_expr}")
+    return queryables
+
+
+def seed(session, cache, key_expr, callback, timeout=2.0):
+    """
+    Queries peers for the current state of a key expression.
+
+    Every reply is passed to the subscription callback of the key expression, so
+    the seeded state goes through the same handling as live samples. Replies for
+    keys that already received a live sample are skipped, as they are older.
+
+    Args:
+        session: The Zenoh session.
+        cache (StateCache): The cache being seeded.
+        key_expr (str): The key expression to query.
+        callback (callable): The subscription callback, called with each reply sample.
+        timeout (float): Query timeout in seconds.
+
+    Returns:
+        int: The number of samples received.
+    """
+    count = 0
+    for reply in session.get(key_expr, zenoh.Queue(), timeout=timeout):
+        if reply.is_ok:
+            if cache.get(str(reply.ok.key_expr)) is None:
+                callback(reply.ok)
+                count += 1
+        else:
+            logger.warning(f"Error reply while seeding {key_expr}: {reply.err.payload}")
+    logger.info(f"Seeded {count} samples from {key_expr}")
+    return count
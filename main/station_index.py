@@ -0,0 +1,100 @@
+# station_index.py
+
+import logging
+import threading
+
+import val_standard_pb2
+
+logger = logging.getLogger(__name__)
+
+
+class StationIndex:
+    """
+    Bidirectional index of station assignments: station -> MMSIs and MMSI -> stations.
+
+    Each Assignments message carries the state of all stations. It is diffed
+    against the current index and only the changed entries are applied. Lookups
+    return immutable tuples that are rebuilt only when an entry changes, so the
+    per-sample lookup in the fan-out path is a single dict access.
+    """
+
+    def __init__(self):
+        self._assignments = {}  # (station_id, mmsi) -> Assignment.State
+        self._stations = {}  # station_id -> {mmsi: state}
+        self._vessels = {}  # mmsi -> {station_id: state}
+        self._stations_for = {}  # mmsi -> tuple of station ids
+        self._lock = threading.Lock()
+
+    def update(self, message):
+        """
+        Applies an Assignments message.
+
+        WATCHING and CONTROLLING entries are indexed; entries in any other state,
+        and pairs missing from the message, are removed.
+
+        Args:
+            message: A val_standard_pb2.Assignments message.
+
+        Returns:
+            tuple: (changed, removed) lists of (station_id, mmsi) pairs.
+        """
+        states = val_standard_pb2.Assignment
+        assigned = (states.WATCHING, states.CONTROLLING)
+        current = {}
+        for assignment in message.assignments:
+            if assignment.state in assigned:
+                current[(assignment.station_id, assignment.mmsi)] = assignment.state
+
+        with self._lock:
+            removed = [pair for pair in self._assignments if pair not in current]
+            changed = [pair for pair, state in current.items() if self._assignments.get(pair) != state]
+            touched = set()
+            for station_id, mmsi in removed:
+                del self._assignments[(station_id, mmsi)]
+                self._discard(self._stations, station_id, mmsi)
+                self._discard(self._vessels, mmsi, station_id)
+                touched.add(mmsi)
+            for station_id, mmsi in changed:
+                state = current[(station_id, mmsi)]
+                self._assignments[(station_id, mmsi)] = state
+                self._stations.setdefault(station_id, {})[mmsi] = state
+                self._vessels.setdefault(mmsi, {})[station_id] = state
+                touched.add(mmsi)
+            for mmsi in touched:
+                stations = self._vessels.get(mmsi)
+                if stations:
+                    self._stations_for[mmsi] = tuple(stations)
+                else:
+                    self._stations_for.pop(mmsi, None)
+
+        if changed or removed:
+            logger.info(f"Station assignments updated: {len(changed)} changed, {len(removed)} removed")
+        return changed, removed
+
+    @staticmethod
+    def _discard(index, key, member):
+        members = index.get(key)
+        if members is not None:
+            members.pop(member, None)
+            if not members:
+                del index[key]
+
+    def stations_for(self, mmsi):
+        """
+        Returns the ids of the stations watching or controlling a vessel.
+        """
+        return self._stations_for.get(mmsi, ())
+
+    def vessels_for(self, station_id):
+        """
+        Returns {mmsi: Assignment.State} for the vessels assigned to a station.
+        """
+        with self._lock:
+            return dict(self._stations.get(station_id, {}))
+
+    def stations(self):
+        """
+        Returns the ids of all stations with at least one assigned vessel.
+        """
+        with self._lock:
+            return list(self._stations)
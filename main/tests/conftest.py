@@ -0,0 +1,7 @@
+# conftest.py
+
+import os
+import sys
+
+# The processor modules are imported as top-level modules, as when run from main/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
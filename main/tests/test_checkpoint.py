@@ -0,0 +1,87 @@
+# test_checkpoint.py
+
+import checkpoint
+from state_cache import StateCache
+
+ENTRIES = {
+    'val/amoc/1/location': b'{"mmsi": 1}',
+    'val/amoc/2/rpm/value': b'{"mmsi": 2, "measurement": {"name": "rpm"}}',
+    'val/amoc/exercise_state': b'',
+}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'state.ckpt')
+    size = checkpoint.write(path, ENTRIES)
+    assert size == (tmp_path / 'state.ckpt').stat().st_size
+    assert not (tmp_path / 'state.ckpt.tmp').exists()
+    written, entries = checkpoint.read(path)
+    assert written is not None
+    assert {key: bytes(payload) for key, payload in entries} == ENTRIES
+
+
+def test_missing_file(tmp_path):
+    assert checkpoint.read(str(tmp_path / 'missing.ckpt')) == (None, [])
+
+
+def test_truncated_header(tmp_path):
+    path = tmp_path / 'state.ckpt'
+    path.write_bytes(checkpoint.MAGIC)
+    assert checkpoint.read(str(path)) == (None, [])
+
+
+def test_unknown_format(tmp_path):
+    path = tmp_path / 'state.ckpt'
+    checkpoint.write(str(path), ENTRIES)
+    data = bytearray(path.read_bytes())
+    data[:8] = b'VALCKPT0'
+    path.write_bytes(bytes(data))
+    assert checkpoint.read(str(path)) == (None, [])
+
+
+def test_truncated_entries_keep_complete_ones(tmp_path):
+    path = tmp_path / 'state.ckpt'
+    checkpoint.write(str(path), ENTRIES)
+    data = path.read_bytes()
+    # Cut inside the entry header of the last entry
+    last = checkpoint.ENTRY.size + len('val/amoc/exercise_state')
+    path.write_bytes(data[:len(data) - last + 2])
+    written, entries = checkpoint.read(str(path))
+    assert written is not None
+    assert [key for key, _ in entries] == ['val/amoc/1/location', 'val/amoc/2/rpm/value']
+
+
+def test_truncated_payload_is_dropped(tmp_path):
+    path = tmp_path / 'state.ckpt'
+    checkpoint.write(str(path), {'val/amoc/1/location': b'{"mmsi": 1}'})
+    path.write_bytes(path.read_bytes()[:-1])
+    assert checkpoint.read(str(path))[1] == []
+
+
+def test_restore_keeps_accepted_entries(tmp_path):
+    path = str(tmp_path / 'state.ckpt')
+    checkpoint.write(path, ENTRIES)
+    received = []
+
+    def location(sample):
+        received.append((sample.key_expr, bytes(sample.payload)))
+
+    def value(sample):
+        received.append((sample.key_expr, bytes(sample.payload)))
+        return False
+
+    cache = StateCache()
+    routes = [('val/amoc/**/location', location), ('val/amoc/**/value', value)]
+    assert checkpoint.restore(path, routes, cache) == 1
+    assert sorted(received) == sorted((key, ENTRIES[key]) for key in ENTRIES if key != 'val/amoc/exercise_state')
+    assert list(cache.snapshot()) == ['val/amoc/1/location']
+
+
+def test_checkpointer_writes_final_checkpoint(tmp_path):
+    path = str(tmp_path / 'state.ckpt')
+    cache = StateCache()
+    cache.put('val/amoc/1/location', b'{}')
+    checkpointer = checkpoint.Checkpointer(cache, path, interval=60.0)
+    checkpointer.start()
+    checkpointer.stop()
+    assert [key for key, _ in checkpoint.read(path)[1]] == ['val/amoc/1/location']
@@ -0,0 +1,66 @@
+# test_downsampler.py
+
+import pytest
+
+import val_standard_pb2
+
+from downsampler import Downsampler, parse_spec
+
+
+def measurement(name, value):
+    message = val_standard_pb2.MeasurementValue()
+    message.measurement.name = name
+    message.measurement.value = value
+    return message
+
+
+def location(latitude, longitude):
+    message = val_standard_pb2.LocationMessage()
+    message.location.latitude = latitude
+    message.location.longitude = longitude
+    return message
+
+
+def test_parse_spec():
+    assert parse_spec('val/amoc/**/value=mean:2') == ('val/amoc/**/value', 'mean', 2.0)
+    assert parse_spec('val/amoc/**/aisvessel=deadband:0.0001,sog=0.5') == \
+        ('val/amoc/**/aisvessel', 'deadband', {None: 0.0001, 'sog': 0.5})
+    with pytest.raises(ValueError):
+        parse_spec('val/amoc/**/value=median:1')
+
+
+def test_deadband_requires_default():
+    with pytest.raises(ValueError):
+        parse_spec('val/amoc/**/value=deadband:')
+    with pytest.raises(ValueError):
+        parse_spec('val/amoc/**/value=deadband:rpm=10')
+
+
+def test_deadband_per_measurement_threshold():
+    published = []
+    downsampler = Downsampler(lambda key, message: published.append(message.measurement.value))
+    downsampler.add_route(*parse_spec('val/amoc/**/value=deadband:0.5,rpm=10'))
+    for name, value in [('rpm', 100), ('rpm', 105), ('rpm', 111), ('temp', 1), ('temp', 1.4), ('temp', 2)]:
+        downsampler.process('val/amoc/**/value', f'val/amoc/1/{name}/value', measurement(name, value))
+    assert published == [100, 111, 1, 2]
+
+
+def test_mean_per_interval():
+    published = []
+    downsampler = Downsampler(lambda key, message: published.append((key, message.measurement.value)))
+    downsampler.add_route('val/amoc/**/value', 'mean', 1.0)
+    for now, value in [(0.1, 1.0), (0.5, 3.0), (1.2, 10.0)]:
+        downsampler.process('val/amoc/**/value', 'val/amoc/1/rpm/value', measurement('rpm', value), now=now)
+    assert published == [('val/downsampled/amoc/1/rpm/value', 2.0)]
+    downsampler.flush()
+    assert published[-1] == ('val/downsampled/amoc/1/rpm/value', 10.0)
+
+
+def test_max_keeps_last_position():
+    published = []
+    downsampler = Downsampler(lambda key, message: published.append(message))
+    downsampler.add_route('val/amoc/**/location', 'max', 1.0)
+    for now, fix in [(0.1, (60.0, 21.0)), (0.2, (61.0, 20.0)), (0.3, (60.5, 20.5))]:
+        downsampler.process('val/amoc/**/location', 'val/amoc/1/location', location(*fix), now=now)
+    downsampler.flush()
+    assert [(message.location.latitude, message.location.longitude) for message in published] == [(60.5, 20.5)]
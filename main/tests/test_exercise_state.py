@@ -0,0 +1,32 @@
+# test_exercise_state.py
+
+import val_standard_pb2
+
+from exercise_state import ExerciseStateController
+
+States = val_standard_pb2.ExerciseState
+
+
+def test_hooks_run_on_transitions():
+    controller = ExerciseStateController()
+    calls = []
+    controller.on_flush(lambda: calls.append('flush'))
+    controller.on_reset(lambda: calls.append('reset'))
+    controller.update(States.ASSIGNED)
+    assert calls == ['flush', 'reset']
+    assert not controller.active
+    controller.update(States.ASSIGNED)
+    assert calls == ['flush', 'reset']
+    controller.update(States.PLAYING)
+    assert calls == ['flush', 'reset', 'flush']
+    assert controller.active
+
+
+def test_unknown_state_still_runs_hooks():
+    controller = ExerciseStateController()
+    calls = []
+    controller.on_flush(lambda: calls.append(controller.active))
+    unknown = max(States.State.values()) + 1
+    controller.update(unknown)
+    assert controller.state == unknown
+    assert calls == [False]
@@ -0,0 +1,151 @@
+# test_fan_in.py
+
+import threading
+
+import pytest
+
+import fan_in
+from fan_in import Deduplicator, RouterSet, parse_router
+
+
+class FakeInfo:
+
+    def __init__(self, session):
+        self.session = session
+
+    def routers_zid(self):
+        if self.session.broken:
+            raise AttributeError('broken')
+        return ['router'] if self.session.connected else []
+
+    def peers_zid(self):
+        return []
+
+
+class FakeSession:
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.connected = True
+        self.broken = False
+        self.fail_puts = False
+        self.puts = []
+        self.checked = threading.Event()
+
+    def put(self, key, payload):
+        if self.fail_puts:
+            raise ConnectionError(f"{self.endpoint} down")
+        self.puts.append((key, payload))
+
+    def info(self):
+        self.checked.set()
+        return FakeInfo(self)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_routers(monkeypatch):
+    unreachable = set()
+
+    def open_router(router):
+        if router.endpoint in unreachable:
+            raise ConnectionError(f"{router.endpoint} unreachable")
+        router.session = FakeSession(router.endpoint)
+        router.healthy = True
+
+    monkeypatch.setattr(fan_in._Router, 'open', open_router)
+    return unreachable
+
+
+def test_parse_router():
+    assert parse_router('tcp/10.0.0.2:7447') == ('tcp/10.0.0.2:7447', None)
+    assert parse_router('tcp/a:7447=val/a/**, val/b/**') == ('tcp/a:7447', ['val/a/**', 'val/b/**'])
+
+
+def test_deduplicator_drops_repeats_within_window():
+    deduplicator = Deduplicator(size=2)
+    assert deduplicator.first('a', b'1')
+    assert not deduplicator.first('a', b'1')
+    assert deduplicator.first('a', b'2')
+    assert deduplicator.first('b', b'1')
+    assert deduplicator.duplicates == 1
+
+
+def test_deduplicator_evicts_least_recently_seen():
+    deduplicator = Deduplicator(size=2)
+    deduplicator.first('a', b'1')
+    deduplicator.first('b', b'1')
+    # Seeing 'a' again makes 'b' the oldest entry
+    assert not deduplicator.first('a', b'1')
+    deduplicator.first('c', b'1')
+    assert deduplicator.first('b', b'1')
+    assert not deduplicator.first('c', b'1')
+
+
+def test_put_fails_over(fake_routers):
+    routers = RouterSet([('tcp/a:7447', None), ('tcp/b:7447', None)], health_interval=60.0)
+    try:
+        key = 'val/amoc/1/location'
+        first = routers._candidates(key)[0]
+        first.session.fail_puts = True
+        routers.put(key, b'{}')
+        second = routers._candidates(key)[0]
+        assert second is not first
+        assert second.session.puts == [(key, b'{}')]
+        assert not first.healthy
+        second.session.fail_puts = True
+        with pytest.raises(ConnectionError):
+            routers.put(key, b'{}')
+    finally:
+        routers.close()
+
+
+def test_put_prefers_router_covering_key(fake_routers):
+    routers = RouterSet([('tcp/a:7447', ['val/amoc/**/value']), ('tcp/b:7447', ['val/amoc/**/location'])],
+                        health_interval=60.0)
+    try:
+        for index in range(10):
+            routers.put(f'val/amoc/{index}/rpm/value', b'1')
+            routers.put(f'val/amoc/{index}/location', b'2')
+        assert {payload for _, payload in routers.routers[0].session.puts} == {b'1'}
+        assert {payload for _, payload in routers.routers[1].session.puts} == {b'2'}
+    finally:
+        routers.close()
+
+
+def test_no_reachable_router(fake_routers):
+    fake_routers.update({'tcp/a:7447', 'tcp/b:7447'})
+    with pytest.raises(ConnectionError):
+        RouterSet([('tcp/a:7447', None), ('tcp/b:7447', None)])
+
+
+def test_health_checks_survive_errors(fake_routers):
+    fake_routers.add('tcp/b:7447')
+    routers = RouterSet([('tcp/a:7447', None), ('tcp/b:7447', None)], health_interval=0.01)
+    try:
+        session = routers.routers[0].session
+        session.broken = True
+        session.checked.clear()
+        assert session.checked.wait(1.0)
+        session.checked.clear()
+        # Still checking after the error was logged
+        assert session.checked.wait(1.0)
+        session.broken = False
+        session.connected = False
+        session.checked.clear()
+        session.checked.wait(1.0)
+        session.checked.clear()
+        session.checked.wait(1.0)
+        assert not routers.routers[0].healthy
+        # The unreachable router is retried and connects
+        fake_routers.clear()
+        for _ in range(100):
+            if routers.routers[1].session is not None:
+                break
+            session.checked.clear()
+            session.checked.wait(1.0)
+        assert routers.routers[1].healthy
+    finally:
+        routers.close()
@@ -0,0 +1,56 @@
+# test_filters.py
+
+import pytest
+
+from filters import RouteFilter, parse_filters
+
+
+def test_mmsi_allow_and_deny():
+    route_filter = RouteFilter('val/amoc/**/location')
+    route_filter.add_rule('mmsi:1,2,3')
+    route_filter.add_rule('!mmsi:2')
+    key = 'val/amoc/1/location'
+    assert route_filter.accepts(key, b'{"mmsi": 1, "location": {}}')
+    assert not route_filter.accepts(key, b'{"mmsi": 2}')
+    assert not route_filter.accepts(key, b'{"mmsi":4}')
+    assert route_filter.rejected == {'!mmsi': 1, 'mmsi': 1}
+
+
+def test_payload_without_field_is_accepted():
+    route_filter = RouteFilter('val/amoc/**/value')
+    route_filter.add_rule('mmsi:1')
+    route_filter.add_rule('name:rpm*')
+    assert route_filter.accepts('val/amoc/x/value', b'{"measurement": {"value": 1.0}}')
+
+
+def test_name_patterns_on_memoryview():
+    route_filter = RouteFilter('val/amoc/**/value')
+    route_filter.add_rule('name:engine_*')
+    route_filter.add_rule('!name:engine_temp*')
+    key = 'val/amoc/1/value'
+    assert route_filter.accepts(key, memoryview(b'{"measurement": {"name": "engine_rpm"}}'))
+    assert not route_filter.accepts(key, memoryview(b'{"measurement": {"name": "engine_temp_1"}}'))
+    assert not route_filter.accepts(key, memoryview(b'{"measurement": {"name": "heading"}}'))
+
+
+def test_segment_rule():
+    route_filter = RouteFilter('val/amoc/**/properties')
+    route_filter.add_rule('segment:-2=rpm,speed*')
+    assert route_filter.accepts('val/amoc/1/rpm/properties', b'{}')
+    assert route_filter.accepts('val/amoc/1/speed_log/properties', b'{}')
+    assert not route_filter.accepts('val/amoc/1/heading/properties', b'{}')
+    assert not route_filter.accepts('properties', b'{}')
+    assert route_filter.rejected == {'segment': 2}
+
+
+def test_invalid_rule():
+    with pytest.raises(ValueError):
+        RouteFilter('val/amoc/**/value').add_rule('color:red')
+
+
+def test_parse_filters_combines_routes():
+    route_filters = parse_filters(['val/amoc/**/location=mmsi:1;!mmsi:2', 'val/amoc/**/location=mmsi:3'])
+    assert list(route_filters) == ['val/amoc/**/location']
+    route_filter = route_filters['val/amoc/**/location']
+    assert route_filter.mmsi_allow == {1, 3}
+    assert route_filter.mmsi_deny == {2}
@@ -0,0 +1,117 @@
+# test_gateway.py
+
+import asyncio
+import json
+import socket
+import time
+
+import pytest
+
+import val_standard_pb2
+
+from gateway import Gateway, _Client, parse_address
+
+
+def location(mmsi, latitude):
+    message = val_standard_pb2.LocationMessage()
+    message.mmsi = mmsi
+    message.location.latitude = latitude
+    return message
+
+
+class Connection:
+
+    def __init__(self, port):
+        self.sock = socket.create_connection(('127.0.0.1', port), timeout=5.0)
+        self.file = self.sock.makefile('rb')
+
+    def send(self, command):
+        self.sock.sendall(json.dumps(command).encode('utf-8') + b'\n')
+
+    def receive(self):
+        return json.loads(self.file.readline())
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+@pytest.fixture
+def gateway():
+    gateway = Gateway(port=0)
+    gateway.start()
+    yield gateway
+    gateway.stop()
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+def test_parse_address():
+    assert parse_address('7448') == ('127.0.0.1', 7448)
+    assert parse_address('0.0.0.0:7000') == ('0.0.0.0', 7000)
+
+
+def test_fan_out_by_vessel_and_topic(gateway):
+    by_vessel, by_topic = Connection(gateway.port), Connection(gateway.port)
+    try:
+        by_vessel.send({'op': 'subscribe', 'mmsi': [1]})
+        by_topic.send({'op': 'subscribe', 'topics': ['alerts']})
+        wait_for(lambda: 1 in gateway.by_mmsi and 'alerts' in gateway.by_topic)
+        gateway.publish('val/amoc/2/location', 2, location(2, 60.0))
+        gateway.publish('val/amoc/1/location', 1, location(1, 61.0))
+        gateway.publish('val/amoc/1/alerts', 1, val_standard_pb2.Alerts())
+        assert [by_vessel.receive()['key'] for _ in range(2)] == ['val/amoc/1/location', 'val/amoc/1/alerts']
+        update = by_topic.receive()
+        assert (update['topic'], update['mmsi'], update['key']) == ('alerts', 1, 'val/amoc/1/alerts')
+    finally:
+        by_vessel.close()
+        by_topic.close()
+
+
+def test_subscribe_sends_current_state(gateway):
+    gateway.publish('val/amoc/1/location', 1, location(1, 60.0))
+    gateway.publish('val/amoc/1/location', 1, location(1, 61.0))
+    gateway.publish('val/amoc/2/location', 2, location(2, 62.0), live=False)
+    connection = Connection(gateway.port)
+    try:
+        connection.send({'op': 'subscribe', 'mmsi': [1, 2]})
+        updates = sorted((connection.receive() for _ in range(2)), key=lambda update: update['mmsi'])
+        assert [update['data']['location']['latitude'] for update in updates] == [61.0, 62.0]
+        # Keys already streamed are not sent again
+        connection.send({'op': 'subscribe', 'topics': ['location'], 'mmsi': [3]})
+        gateway.publish('val/amoc/3/location', 3, location(3, 63.0))
+        assert connection.receive()['mmsi'] == 3
+    finally:
+        connection.close()
+
+
+def test_slow_client_is_evicted():
+    class Writer:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    async def scenario():
+        gateway = Gateway(queue_size=2)
+        slow, fast = _Client('slow', Writer(), 2), _Client('fast', Writer(), 8)
+        for client in (slow, fast):
+            client.sender = asyncio.get_running_loop().create_future()
+            gateway.clients.add(client)
+            gateway._subscribe(client, [1], [])
+        for index in range(3):
+            gateway._fan_out('location', 1, b'%d\n' % index)
+        return gateway, slow, fast
+
+    gateway, slow, fast = asyncio.run(scenario())
+    assert gateway.evicted == 1
+    assert slow.writer.closed and slow.sender.cancelled()
+    assert gateway.clients == {fast}
+    assert gateway.by_mmsi == {1: {fast}}
+    assert fast.queue.qsize() == 3
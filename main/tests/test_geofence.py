@@ -0,0 +1,63 @@
+# test_geofence.py
+
+import json
+
+import numpy as np
+import pytest
+
+import geofence
+from geofence import GeofenceEngine, Zone, load_zones
+
+SQUARE = [[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 10.0], [0.0, 0.0]]
+HOLE = [[4.0, 4.0], [6.0, 4.0], [6.0, 6.0], [4.0, 6.0], [4.0, 4.0]]
+
+
+def test_even_odd_with_hole():
+    zone = Zone('square', [SQUARE, HOLE])
+    lon = np.array([1.0, 5.0, 11.0, 9.9, 5.0])
+    lat = np.array([1.0, 5.0, 5.0, 9.9, 3.0])
+    assert zone.contains(lon, lat).tolist() == [True, False, False, True, True]
+
+
+def test_batches_match_single_pass(monkeypatch):
+    zone = Zone('square', [SQUARE, HOLE])
+    rng = np.random.default_rng(1)
+    lon, lat = rng.uniform(-2, 12, 1000), rng.uniform(-2, 12, 1000)
+    expected = zone.contains(lon, lat)
+    # Tiny batches split the points over many passes
+    monkeypatch.setattr(geofence, 'MAX_BATCH', 30)
+    assert zone.contains(lon, lat).tolist() == expected.tolist()
+
+
+def test_zone_without_valid_ring():
+    with pytest.raises(ValueError):
+        Zone('line', [[[0.0, 0.0], [1.0, 1.0]]])
+
+
+def test_load_zones_skips_degenerate(tmp_path):
+    path = tmp_path / 'zones.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'name': 'harbour'}, 'geometry': {'type': 'Polygon', 'coordinates': [SQUARE]}},
+        {'type': 'Feature', 'properties': {'name': 'broken'},
+         'geometry': {'type': 'Polygon', 'coordinates': [[[0.0, 0.0], [1.0, 1.0]]]}},
+        {'type': 'Feature', 'id': 'point', 'geometry': {'type': 'Point', 'coordinates': [0.0, 0.0]}},
+    ]}))
+    assert [zone.name for zone in load_zones(str(path))] == ['harbour']
+
+
+def test_enter_and_exit_events():
+    engine = GeofenceEngine([Zone('a', [SQUARE]), Zone('b', [[[5.0, 5.0], [15.0, 5.0], [15.0, 15.0], [5.0, 15.0]]])])
+    engine.update(1, 1.0, 1.0)
+    engine.update(2, 20.0, 20.0)
+    assert engine.evaluate() == [(1, 'a', True)]
+    engine.update(1, 1.5, 1.5)
+    assert engine.evaluate() == []
+    # Latitude then longitude: into the overlap of both zones
+    engine.update(1, 7.0, 7.0)
+    assert engine.evaluate() == [(1, 'b', True)]
+    engine.update(1, 12.0, 12.0)
+    assert engine.evaluate() == [(1, 'a', False)]
+    engine.update(1, 20.0, 20.0)
+    assert engine.evaluate() == [(1, 'b', False)]
+    assert engine.inside == {}
+    assert engine.evaluate() == []
@@ -0,0 +1,141 @@
+# test_history.py
+
+import glob
+import os
+
+import pytest
+
+import val_standard_pb2
+
+from history import FRAME, HistoryStore
+
+
+def measurement(mmsi, name, value):
+    message = val_standard_pb2.MeasurementValue()
+    message.mmsi = mmsi
+    message.measurement.name = name
+    message.measurement.value = value
+    return message
+
+
+def location(mmsi, latitude, longitude):
+    message = val_standard_pb2.LocationMessage()
+    message.mmsi = mmsi
+    message.location.latitude = latitude
+    message.location.longitude = longitude
+    return message
+
+
+def ais_vessel(mmsi, latitude, longitude):
+    message = val_standard_pb2.AISVesselMessage()
+    message.ais_vessel.mmsi = mmsi
+    message.ais_vessel.latitude = latitude
+    message.ais_vessel.longitude = longitude
+    return message
+
+
+def record_values(store, mmsi, name, times):
+    for t in times:
+        store.record(measurement(mmsi, name, t * 10), t, mmsi, name)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def values(results):
+    return [(t, message.measurement.value) for t, message in results]
+
+
+def test_query_across_closed_and_open_segments(store):
+    record_values(store, 1, 'rpm', [1.0, 2.0, 3.0])
+    record_values(store, 1, 'temp', [1.5, 2.5])
+    record_values(store, 2, 'rpm', [1.0, 2.0])
+    store.close()
+    record_values(store, 1, 'rpm', [4.0, 5.0])
+    assert len(glob.glob(os.path.join(store.directory, '*.idx'))) == 1
+    assert values(store.measurements(1, 'rpm', 2.0, 4.0)) == [(2.0, 20.0), (3.0, 30.0), (4.0, 40.0)]
+    assert values(store.measurements(1, 'rpm', 0.0, 10.0)) == [(t, t * 10) for t in (1.0, 2.0, 3.0, 4.0, 5.0)]
+    assert values(store.measurements(1, 'temp', 0.0, 10.0)) == [(1.5, 15.0), (2.5, 25.0)]
+    assert values(store.measurements(2, 'rpm', 1.5, 10.0)) == [(2.0, 20.0)]
+    assert store.measurements(3, 'rpm', 0.0, 10.0) == []
+
+
+def test_segments_outside_time_range_are_skipped(store):
+    record_values(store, 1, 'rpm', [100.0, 101.0])
+    store.close()
+    record_values(store, 1, 'rpm', [200.0])
+    assert [path for _, path in store._segments(150.0, 160.0)] == [store._path]
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    record_values(store, 1, 'rpm', [3.0, 1.0, 2.0])
+    store.close()
+    for index_path in glob.glob(str(tmp_path / '*.idx')):
+        os.remove(index_path)
+    store = HistoryStore(str(tmp_path))
+    try:
+        assert len(glob.glob(str(tmp_path / '*.idx'))) == 1
+        assert values(store.measurements(1, 'rpm', 0.0, 10.0)) == [(1.0, 10.0), (2.0, 20.0), (3.0, 30.0)]
+    finally:
+        store.close()
+
+
+def test_frame_truncated_mid_write(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    record_values(store, 1, 'rpm', [1.0, 2.0, 3.0])
+    # A kill leaves the open segment without its index and the last frame cut off
+    segment = store._path
+    store._file.close()
+    store._file = None
+    with open(segment, 'r+b') as f:
+        f.truncate(os.path.getsize(segment) - 3)
+    store = HistoryStore(str(tmp_path))
+    try:
+        assert values(store.measurements(1, 'rpm', 0.0, 10.0)) == [(1.0, 10.0), (2.0, 20.0)]
+    finally:
+        store.close()
+
+
+def test_frame_header_truncated(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    record_values(store, 1, 'rpm', [1.0])
+    segment = store._path
+    store._file.write(FRAME.pack(0, 0, 1, 2.0, 10)[:FRAME.size - 4])
+    store._file.close()
+    store._file = None
+    store = HistoryStore(str(tmp_path))
+    try:
+        assert values(store.measurements(1, 'rpm', 0.0, 10.0)) == [(1.0, 10.0)]
+        assert os.path.exists(segment[:-len('.seg')] + '.idx')
+    finally:
+        store.close()
+
+
+def test_fleet_positions_at(store):
+    store.record(location(1, 60.0, 20.0), 10.0, 1)
+    store.record(location(1, 60.1, 20.1), 20.0, 1)
+    store.record(location(1, 60.2, 20.2), 30.0, 1)
+    store.record(ais_vessel(2, 59.0, 19.0), 15.0, 2)
+    store.close()
+    store.record(ais_vessel(2, 59.5, 19.5), 25.0, 2)
+    store.record(location(3, 58.0, 18.0), 26.0, 3)
+    assert store.fleet_positions_at(25.0, lookback=100.0) == {
+        1: (20.0, 60.1, 20.1),
+        2: (25.0, 59.5, 19.5),
+    }
+    assert store.fleet_positions_at(40.0, lookback=100.0)[1] == (30.0, 60.2, 20.2)
+
+
+def test_fleet_positions_lookback_cutoff(store):
+    store.record(location(1, 60.0, 20.0), 10.0, 1)
+    store.record(location(2, 59.0, 19.0), 95.0, 2)
+    store.close()
+    store.record(location(3, 58.0, 18.0), 99.0, 3)
+    assert set(store.fleet_positions_at(100.0, lookback=10.0)) == {2, 3}
+    assert set(store.fleet_positions_at(100.0, lookback=90.0)) == {1, 2, 3}
+    assert store.fleet_positions_at(100.0, lookback=0.5) == {}
@@ -0,0 +1,97 @@
+# test_latency.py
+
+import threading
+
+import pytest
+
+import latency
+from latency import LatencyTracker, RollingSketch
+
+
+def exact_quantile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def test_empty_sketch():
+    assert RollingSketch().quantiles([0.5, 0.99]) == [None, None]
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(accuracy):
+    sketch = RollingSketch(relative_accuracy=accuracy)
+    values = [1e-4 * 1.01 ** i for i in range(1000)]
+    for value in values:
+        sketch.add(value)
+    qs = [0.0, 0.25, 0.5, 0.9, 0.99, 1.0]
+    for q, estimate in zip(qs, sketch.quantiles(qs)):
+        expected = exact_quantile(values, q)
+        assert abs(estimate - expected) <= accuracy * expected * 1.0001
+
+
+def test_values_below_minimum_are_clamped():
+    sketch = RollingSketch()
+    sketch.add(0.0)
+    sketch.add(-1.0)
+    estimate = sketch.quantiles([0.5])[0]
+    assert estimate == pytest.approx(latency.MIN_LATENCY, rel=0.02)
+
+
+def test_windows_rotate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(latency.time, 'monotonic', lambda: now[0])
+    sketch = RollingSketch(window=10.0)
+    sketch.add(0.001)
+    now[0] += 10.0
+    sketch.add(0.1)
+    assert sketch.count() == 2
+    now[0] += 10.0
+    assert sketch.quantiles([0.5]) == [pytest.approx(0.1, rel=0.01)]
+    assert sketch.count() == 1
+    now[0] += 25.0
+    assert sketch.quantiles([0.5]) == [None]
+
+
+def test_concurrent_adds_are_counted():
+    sketch = RollingSketch()
+
+    def add():
+        for _ in range(10000):
+            sketch.add(0.002)
+
+    threads = [threading.Thread(target=add) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sketch.count() == 40000
+
+
+def test_tracker_report():
+    tracker = LatencyTracker(budgets={'route': 1.0})
+    for _ in range(10):
+        tracker.record('route', 'decoded_to_handled', 0.01)
+    entry = tracker.report()['route']['decoded_to_handled']
+    assert entry['count'] == 10
+    assert entry['p50'] == pytest.approx(0.01, rel=0.01)
+    assert set(entry) == {'count', 'p50', 'p90', 'p99'}
+
+
+def test_scan_publish_stamp():
+    payload = b'{"mmsi": 1, "publish_stamp": {"nanosec": 500000000, "sec": 100}, "location": {"sec": 5}}'
+    assert latency.scan_publish_stamp(payload) == 100.5
+    assert latency.scan_publish_stamp(memoryview(b'{"publish_stamp":{"sec":7}}')) == 7.0
+    assert latency.scan_publish_stamp(b'{"publish_stamp": {"sec": 0}}') is None
+    assert latency.scan_publish_stamp(b'{"mmsi": 1}') is None
+
+
+def test_stale_samples_shed_before_decoding():
+    tracker = LatencyTracker(budgets={'route': 1.0})
+    payload = b'{"publish_stamp": {"sec": 100, "nanosec": 0}}'
+    assert tracker.received('route', payload, 100.5) is True
+    assert tracker.received('route', payload, 102.0) is False
+    assert tracker.received('route', b'{}', 102.0) is None
+    assert tracker.shed == {'route': 1}
+    # Samples judged before decoding are not judged again
+    assert tracker.decoded('route', None, 102.0, 0.001) is True
+    assert tracker.report()['route']['publish_to_receive']['count'] == 2
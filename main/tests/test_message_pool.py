@@ -0,0 +1,51 @@
+# test_message_pool.py
+
+import threading
+
+import val_standard_pb2
+
+from message_pool import MessagePool
+
+
+def test_released_message_is_cleared_and_reused():
+    pool = MessagePool()
+    message = pool.acquire(val_standard_pb2.MeasurementValue)
+    message.mmsi = 230000001
+    message.measurement.name = 'rpm'
+    message.measurement.value = 1500.0
+    pool.release(message)
+    reused = pool.acquire(val_standard_pb2.MeasurementValue)
+    assert reused is message
+    assert reused == val_standard_pb2.MeasurementValue()
+    assert not reused.HasField('measurement')
+    assert pool.stats() == {'created': 1, 'reused': 1}
+
+
+def test_pools_are_per_class():
+    pool = MessagePool()
+    pool.release(pool.acquire(val_standard_pb2.MeasurementValue))
+    location = pool.acquire(val_standard_pb2.LocationMessage)
+    assert isinstance(location, val_standard_pb2.LocationMessage)
+    assert pool.stats() == {'created': 2, 'reused': 0}
+
+
+def test_surplus_releases_are_dropped():
+    pool = MessagePool(max_size=2)
+    messages = [pool.acquire(val_standard_pb2.MeasurementValue) for _ in range(3)]
+    for message in messages:
+        pool.release(message)
+    assert pool.acquire(val_standard_pb2.MeasurementValue) is messages[1]
+    assert pool.acquire(val_standard_pb2.MeasurementValue) is messages[0]
+    created = pool.acquire(val_standard_pb2.MeasurementValue)
+    assert all(created is not message for message in messages)
+
+
+def test_pools_are_per_thread():
+    pool = MessagePool()
+    pool.release(pool.acquire(val_standard_pb2.MeasurementValue))
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire(val_standard_pb2.MeasurementValue)))
+    thread.start()
+    thread.join()
+    assert pool.stats() == {'created': 2, 'reused': 0}
+    assert pool.acquire(val_standard_pb2.MeasurementValue) is not acquired[0]
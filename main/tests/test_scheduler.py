@@ -0,0 +1,77 @@
+# test_scheduler.py
+
+import threading
+
+from scheduler import PriorityScheduler
+
+CLASSES = {
+    'critical': (8, 1.0, None),
+    'normal': (4, 1.0, 100),
+    'bulk': (1, 1.0, 100),
+}
+
+
+def recorder(total):
+    # The tests queue everything before starting the single worker, so the
+    # handling order is deterministic
+    order = []
+    done = threading.Event()
+
+    def handle(name):
+        order.append(name)
+        if len(order) == total:
+            done.set()
+
+    return order, done, handle
+
+
+def test_weighted_shares_under_load():
+    scheduler = PriorityScheduler(CLASSES, workers=1)
+    order, done, handle = recorder(3 * 39)
+    for name in ('bulk', 'normal', 'critical'):
+        for _ in range(39):
+            scheduler.submit(name, handle, name)
+    scheduler.start()
+    assert done.wait(5.0)
+    scheduler.stop()
+    # Every round of 13 serves 8 critical, 4 normal and 1 bulk sample, highest first
+    first_round = ['critical'] * 8 + ['normal'] * 4 + ['bulk']
+    assert order[:13] == first_round
+    assert order[13:26] == first_round
+    first = order[:39]
+    assert (first.count('critical'), first.count('normal'), first.count('bulk')) == (24, 12, 3)
+
+
+def test_lower_classes_take_over_when_higher_are_empty():
+    scheduler = PriorityScheduler(CLASSES, workers=1)
+    order, done, handle = recorder(6)
+    for _ in range(5):
+        scheduler.submit('bulk', handle, 'bulk')
+    scheduler.submit('critical', handle, 'critical')
+    scheduler.start()
+    assert done.wait(5.0)
+    scheduler.stop()
+    assert order == ['critical'] + ['bulk'] * 5
+
+
+def test_bounded_classes_drop_oldest():
+    scheduler = PriorityScheduler(CLASSES, workers=1)
+    order, done, handle = recorder(100)
+    for index in range(150):
+        scheduler.submit('normal', handle, index)
+    classes = {cls.name: cls for cls in scheduler.classes}
+    assert classes['normal'].dropped == 50
+    scheduler.start()
+    assert done.wait(5.0)
+    scheduler.stop()
+    assert order == list(range(50, 150))
+
+
+def test_failing_callback_does_not_stop_worker():
+    scheduler = PriorityScheduler(CLASSES, workers=1)
+    done = threading.Event()
+    scheduler.submit('critical', lambda: 1 / 0)
+    scheduler.submit('critical', done.set)
+    scheduler.start()
+    assert done.wait(5.0)
+    scheduler.stop()
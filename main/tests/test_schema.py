@@ -0,0 +1,80 @@
+# test_schema.py
+
+import pytest
+from google.protobuf import json_format
+
+import decoders
+import val_standard_pb2
+from schema import SchemaRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = SchemaRegistry()
+    registry.register('v1', val_standard_pb2)
+    return registry
+
+
+def test_enum_names_fold_case(registry):
+    for value, expected in [('GPS_FIX', 1), ('rtk', 4), ('Estimated', 6), (2, 2), ('no_such_fix', 0)]:
+        message = registry.decode({'quality': value}, val_standard_pb2.Location())
+        assert message.quality == expected
+
+
+def test_json_names_and_nested_messages(registry):
+    message = registry.decode({'mmsi': 1, 'classA': True, 'true_heading': 90, 'statics': {'name': 'ALPHA'}},
+                              val_standard_pb2.AISVessel())
+    assert (message.mmsi, message.class_a, message.true_heading) == (1, True, 90)
+    assert message.statics.name == 'ALPHA'
+
+
+def test_unknown_keys_are_counted_per_route(registry):
+    message = val_standard_pb2.Location()
+    registry.decode({'latitude': 60.0, 'altitude': 5.0}, message, 'route')
+    registry.decode({'altitude': 6.0, 'speed': 1.0}, message, 'route')
+    assert message.latitude == 60.0
+    assert registry.unknown_fields['route'] == {'val.amoc.Location.altitude': 2, 'val.amoc.Location.speed': 1}
+
+
+def test_integers_are_not_truncated(registry):
+    assert registry.decode({'mmsi': 5.0}, val_standard_pb2.AISVessel()).mmsi == 5
+    assert registry.decode({'mmsi': '7'}, val_standard_pb2.AISVessel()).mmsi == 7
+    for value in (5.5, True, 'five'):
+        with pytest.raises(json_format.ParseError):
+            registry.decode({'mmsi': value}, val_standard_pb2.AISVessel())
+
+
+def test_matches_parse_dict(registry):
+    data = {'mmsi': 230000001, 'sog': 12.5, 'latitude': 60.1, 'longitude': 21.5, 'cog': 90.0,
+            'statics': {'name': 'ALPHA', 'callsign': 'OH123'}}
+    expected = json_format.ParseDict(data, val_standard_pb2.AISVessel())
+    assert registry.decode(data, val_standard_pb2.AISVessel()) == expected
+
+
+def test_alerts_unwrap_nested_alert():
+    message = decoders.decode('Alerts', {
+        'mmsi': 1,
+        'publish_stamp': {'sec': 10, 'nanosec': 5},
+        'alerts': [{'alert': {'identifier': 1, 'description': 'nested'}},
+                   {'identifier': 2, 'description': 'flat'}],
+    })
+    assert message.mmsi == 1
+    assert (message.publish_stamp.sec, message.publish_stamp.nanosec) == (10, 5)
+    assert [(alert.identifier, alert.description) for alert in message.alerts] == [(1, 'nested'), (2, 'flat')]
+
+
+def test_assignments_unwrap_nested_assignment():
+    message = decoders.decode('Assignments', {'assignments': [
+        {'assignment': {'station_id': 'bridge', 'mmsi': 1, 'state': 'controlling'}},
+        {'station_id': 'ecr', 'mmsi': 2, 'state': 'WATCHING'},
+    ]})
+    states = val_standard_pb2.Assignment
+    assert [(a.station_id, a.mmsi, a.state) for a in message.assignments] == \
+        [('bridge', 1, states.CONTROLLING), ('ecr', 2, states.WATCHING)]
+
+
+def test_exercise_state_without_state_is_unknown():
+    message = decoders.decode('ExerciseState', {'exercise_state': {}})
+    assert message.state == val_standard_pb2.ExerciseState.UNKNOWN
+    message = decoders.decode('ExerciseState', {'exercise_state': {'state': 'playing'}})
+    assert message.state == val_standard_pb2.ExerciseState.PLAYING
@@ -0,0 +1,87 @@
+# test_shm_export.py
+
+import math
+import os
+import struct
+
+import pytest
+
+import shm_export
+from shm_export import HEADER, HEADER_SIZE, MAGIC, ROW_HEAD, SEQ, ShmExport, ShmReader
+
+
+@pytest.fixture
+def table():
+    export = ShmExport(f'val-test-{os.getpid()}', capacity=4, measurements=2)
+    reader = ShmReader(export.shm.name, timeout=0.05)
+    yield export, reader
+    reader.close()
+    export.close()
+
+
+def test_row_layout_offsets():
+    # The field offsets must match the row head struct
+    fields = ROW_HEAD.unpack(bytes(range(ROW_HEAD.size)))
+    assert ROW_HEAD.size == 80
+    assert struct.calcsize('<Q') == shm_export._MMSI
+    assert struct.calcsize('<Qq') == shm_export._UPDATED
+    assert struct.calcsize('<Qqd') == shm_export._STAMP
+    assert struct.calcsize('<Qqddddddd') == shm_export._ALERTS
+    assert struct.calcsize('<QqdddddddI') == shm_export._MEASUREMENT_COUNT
+    assert len(fields) == 11
+    assert shm_export._STAMP + shm_export._KINEMATICS.size == shm_export._ALERTS
+    assert struct.calcsize('<8sIII') == shm_export.ROWS_USED_OFFSET
+    assert HEADER.size <= HEADER_SIZE
+    assert shm_export._row_size(2) % 64 == 0
+
+
+def test_header(table):
+    export, reader = table
+    magic, capacity, measurements, row_size, used = HEADER.unpack_from(export.buf, 0)
+    assert (magic, capacity, measurements, row_size, used) == (MAGIC, 4, 2, export.row_size, 0)
+    assert reader.vessels() == []
+
+
+def test_round_trip(table):
+    export, reader = table
+    export.update_kinematics(230000001, 10.0, 60.1, 21.5, 12.0, 90.0, 91.0)
+    export.update_position(230000001, 11.0, 60.2, 21.6)
+    export.update_alerts(230000001, 2)
+    export.update_measurement(230000001, 'rpm', 1500.0, 11.0)
+    export.update_measurement(230000001, 'rpm', 1510.0, 12.0)
+    export.update_measurement(230000001, 'temp', 80.0, 12.0)
+    export.update_measurement(230000001, 'ignored', 1.0, 12.0)
+    export.update_position(230000002, 5.0, 59.0, 20.0)
+    assert sorted(reader.vessels()) == [230000001, 230000002]
+    assert reader.kinematics(230000001) == (11.0, 60.2, 21.6, 12.0, 90.0, 91.0, 2)
+    state = reader.read(230000001)
+    assert state.mmsi == 230000001
+    assert state.alerts == 2
+    assert state.measurements == {'rpm': (1510.0, 12.0), 'temp': (80.0, 12.0)}
+    other = reader.read(230000002)
+    assert (other.latitude, other.longitude) == (59.0, 20.0)
+    assert math.isnan(other.sog)
+    assert reader.read(1) is None
+
+
+def test_capacity(table):
+    export, reader = table
+    for mmsi in range(1, 7):
+        export.update_alerts(mmsi, 0)
+    assert sorted(reader.vessels()) == [1, 2, 3, 4]
+
+
+def test_reader_retries_while_row_is_written(table):
+    export, reader = table
+    export.update_alerts(1, 1)
+    offset = export.rows[1]
+    seq = SEQ.unpack_from(export.buf, offset)[0]
+    assert seq % 2 == 0
+    # A writer stuck mid-write leaves the sequence number odd
+    SEQ.pack_into(export.buf, offset, seq + 1)
+    with pytest.raises(TimeoutError):
+        reader.kinematics(1)
+    with pytest.raises(TimeoutError):
+        reader.read(1)
+    SEQ.pack_into(export.buf, offset, seq + 2)
+    assert reader.read(1).alerts == 1
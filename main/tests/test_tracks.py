@@ -0,0 +1,40 @@
+# test_tracks.py
+
+import pytest
+
+import tracks
+from tracks import TrackService
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tracks.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_clock_follows_fix_times(clock):
+    service = TrackService()
+    assert service.now() is None
+    # Simulation time far from the local clock
+    service.update(1, 50.0, 60.0, 20.0)
+    clock[0] += 2.0
+    assert service.now() == 52.0
+    # Late, older fixes do not move the clock back
+    service.update(2, 40.0, 61.0, 21.0)
+    assert service.now() == 52.0
+    service.reset()
+    assert service.now() is None
+
+
+def test_positions_at_clock_time(clock):
+    service = TrackService()
+    service.update(1, 50.0, 60.0, 20.0)
+    service.update(1, 60.0, 60.0, 20.01)
+    clock[0] += 5.0
+    mmsi, latitude, longitude = service.positions_at(service.now())
+    assert mmsi.tolist() == [1]
+    # Dead-reckoned from the velocity between the two fixes
+    assert longitude[0] == pytest.approx(20.015)
+    assert latitude[0] == pytest.approx(60.0)
+    assert service.position_at(1, 55.0) == pytest.approx((60.0, 20.005))
@@ -0,0 +1,62 @@
+# test_watchdog.py
+
+from watchdog import StalenessWatchdog, TimerWheel
+
+
+def test_timer_fires_after_deadline():
+    wheel = TimerWheel(resolution=0.1, now=0.0)
+    wheel.schedule(1.0, 'a')
+    assert wheel.advance(0.95) == []
+    assert wheel.advance(1.0) == ['a']
+    assert wheel.advance(5.0) == []
+
+
+def test_timers_fire_in_deadline_order_across_levels():
+    wheel = TimerWheel(resolution=1.0, levels=(4, 4, 4), now=0.0)
+    deadlines = {'near': 2, 'mid': 7, 'far': 30, 'beyond': 100}
+    for item, deadline in deadlines.items():
+        wheel.schedule(deadline, item)
+    fired = {}
+    for now in range(1, 120):
+        for item in wheel.advance(now):
+            fired[item] = now
+    assert fired == deadlines
+
+
+def test_past_deadline_fires_on_next_tick():
+    wheel = TimerWheel(resolution=0.5, now=10.0)
+    wheel.advance(11.0)
+    wheel.schedule(10.5, 'late')
+    assert wheel.advance(11.5) == ['late']
+
+
+def test_watchdog_stale_and_recovered():
+    events = []
+    watchdog = StalenessWatchdog(lambda *args: events.append(('stale',) + args[:3]),
+                                 lambda *args: events.append(('recovered',) + args[:3]),
+                                 timeouts={'location': 1.0})
+    watchdog.wheel = TimerWheel(watchdog.resolution, now=0.0)
+    watchdog.touch(1, 'location', now=0.0)
+    watchdog.touch(1, 'unwatched', now=0.0)
+    watchdog.touch(1, 'location', now=0.5)
+    watchdog.check(now=1.2)
+    assert events == []
+    watchdog.check(now=1.6)
+    assert events == [('stale', 1, 'location', '')]
+    watchdog.touch(1, 'location', now=2.0)
+    assert events[-1] == ('recovered', 1, 'location', '')
+
+
+def test_watchdog_paused_does_not_fire():
+    events = []
+    watchdog = StalenessWatchdog(lambda *args: events.append(args[:3]), timeouts={'value': 1.0})
+    watchdog.wheel = TimerWheel(watchdog.resolution, now=0.0)
+    watchdog.touch(1, 'value', 'rpm', now=0.0)
+    watchdog.pause()
+    watchdog.check(now=5.0)
+    assert events == []
+    watchdog.resume(now=5.0)
+    watchdog.check(now=5.5)
+    assert events == []
+    watchdog.check(now=6.1)
+    assert events == [(1, 'value', 'rpm')]
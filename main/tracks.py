@@ -0,0 +1,254 @@
+# tracks.py
+
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KNOT = 1852.0 / 3600.0  # m/s
+METERS_PER_DEGREE = 1852.0 * 60.0
+
+# AIS "not available" values
+SOG_NOT_AVAILABLE = 102.3
+COG_NOT_AVAILABLE = 360.0
+
+
+def _evaluate(t, c, max_extrapolation):
+    """
+    Vectorized position evaluation over columns of the last two fixes.
+
+    Args:
+        t (float): The timestamp in seconds.
+        c (dict): Arrays of TrackService.COLUMNS.
+        max_extrapolation (float): Dead-reckoning horizon in seconds.
+
+    Returns:
+        tuple: (latitude, longitude) NumPy arrays.
+    """
+    t0, t1 = c['t0'], c['t1']
+    span = t1 - t0
+    has_previous = ~np.isnan(t0) & (span > 0)
+
+    # Interpolation between the last two fixes
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.clip((t - t0) / span, 0.0, 1.0)
+    dlon = (c['lon1'] - c['lon0'] + 180.0) % 360.0 - 180.0
+    interp_lat = c['lat0'] + fraction * (c['lat1'] - c['lat0'])
+    interp_lon = c['lon0'] + fraction * dlon
+
+    # Dead reckoning after the last fix
+    dt = np.clip(t - t1, 0.0, max_extrapolation)
+    cos_lat = np.maximum(np.cos(np.radians(c['lat1'])), 1e-6)
+    has_velocity = ~np.isnan(c['sog'])
+    course = np.radians(np.where(has_velocity, c['cog'], 0.0))
+    speed = np.where(has_velocity, c['sog'], 0.0) * KNOT
+    dr_lat = speed * np.cos(course) * dt / METERS_PER_DEGREE
+    dr_lon = speed * np.sin(course) * dt / (METERS_PER_DEGREE * cos_lat)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fix_lat = np.where(has_previous, (c['lat1'] - c['lat0']) / span * dt, 0.0)
+        fix_lon = np.where(has_previous, dlon / span * dt, 0.0)
+    dr_lat = np.where(has_velocity, dr_lat, fix_lat)
+    dr_lon = np.where(has_velocity, dr_lon, fix_lon)
+
+    between = has_previous & (t < t1)
+    latitude = np.where(between, interp_lat, c['lat1'] + dr_lat)
+    longitude = np.where(between, interp_lon, c['lon1'] + dr_lon)
+    longitude = (longitude + 180.0) % 360.0 - 180.0
+    return latitude, longitude
+
+
+class TrackService:
+    """
+    Interpolated and dead-reckoned positions of all tracked vessels.
+
+    Each vessel keeps a short history of fixes. The last two fixes are also
+    stored in NumPy columns so positions for the whole fleet are evaluated in
+    one vectorized call: between the two fixes the position is interpolated,
+    after the last fix it is dead-reckoned from sog/cog when known, and from the
+    velocity between the last two fixes otherwise.
+
+    Fix times are publish stamps, which may be simulation time. The ticks run on
+    the same clock: now() is the newest fix time plus the local monotonic time
+    elapsed since it was received, so neither a simulation clock nor an offset
+    between the publisher's and the processor's clocks skews the positions.
+    """
+
+    COLUMNS = ('t0', 'lat0', 'lon0', 't1', 'lat1', 'lon1', 'sog', 'cog')
+
+    def __init__(self, history=16, max_extrapolation=60.0, capacity=1024):
+        """
+        Args:
+            history (int): Number of fixes kept per vessel for position_at().
+            max_extrapolation (float): Dead-reckoning horizon in seconds; later
+                timestamps are held at the horizon.
+            capacity (int): Initial number of vessel rows.
+        """
+        self.max_extrapolation = max_extrapolation
+        self.history = history
+        self.size = 0
+        self.mmsi = np.zeros(capacity, dtype=np.int64)
+        self.columns = {name: np.full(capacity, np.nan) for name in self.COLUMNS}
+        self._rows = {}
+        self._histories = {}
+        self._lock = threading.Lock()
+        self._ticker = None
+        self._stop = threading.Event()
+        self._latest = None  # newest fix time
+        self._clock_offset = None  # fix time minus time.monotonic() at its arrival
+
+    def __len__(self):
+        return self.size
+
+    def now(self):
+        """
+        Returns the current time on the clock of the fixes, or None before the
+        first fix.
+        """
+        offset = self._clock_offset
+        return None if offset is None else time.monotonic() + offset
+
+    def _row(self, mmsi):
+        row = self._rows.get(mmsi)
+        if row is None:
+            if self.size == len(self.mmsi):
+                capacity = 2 * len(self.mmsi)
+                self.mmsi = np.resize(self.mmsi, capacity)
+                for name, column in self.columns.items():
+                    grown = np.full(capacity, np.nan)
+                    grown[:len(column)] = column
+                    self.columns[name] = grown
+            row = self._rows[mmsi] = self.size
+            self.mmsi[row] = mmsi
+            self.size += 1
+        return row
+
+    def update(self, mmsi, t, latitude, longitude, sog=None, cog=None):
+        """
+        Adds a position fix of a vessel.
+
+        Args:
+            mmsi (int): The vessel MMSI.
+            t (float): Time of the fix in seconds.
+            latitude (float): Latitude in degrees.
+            longitude (float): Longitude in degrees.
+            sog (float): Speed over ground in knots, if known.
+            cog (float): Course over ground in degrees, if known.
+        """
+        if sog is not None and (sog >= SOG_NOT_AVAILABLE or cog is None or cog >= COG_NOT_AVAILABLE):
+            sog = cog = None
+        with self._lock:
+            history = self._histories.get(mmsi)
+            if history is None:
+                history = self._histories[mmsi] = deque(maxlen=self.history)
+            if history and t < history[-1][0]:
+                return  # out of order
+            history.append((t, latitude, longitude))
+            if self._latest is None or t >= self._latest:
+                self._latest = t
+                self._clock_offset = t - time.monotonic()
+
+            c = self.columns
+            row = self._row(mmsi)
+            if not np.isnan(c['t1'][row]) and t > c['t1'][row]:
+                c['t0'][row], c['lat0'][row], c['lon0'][row] = c['t1'][row], c['lat1'][row], c['lon1'][row]
+            c['t1'][row], c['lat1'][row], c['lon1'][row] = t, latitude, longitude
+            c['sog'][row] = np.nan if sog is None else sog
+            c['cog'][row] = np.nan if cog is None else cog
+
+    def positions_at(self, t):
+        """
+        Evaluates the positions of all tracked vessels at a timestamp.
+
+        Args:
+            t (float): The timestamp in seconds.
+
+        Returns:
+            tuple: (mmsi, latitude, longitude) NumPy arrays.
+        """
+        with self._lock:
+            n = self.size
+            mmsi = self.mmsi[:n].copy()
+            c = {name: column[:n].copy() for name, column in self.columns.items()}
+
+        latitude, longitude = _evaluate(t, c, self.max_extrapolation)
+        return mmsi, latitude, longitude
+
+    def position_at(self, mmsi, t):
+        """
+        Evaluates the position of one vessel at a timestamp, using its history.
+
+        Returns:
+            tuple: (latitude, longitude), or None if the vessel is unknown.
+        """
+        with self._lock:
+            history = self._histories.get(mmsi)
+            if not history:
+                return None
+            fixes = list(history)
+            row = self._rows[mmsi]
+            sog, cog = self.columns['sog'][row], self.columns['cog'][row]
+
+        times = [fix[0] for fix in fixes]
+        index = bisect.bisect_right(times, t)
+        if 0 < index < len(fixes):
+            (ta, lat_a, lon_a), (tb, lat_b, lon_b) = fixes[index - 1], fixes[index]
+            fraction = (t - ta) / (tb - ta) if tb > ta else 1.0
+            dlon = (lon_b - lon_a + 180.0) % 360.0 - 180.0
+            return lat_a + fraction * (lat_b - lat_a), lon_a + fraction * dlon
+        if index == 0:
+            return fixes[0][1], fixes[0][2]
+        # After the last fix: dead reckoning as in positions_at()
+        (ta, lat_a, lon_a), (tb, lat_b, lon_b) = fixes[-2] if len(fixes) > 1 else (np.nan,) * 3, fixes[-1]
+        columns = {'t0': ta, 'lat0': lat_a, 'lon0': lon_a, 't1': tb, 'lat1': lat_b, 'lon1': lon_b,
+                   'sog': sog, 'cog': cog}
+        latitude, longitude = _evaluate(t, {name: np.array([value]) for name, value in columns.items()},
+                                        self.max_extrapolation)
+        return float(latitude[0]), float(longitude[0])
+
+    def start(self, rate, publish, active=lambda: True):
+        """
+        Starts publishing fleet positions at a fixed rate from a background thread.
+
+        Args:
+            rate (float): Ticks per second.
+            publish (callable): Called as publish(t, mmsi, latitude, longitude)
+                with the NumPy arrays of each tick; t is taken from now().
+            active (callable): Ticks are skipped while it returns False.
+        """
+        interval = 1.0 / rate
+
+        def run():
+            next_tick = time.monotonic()
+            while not self._stop.is_set():
+                next_tick += interval
+                t = self.now()
+                if active() and self.size and t is not None:
+                    try:
+                        publish(t, *self.positions_at(t))
+                    except Exception as e:
+                        logger.error(f"Track tick failed: {e}")
+                self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+        self._ticker = threading.Thread(target=run, name='tracks', daemon=True)
+        self._ticker.start()
+        logger.info(f"Publishing dead-reckoned tracks at {rate} Hz")
+
+    def stop(self):
+        self._stop.set()
+
+    def reset(self):
+        """
+        Drops all tracks.
+        """
+        with self._lock:
+            self.size = 0
+            self._rows.clear()
+            self._histories.clear()
+            self._latest = self._clock_offset = None
+            for column in self.columns.values():
+                column.fill(np.nan)
@@ -1,9 +1,14 @@
 # utils.py
 
+import functools
 import logging
+import re
+import time
+import json
+
 from google.protobuf import json_format
 import val_standard_pb2  # Import the generated Protobuf classes
-import json
+
 
 def parse_message(json_string, message_type, root_key=None, merge_top_level_keys=[]):
     """
@@ -59,3 +64,76 @@ def publish_message(session, key, message):
         logging.info(f"Published message to {key}")
     except Exception as e:
         logging.error(f"Error publishing message to {key}: {e}")
+
+
+class ReceivedSample:
+    """
+    A received Zenoh sample with its key and payload read out once.
+
+    Each access to Sample.key_expr builds a new KeyExpr, and str() of it a new
+    string. The payload is kept as the buffer the binding handed over (bytes,
+    or a memoryview for bindings exposing a buffer) and passed on by reference
+    to the JSON parser, the state cache and forwarding, never copied.
+    """
+
+    __slots__ = ('key_expr', 'payload')
+
+    def __init__(self, sample):
+        self.key_expr = str(sample.key_expr)
+        self.payload = payload_buffer(sample.payload)
+
+
+def payload_buffer(payload):
+    """
+    Returns a payload as bytes or a zero-copy memoryview of it.
+    """
+    if isinstance(payload, (bytes, memoryview)):
+        return payload
+    return memoryview(payload)
+
+
+def stamp_seconds(stamp):
+    """
+    Converts a Timestamp message to seconds, or the current time if it is unset.
+    """
+    return stamp.sec + stamp.nanosec * 1e-9 or time.time()
+
+
+def derived_key(prefix, key_expr):
+    """
+    Maps a VAL key expression to the same key under a derived prefix.
+
+    Example: derived_key('downsampled', 'val/amoc/1/sog/value') returns
+    'val/downsampled/amoc/1/sog/value'.
+    """
+    head, _, rest = key_expr.partition('/')
+    return f"{head}/{prefix}/{rest}"
+
+
+@functools.lru_cache(maxsize=256)
+def _key_expr_regex(key_expr):
+    pieces = []
+    for chunk in key_expr.split('/'):
+        if chunk == '**':
+            pieces.append(r'(?:/[^/]+)*')
+        elif chunk == '*':
+            pieces.append(r'/[^/]+')
+        else:
+            pieces.append('/' + re.escape(chunk).replace(r'\$\*', '[^/]*').replace(r'\*', '[^/]*'))
+    return re.compile(''.join(pieces) + '$')
+
+
+def key_expr_matches(key_expr, key):
+    """
+    Checks whether a concrete key belongs to a Zenoh key expression.
+
+    Supports the '*' (exactly one chunk) and '**' (any number of chunks) wildcards.
+
+    Args:
+        key_expr (str): The key expression, possibly with wildcards.
+        key (str): The concrete key.
+
+    Returns:
+        bool: True if the key matches the key expression.
+    """
+    return _key_expr_regex(key_expr).match('/' + key) is not None
@@ -0,0 +1,252 @@
+# watchdog.py
+
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Default staleness timeouts per topic in seconds
+DEFAULT_TIMEOUTS = {
+    'location': 10.0,
+    'aisvessel': 30.0,
+    'value': 10.0,
+}
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel (Varghese & Lauck).
+
+    Level 0 has one slot per tick; each higher level has slots spanning a full
+    rotation of the level below. Timers are placed on the lowest level whose
+    range covers them and cascade down as the wheel turns, so scheduling is O(1)
+    and advancing costs O(1) per tick plus the timers that expire or cascade.
+    Deadlines beyond the top level are parked in its last slot and re-placed
+    when they cascade.
+    """
+
+    def __init__(self, resolution=0.1, levels=(256, 64, 64, 64), now=None):
+        """
+        Args:
+            resolution (float): Tick length in seconds.
+            levels (tuple of int): Number of slots per level.
+            now (float): Start time, defaults to time.monotonic().
+        """
+        self.resolution = resolution
+        self.start = time.monotonic() if now is None else now
+        self.tick = 0
+        self.sizes = levels
+        self.spans = []  # ticks covered by one slot of each level
+        span = 1
+        for size in levels:
+            self.spans.append(span)
+            span *= size
+        self.range = span
+        self.levels = [[[] for _ in range(size)] for size in levels]
+
+    def schedule(self, deadline, item):
+        """
+        Schedules an item to be returned by advance() once the deadline passes.
+        """
+        self._insert(math.ceil((deadline - self.start) / self.resolution), item)
+
+    def _insert(self, target, item):
+        target = max(target, self.tick + 1)
+        delta = target - self.tick
+        for level, (size, span) in enumerate(zip(self.sizes, self.spans)):
+            if delta < span * size:
+                self.levels[level][(target // span) % size].append((target, item))
+                return
+        # Beyond the wheel's range: park in the slot cascading last
+        span, size = self.spans[-1], self.sizes[-1]
+        self.levels[-1][((self.tick + self.range - 1) // span) % size].append((target, item))
+
+    def advance(self, now):
+        """
+        Turns the wheel up to a time.
+
+        Returns:
+            list: The items whose deadline has passed.
+        """
+        due = []
+        until = int((now - self.start) / self.resolution)
+        while self.tick < until:
+            self.tick += 1
+            tick = self.tick
+            for level in range(1, len(self.levels)):
+                span = self.spans[level]
+                if tick % span:
+                    break
+                slots = self.levels[level]
+                index = (tick // span) % self.sizes[level]
+                entries, slots[index] = slots[index], []
+                for target, item in entries:
+                    if target <= tick:
+                        due.append(item)
+                    else:
+                        self._insert(target, item)
+            slots = self.levels[0]
+            index = tick % self.sizes[0]
+            entries, slots[index] = slots[index], []
+            for target, item in entries:
+                if target <= tick:
+                    due.append(item)
+                else:
+                    self._insert(target, item)
+        return due
+
+
+class _Stream:
+    __slots__ = ('last_seen', 'timeout', 'armed', 'stale')
+
+    def __init__(self, last_seen, timeout):
+        self.last_seen = last_seen
+        self.timeout = timeout
+        self.armed = False
+        self.stale = False
+
+
+class StalenessWatchdog:
+    """
+    Detects signal streams that went quiet.
+
+    A stream is identified by (mmsi, topic, measurement name). Updates only
+    record the last-seen time; timers are re-armed lazily when they expire, at
+    last_seen + timeout, so an update costs O(1) regardless of the number of
+    streams and no periodic scan is needed. Streams fire once when they go stale
+    and again when they recover. While paused, e.g. with the exercise paused or
+    stopped, no stream goes stale; resuming re-arms every stream with a full
+    timeout.
+    """
+
+    def __init__(self, on_stale, on_recovered=None, timeouts=None, resolution=0.1):
+        """
+        Args:
+            on_stale (callable): Called as on_stale(mmsi, topic, name, last_seen)
+                with last_seen as time.time().
+            on_recovered (callable): Called with the same arguments when a stale
+                stream is updated again.
+            timeouts (dict): Topic -> timeout in seconds; defaults to DEFAULT_TIMEOUTS.
+            resolution (float): Timer resolution in seconds.
+        """
+        self.on_stale = on_stale
+        self.on_recovered = on_recovered
+        self.timeouts = dict(DEFAULT_TIMEOUTS if timeouts is None else timeouts)
+        self.resolution = resolution
+        self.wheel = TimerWheel(resolution)
+        self.streams = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.paused = False
+        # Offset converting monotonic times to wall times for the callbacks
+        self._wall_offset = time.time() - time.monotonic()
+
+    def touch(self, mmsi, topic, name='', now=None):
+        """
+        Records an update of a stream.
+
+        Args:
+            mmsi (int): The vessel MMSI.
+            topic (str): The topic, a key of the configured timeouts; topics
+                without a timeout are not watched.
+            name (str): The measurement name, for measurement streams.
+            now (float): Update time as time.monotonic().
+        """
+        now = time.monotonic() if now is None else now
+        key = (mmsi, topic, name)
+        stream = self.streams.get(key)
+        if stream is not None and stream.armed:
+            stream.last_seen = now  # the timer is re-armed lazily when it fires
+            return
+        timeout = self.timeouts.get(topic)
+        if timeout is None:
+            return
+        with self._lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = self.streams[key] = _Stream(now, timeout)
+            stream.last_seen = now
+            recovered = stream.stale
+            stream.stale = False
+            if not stream.armed:
+                stream.armed = True
+                self.wheel.schedule(now + stream.timeout, key)
+        if recovered and self.on_recovered is not None:
+            self.on_recovered(mmsi, topic, name, now + self._wall_offset)
+
+    def check(self, now=None):
+        """
+        Advances the timers and fires the streams that went stale.
+        """
+        now = time.monotonic() if now is None else now
+        stale = []
+        with self._lock:
+            if self.paused:
+                return
+            for key in self.wheel.advance(now):
+                stream = self.streams.get(key)
+                if stream is None:
+                    continue
+                deadline = stream.last_seen + stream.timeout
+                if deadline <= now:
+                    stream.armed = False
+                    stream.stale = True
+                    stale.append((key, stream.last_seen))
+                else:
+                    self.wheel.schedule(deadline, key)
+        for (mmsi, topic, name), last_seen in stale:
+            try:
+                self.on_stale(mmsi, topic, name, last_seen + self._wall_offset)
+            except Exception as e:
+                logger.error(f"Staleness callback failed: {e}")
+
+    def pause(self):
+        """
+        Stops streams from going stale until resume().
+        """
+        with self._lock:
+            self.paused = True
+
+    def resume(self, now=None):
+        """
+        Resumes staleness checks, restarting the timeout of every stream that
+        was not already stale, as if it had been updated now.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if not self.paused:
+                return
+            self.paused = False
+            self.wheel = TimerWheel(self.resolution, now=now)
+            for key, stream in self.streams.items():
+                stream.last_seen = now
+                stream.armed = not stream.stale
+                if stream.armed:
+                    self.wheel.schedule(now + stream.timeout, key)
+
+    def forget(self, mmsi):
+        """
+        Stops watching all streams of a vessel.
+        """
+        with self._lock:
+            for key in [key for key in self.streams if key[0] == mmsi]:
+                del self.streams[key]
+
+    def reset(self):
+        with self._lock:
+            self.streams.clear()
+            self.wheel = TimerWheel(self.resolution)
+
+    def start(self):
+        def run():
+            while not self._stop.wait(self.resolution):
+                self.check()
+
+        threading.Thread(target=run, name='watchdog', daemon=True).start()
+        logger.info("Staleness watchdog started: "
+                    + ", ".join(f"{topic} {timeout}s" for topic, timeout in sorted(self.timeouts.items())))
+
+    def stop(self):
+        self._stop.set()